@@ -0,0 +1,626 @@
+"""Offline benchmarks for the /ask pipeline and the ingestion helpers.
+
+Run ``python -m benchmark`` to drive ``main.app`` in-process with a concurrent
+load generator while Groq, Pinecone, Amadeus and Wikivoyage are replaced by
+deterministic local fakes with configurable latency. Each scenario reports
+throughput, latency percentiles, status codes and memory. The results are
+written to a JSON file (``--output``) and can be compared with an earlier run
+(``--compare``).
+
+Fakes answer from recorded fixtures (``DEFAULT_FIXTURES`` or ``--fixtures``),
+so runs are repeatable and need no network or API keys.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import ExitStack
+from types import SimpleNamespace
+from unittest.mock import patch
+
+DEFAULT_FIXTURES = {
+    # The first tool-enabled completion for a prompt matching "match" requests
+    # these tool calls; "$1", "$2"... are replaced by the regex groups.
+    "tool_plans": [
+        {
+            "match": r"flights? ([A-Z]{3}) to ([A-Z]{3}) on (\d{4}-\d{2}-\d{2})",
+            "tool_calls": [
+                {
+                    "name": "search_flights",
+                    "arguments": {
+                        "origin": "$1",
+                        "destination": "$2",
+                        "date": "$3",
+                        "adults": 1,
+                    },
+                }
+            ],
+        },
+        {
+            "match": r"days? each in (\w+), (\w+) and (\w+)",
+            "tool_calls": [
+                {
+                    "name": "query_city",
+                    "arguments": {"city": f"${i}", "question": "Top things to do?"},
+                }
+                for i in (1, 2, 3)
+            ],
+        },
+    ],
+    "final_answer": "Here is your plan. " * 40,
+    "city_answer": "Visit the old town, try the street food and take the metro. " * 8,
+    "usage": {"prompt_tokens": 600, "completion_tokens": 250},
+    "city_hits": [
+        {"_id": f"chunk-{i}", "_score": 0.8, "fields": {"text": "Travel info. " * 40}}
+        for i in range(3)
+    ],
+    "flight_offers": [
+        {
+            "price": {"total": f"{200 + 37 * i}.00"},
+            "itineraries": [
+                {
+                    "segments": [
+                        {
+                            "departure": {"iataCode": "JFK", "at": "2025-12-15T08:00"},
+                            "arrival": {"iataCode": "LHR", "at": "2025-12-15T20:00"},
+                            "carrierCode": "BA",
+                        }
+                    ]
+                }
+            ],
+        }
+        for i in range(3)
+    ],
+}
+
+ROUTES = [
+    ("JFK", "LHR"),
+    ("SFO", "NRT"),
+    ("SIN", "SYD"),
+    ("HND", "ICN"),
+    ("BKK", "HKG"),
+]
+CITY_TRIOS = [("Tokyo", "Kyoto", "Osaka"), ("Seoul", "Taipei", "Bangkok")]
+
+
+class Latency:
+    """A seeded latency distribution parsed from a spec string.
+
+    Specs are "fixed:MS", "uniform:LOW_MS:HIGH_MS" or
+    "lognormal:MEDIAN_MS:SIGMA".
+    """
+
+    def __init__(self, spec, seed=0):
+        self.spec = spec
+        kind, *params = spec.split(":")
+        self.kind = kind
+        self.params = [float(p) for p in params]
+        if kind not in ("fixed", "uniform", "lognormal"):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+        self._random = random.Random(seed)
+
+    def sample(self):
+        """Return one latency in seconds."""
+        if self.kind == "fixed":
+            ms = self.params[0]
+        elif self.kind == "uniform":
+            ms = self._random.uniform(*self.params)
+        else:
+            median, sigma = self.params
+            ms = self._random.lognormvariate(0, sigma) * median
+        return ms / 1000
+
+
+def _response(content, tool_calls, usage):
+    message = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=message)], usage=SimpleNamespace(**usage)
+    )
+
+
+class FakeAsyncOpenAI:
+    """Stand-in for ``AsyncOpenAI`` answering chat completions from fixtures.
+
+    Tool-enabled completions for a new user prompt return the tool calls of the
+    first matching ``tool_plans`` entry; completions after tool results return
+    ``final_answer``; the nested ``query_city`` completion returns
+    ``city_answer``. Streaming is not supported.
+    """
+
+    def __init__(self, fixtures, latency, **kwargs):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def _plan(self, prompt):
+        for plan in self.fixtures["tool_plans"]:
+            match = re.search(plan["match"], prompt)
+            if match:
+                return [
+                    SimpleNamespace(
+                        id=f"call_{i}",
+                        type="function",
+                        function=SimpleNamespace(
+                            name=call["name"],
+                            arguments=json.dumps(
+                                {
+                                    k: re.sub(
+                                        r"\$(\d)",
+                                        lambda m, match=match: match[int(m[1])],
+                                        v,
+                                    )
+                                    if isinstance(v, str)
+                                    else v
+                                    for k, v in call["arguments"].items()
+                                }
+                            ),
+                        ),
+                    )
+                    for i, call in enumerate(plan["tool_calls"])
+                ]
+        return None
+
+    async def create(self, model, messages, stream=False, **kwargs):
+        if stream:
+            raise NotImplementedError("The benchmark fakes do not stream")
+        self.calls += 1
+        await asyncio.sleep(self.latency.sample())
+        usage = self.fixtures["usage"]
+        last = messages[-1]
+        if last["role"] == "tool":
+            return _response(self.fixtures["final_answer"], None, usage)
+        if "tools" in kwargs:
+            tool_calls = self._plan(last["content"])
+            if tool_calls:
+                return _response(None, tool_calls, usage)
+            return _response(self.fixtures["final_answer"], None, usage)
+        return _response(self.fixtures["city_answer"], None, usage)
+
+
+class FakeIndex:
+    """Stand-in for a Pinecone index returning the fixture hits."""
+
+    def __init__(self, fixtures, latency):
+        self.fixtures = fixtures
+        self.latency = latency
+
+    def search(self, namespace, query, fields=None):
+        time.sleep(self.latency.sample())
+        hits = self.fixtures["city_hits"][: query.get("top_k", 10)]
+        return {"result": {"hits": hits}}
+
+
+class FakePinecone:
+    """Stand-in for ``Pinecone``; every index name maps to one FakeIndex."""
+
+    def __init__(self, fixtures, latency, **kwargs):
+        self._index = FakeIndex(fixtures, latency)
+
+    def Index(self, name):
+        return self._index
+
+
+class FakeAmadeus:
+    """Stand-in for the Amadeus ``Client`` returning the fixture offers."""
+
+    def __init__(self, fixtures, latency, **kwargs):
+        self.fixtures = fixtures
+        self.latency = latency
+        search = SimpleNamespace(get=self._search)
+        self.shopping = SimpleNamespace(flight_offers_search=search)
+
+    def _search(self, **kwargs):
+        time.sleep(self.latency.sample())
+        return SimpleNamespace(data=self.fixtures["flight_offers"])
+
+
+def install_fakes(
+    stack,
+    fixtures,
+    llm_latency,
+    index_latency,
+    amadeus_latency,
+    city_mode="answer",
+    router="rules",
+):
+    """Patch the SDK entry points with fakes for the lifetime of ``stack``.
+
+    ``city_mode`` selects the CITY_QUERY_MODE of ``query_city`` ("answer" or
+    "retrieve"), so both modes can be compared on the same fixtures.
+    ``router`` selects how the first round of tools is picked: "off" (by the
+    main model), "rules", "model" (ROUTER_MODEL) or "rules+model".
+    """
+    from clients import reset_clients
+
+    def llm(**kwargs):
+        return FakeAsyncOpenAI(fixtures, llm_latency, **kwargs)
+
+    def pinecone(**kwargs):
+        return FakePinecone(fixtures, index_latency, **kwargs)
+
+    def amadeus(**kwargs):
+        return FakeAmadeus(fixtures, amadeus_latency, **kwargs)
+
+    stack.enter_context(patch("travel_llm.AsyncOpenAI", llm))
+    stack.enter_context(patch("itinerary_agent.AsyncOpenAI", llm))
+    stack.enter_context(patch("itinerary_agent.Pinecone", pinecone))
+    stack.enter_context(patch("itinerary_agent.VECTOR_BACKEND", "pinecone"))
+    stack.enter_context(patch("itinerary_agent.CITY_QUERY_MODE", city_mode))
+    stack.enter_context(patch("travel_llm.ROUTER_RULES", "rules" in router))
+    # Routed tool calls are built from the OpenAI SDK types, which a deployment
+    # has loaded with its client; load them here rather than mid-scenario.
+    import openai.types.chat.chat_completion_message_tool_call  # noqa: F401
+
+    router_model = "benchmark-router" if "model" in router else ""
+    stack.enter_context(patch("travel_llm.ROUTER_MODEL", router_model))
+    stack.enter_context(patch("flight_agent.Client", amadeus))
+    stack.enter_context(patch.dict("os.environ", {"GROQ_API_KEY": "benchmark"}))
+    reset_clients()
+    stack.callback(reset_clients)
+
+
+def reset_state():
+    """Clear every cache, session and rate limit counter between scenarios."""
+    import main
+    from flight_agent import flight_cache
+    from itinerary_agent import answer_cache
+    from metrics import metrics
+    from resilience import reset_dependencies
+    from response_cache import response_cache
+    from sessions import sessions
+
+    for cache in (flight_cache, answer_cache, response_cache, sessions):
+        cache.clear()
+    main.limiter.reset()
+    metrics.clear()
+    reset_dependencies()
+
+
+def percentiles(values):
+    """Return p50/p95/p99/max of ``values`` (seconds) in milliseconds."""
+    if not values:
+        return {"p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+    ordered = sorted(values)
+
+    def at(q):
+        return round(
+            ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)] * 1000, 2
+        )
+
+    return {
+        "p50_ms": at(50),
+        "p95_ms": at(95),
+        "p99_ms": at(99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+async def load(app, prompts, concurrency, path="/ask"):
+    """POST each prompt to ``app`` with at most ``concurrency`` in flight.
+
+    Returns:
+        ``(latencies, status_counts, wall_seconds)``.
+    """
+    import httpx
+
+    latencies = []
+    statuses = {}
+    queue = list(reversed(prompts))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark", timeout=None
+    ) as client:
+
+        async def worker():
+            while queue:
+                prompt = queue.pop()
+                started = time.perf_counter()
+                response = await client.post(path, json={"prompt": prompt})
+                latencies.append(time.perf_counter() - started)
+                statuses[str(response.status_code)] = (
+                    statuses.get(str(response.status_code), 0) + 1
+                )
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return latencies, statuses, wall
+
+
+def _measured(fn):
+    """Run ``fn()`` under tracemalloc and return its result and memory figures."""
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    memory = {
+        "tracemalloc_peak_mb": round(peak / 2**20, 2),
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            / (2**20 if sys.platform == "darwin" else 2**10),
+            1,
+        ),
+    }
+    return result, memory
+
+
+def _scenario_prompts(name, requests):
+    if name == "flight_search":
+        return [
+            "Find flights {} to {} on 2025-12-15, request {}".format(
+                *ROUTES[i % len(ROUTES)], i
+            )
+            for i in range(requests)
+        ]
+    if name == "multi_city_itinerary":
+        return [
+            "Plan 2 days each in {}, {} and {}, request {}".format(
+                *CITY_TRIOS[i % len(CITY_TRIOS)], i
+            )
+            for i in range(requests)
+        ]
+    if name == "rate_limit_storm":
+        return [f"Plan a trip to Tokyo, request {i}" for i in range(requests)]
+    raise ValueError(f"Unknown scenario: {name}")
+
+
+API_SCENARIOS = ("flight_search", "multi_city_itinerary", "rate_limit_storm")
+
+
+def run_api_scenario(name, requests=200, concurrency=20):
+    """Run one /ask scenario against ``main.app`` and return its report.
+
+    All scenarios except "rate_limit_storm" lift the rate limit so the
+    pipeline itself is measured; the storm keeps the configured limits and
+    sends every request from one client.
+    """
+    import main
+    from ratelimit import MemoryBackend, RateLimiter, Rule
+
+    reset_state()
+    prompts = _scenario_prompts(name, requests)
+    limiter = main.limiter
+    if name != "rate_limit_storm":
+        limiter = RateLimiter(MemoryBackend(), default=Rule(10**9, 60))
+
+    with patch("main.limiter", limiter):
+        (latencies, statuses, wall), memory = _measured(
+            lambda: asyncio.run(load(main.app, prompts, concurrency))
+        )
+
+    from metrics import metrics
+
+    stages = metrics.summary()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "throughput_rps": round(requests / wall, 1),
+        "wall_s": round(wall, 3),
+        "latency": percentiles(latencies),
+        "status_codes": statuses,
+        "llm_calls": sum(
+            stage["count"] for name, stage in stages.items() if name.startswith("llm.")
+        ),
+        "stages": stages,
+        **memory,
+    }
+
+
+def _large_html(paragraphs):
+    body = "".join(
+        f"<p>Paragraph {i}: " + "The city has many temples and markets. " * 12 + "</p>"
+        f"<table><tr><td>noise {i}</td></tr></table>"
+        for i in range(paragraphs)
+    )
+    return f"<html><body><h2>See</h2>{body}</body></html>"
+
+
+def run_ingest_scenarios(paragraphs=2000, repeat=3):
+    """Measure ``chunk_text`` and ``scrape_city`` throughput on a large page."""
+    import rag_ingest
+    from fetcher import Fetcher
+
+    html = _large_html(paragraphs)
+    text = " ".join(re.findall(r"<p>(.*?)</p>", html))
+    reports = {}
+
+    def timed(fn):
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        return result, best
+
+    (chunks, seconds), memory = _measured(
+        lambda: timed(lambda: rag_ingest.chunk_text(text))
+    )
+    reports["chunk_text"] = {
+        "input_mb": round(len(text) / 2**20, 2),
+        "chunks": len(chunks),
+        "best_s": round(seconds, 4),
+        "throughput_mb_s": round(len(text) / 2**20 / seconds, 1),
+        **memory,
+    }
+
+    body = html.encode()
+    page = SimpleNamespace(
+        status_code=200,
+        headers={},
+        encoding="utf-8",
+        iter_content=lambda chunk_size=1: (
+            body[i : i + chunk_size] for i in range(0, len(body), chunk_size)
+        ),
+        raise_for_status=lambda: None,
+        close=lambda: None,
+    )
+    with tempfile.TemporaryDirectory() as cache_dir:
+        fetcher = Fetcher(
+            cache_dir, host_delay=0, session=SimpleNamespace(get=lambda *a, **k: page)
+        )
+        (chunks, seconds), memory = _measured(
+            lambda: timed(lambda: rag_ingest.scrape_city("Benchmark", fetcher=fetcher))
+        )
+    reports["scrape_city"] = {
+        "input_mb": round(len(html) / 2**20, 2),
+        "chunks": len(chunks),
+        "best_s": round(seconds, 4),
+        "throughput_mb_s": round(len(html) / 2**20 / seconds, 1),
+        **memory,
+    }
+    return reports
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(
+    scenarios=API_SCENARIOS + ("ingest",),
+    requests=200,
+    concurrency=20,
+    fixtures=None,
+    llm_latency="lognormal:300:0.4",
+    index_latency="lognormal:40:0.3",
+    amadeus_latency="lognormal:500:0.4",
+    seed=0,
+    city_mode="answer",
+    router="rules",
+):
+    """Run the selected scenarios with fakes installed and return the report."""
+    fixtures = fixtures or DEFAULT_FIXTURES
+    config = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "llm_latency": llm_latency,
+        "index_latency": index_latency,
+        "amadeus_latency": amadeus_latency,
+        "seed": seed,
+        "city_mode": city_mode,
+        "router": router,
+    }
+    results = {}
+    with ExitStack() as stack:
+        install_fakes(
+            stack,
+            fixtures,
+            Latency(llm_latency, seed),
+            Latency(index_latency, seed + 1),
+            Latency(amadeus_latency, seed + 2),
+            city_mode,
+            router,
+        )
+        for name in scenarios:
+            if name == "ingest":
+                results.update(run_ingest_scenarios())
+            else:
+                results[name] = run_api_scenario(name, requests, concurrency)
+    return {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "config": config,
+        "scenarios": results,
+    }
+
+
+def compare(old, new):
+    """Return lines comparing throughput and p95 latency of two reports."""
+    lines = []
+    for name, result in new["scenarios"].items():
+        before = old.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        if "throughput_rps" in result:
+            pairs = [
+                ("rps", before["throughput_rps"], result["throughput_rps"]),
+                ("p95 ms", before["latency"]["p95_ms"], result["latency"]["p95_ms"]),
+            ]
+        else:
+            pairs = [("MB/s", before["throughput_mb_s"], result["throughput_mb_s"])]
+        for label, a, b in pairs:
+            change = (b - a) / a * 100 if a else 0.0
+            lines.append(f"{name:<22} {label:<7} {a:>10} -> {b:>10} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        choices=API_SCENARIOS + ("ingest",),
+        help="scenario to run (repeatable; default: all)",
+    )
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fixtures", help="JSON file overriding DEFAULT_FIXTURES")
+    parser.add_argument("--llm-latency", default="lognormal:300:0.4")
+    parser.add_argument("--index-latency", default="lognormal:40:0.3")
+    parser.add_argument("--amadeus-latency", default="lognormal:500:0.4")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--city-mode",
+        choices=("answer", "retrieve"),
+        default="answer",
+        help="query_city mode: nested answer completion or retrieved passages",
+    )
+    parser.add_argument(
+        "--router",
+        choices=("off", "rules", "model", "rules+model"),
+        default="rules",
+        help="how the first round of tools is picked (off: by the main model)",
+    )
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures) as f:
+            fixtures = {**DEFAULT_FIXTURES, **json.load(f)}
+
+    report = run_benchmarks(
+        scenarios=tuple(args.scenario or API_SCENARIOS + ("ingest",)),
+        requests=args.requests,
+        concurrency=args.concurrency,
+        fixtures=fixtures,
+        llm_latency=args.llm_latency,
+        index_latency=args.index_latency,
+        amadeus_latency=args.amadeus_latency,
+        seed=args.seed,
+        city_mode=args.city_mode,
+        router=args.router,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["scenarios"], indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            print("\n".join(compare(json.load(f), report)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
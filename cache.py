@@ -0,0 +1,164 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class TTLCache:
+    """A thread-safe, size-bounded LRU cache whose entries expire after a TTL.
+
+    Args:
+        maxsize: Maximum number of entries kept; the least recently used entry is
+            evicted when a new key would exceed it.
+        ttl: Default time-to-live of an entry in seconds.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the live value for ``key`` (marking it recently used), or ``default``."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None):
+        """Store ``value`` under ``key`` for ``ttl`` seconds (default: the cache TTL)."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def peek(self, key, default=None):
+        """Return the live value for ``key`` without counting a hit or miss."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return default
+        return entry[0]
+
+    def pop(self, key, default=None):
+        """Remove ``key`` and return its value, or ``default`` if absent."""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """Return the hit/miss/eviction counters and the current size."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key onto one execution.
+
+    While a call for a key is in flight, other threads asking for the same key
+    wait for it and receive its result (or exception) instead of repeating it.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        """Run ``fn()`` for ``key`` unless an identical call is already running.
+
+        Args:
+            key: Hashable identity of the call.
+            fn: Zero-argument callable producing the result.
+
+        Returns:
+            The result of the single shared execution.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """Collapse concurrent coroutine calls for the same key onto one execution.
+
+    The asyncio counterpart of ``SingleFlight``: while a call for a key is
+    awaiting its result, other tasks on the same event loop asking for that key
+    await the same result instead of starting their own call. The call runs as
+    a task of its own, so cancelling the caller that started it (e.g. a client
+    disconnecting) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    def __contains__(self, key):
+        return key in self._calls
+
+    async def do(self, key, fn):
+        """Await ``fn()`` for ``key`` unless an identical call is already running.
+
+        Args:
+            key: Hashable identity of the call.
+            fn: Zero-argument coroutine function producing the result.
+
+        Returns:
+            The result of the single shared execution.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(self._run(key, fn))
+            # Callers re-raise its error; don't warn if they were all cancelled.
+            task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task)
+
+    async def _run(self, key, fn):
+        try:
+            return await fn()
+        finally:
+            del self._calls[key]
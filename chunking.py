@@ -0,0 +1,216 @@
+import re
+from html.parser import HTMLParser
+
+try:
+    from lxml import etree
+except ImportError:  # lxml is optional; fall back to the stdlib parser
+    etree = None
+
+# Text before the first <h2> of a Wikivoyage page.
+LEAD_SECTION = "Introduction"
+
+_HEADINGS = {"h2"}
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _clean(text):
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _is_edit_link(attributes):
+    return "mw-editsection" in (attributes.get("class") or "")
+
+
+class _LxmlEvents:
+    """Incremental parser on lxml's libxml2 HTML pull parser."""
+
+    def __init__(self):
+        self._parser = etree.HTMLPullParser(events=("end",))
+
+    def feed(self, data):
+        self._parser.feed(data)
+        return self._drain()
+
+    def close(self):
+        self._parser.close()
+        return self._drain()
+
+    @staticmethod
+    def _text(element):
+        parts = [element.text or ""]
+        for child in element:
+            if not _is_edit_link(child.attrib):
+                parts.append(_LxmlEvents._text(child))
+            parts.append(child.tail or "")
+        return "".join(parts)
+
+    def _drain(self):
+        events = []
+        for _, element in self._parser.read_events():
+            tag = element.tag if isinstance(element.tag, str) else ""
+            if tag == "p" or tag in _HEADINGS:
+                events.append((tag, self._text(element)))
+                # Free what has been consumed so memory stays flat on big pages.
+                element.clear()
+                parent = element.getparent()
+                while parent is not None and element.getprevious() is not None:
+                    del parent[0]
+        return events
+
+
+class _StdlibEvents(HTMLParser):
+    """Pure-Python fallback used when lxml is not installed."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._tag = None
+        self._parts = []
+        self._skip = 0
+        self._events = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._tag is None and (tag == "p" or tag in _HEADINGS):
+            self._tag, self._parts, self._skip = tag, [], 0
+        elif self._tag is not None and (self._skip or _is_edit_link(dict(attrs))):
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if self._tag is None:
+            return
+        if self._skip:
+            self._skip -= 1
+        elif tag == self._tag:
+            self._events.append((tag, "".join(self._parts)))
+            self._tag = None
+
+    def handle_data(self, data):
+        if self._tag is not None and not self._skip:
+            self._parts.append(data)
+
+    def feed(self, data):
+        if isinstance(data, bytes):
+            data = data.decode("utf-8", errors="replace")
+        super().feed(data)
+        events, self._events = self._events, []
+        return events
+
+    def close(self):
+        super().close()
+        events, self._events = self._events, []
+        return events
+
+
+def iter_paragraphs(fragments):
+    """Parse HTML incrementally and yield ``(section, paragraph)`` pairs.
+
+    Args:
+        fragments: Iterable of HTML pieces (str or bytes), e.g. the chunks of a
+            streamed HTTP response; the whole page is never held in memory.
+
+    Yields:
+        The <h2> section each non-empty <p> belongs to (LEAD_SECTION before
+        the first heading) and the paragraph's text.
+    """
+    parser = _LxmlEvents() if etree is not None else _StdlibEvents()
+    section = LEAD_SECTION
+
+    def handle(events):
+        nonlocal section
+        for tag, text in events:
+            text = _clean(text)
+            if tag == "h2" and text:
+                section = text
+            elif tag == "p" and text:
+                yield section, text
+
+    for fragment in fragments:
+        if fragment:
+            yield from handle(parser.feed(fragment))
+    yield from handle(parser.close())
+
+
+def _pieces(text, size):
+    """Split text into sentences, then words or hard slices, each <= size."""
+    for sentence in _SENTENCE_END.split(text):
+        if len(sentence) <= size:
+            yield sentence
+            continue
+        for word in sentence.split(" "):
+            for start in range(0, len(word), size):
+                yield word[start : start + size]
+
+
+def _tail(text, overlap):
+    """Return the trailing whole words of ``text`` within ``overlap`` chars."""
+    words = []
+    length = 0
+    for word in reversed(text.split(" ")):
+        length += len(word) + (1 if words else 0)
+        if length > overlap:
+            break
+        words.append(word)
+    return " ".join(reversed(words))
+
+
+def iter_text_chunks(texts, size=500, overlap=50):
+    """Yield chunks of at most ``size`` characters built from whole sentences.
+
+    Chunks end on a sentence boundary when possible (otherwise between words,
+    and only words longer than ``size`` are cut). Each chunk after the first
+    starts with the last whole words of the previous one, up to ``overlap``
+    characters.
+
+    Args:
+        texts: Iterable of paragraphs that belong together.
+        size: Maximum chunk length in characters.
+        overlap: Maximum length of the carried-over context in characters.
+    """
+    current = ""
+    for text in texts:
+        for piece in _pieces(text, size):
+            if not piece:
+                continue
+            if current and len(current) + 1 + len(piece) > size:
+                yield current
+                carry = _tail(current, overlap)
+                current = carry if len(carry) + 1 + len(piece) <= size else ""
+            current = f"{current} {piece}" if current else piece
+    if current:
+        yield current
+
+
+def iter_chunks(fragments, size=500, overlap=50):
+    """Stream section-aware chunks with metadata from HTML fragments.
+
+    Paragraphs are grouped by their <h2> section and chunked with
+    ``iter_text_chunks``; chunks never span two sections.
+
+    Yields:
+        Dicts with "text", "section" and "position" (the chunk's index on the
+        page).
+    """
+    position = 0
+    section = None
+    buffer = []
+
+    def flush():
+        nonlocal position
+        for text in iter_text_chunks(buffer, size, overlap):
+            yield {"text": text, "section": section, "position": position}
+            position += 1
+        buffer.clear()
+
+    for paragraph_section, paragraph in iter_paragraphs(fragments):
+        if paragraph_section != section:
+            yield from flush()
+            section = paragraph_section
+        buffer.append(paragraph)
+        # A long section is chunked as it streams in, keeping the buffer small.
+        if sum(map(len, buffer)) > size * 8:
+            *complete, last = list(iter_text_chunks(buffer, size, overlap))
+            for text in complete:
+                yield {"text": text, "section": section, "position": position}
+                position += 1
+            buffer[:] = [last]
+    yield from flush()
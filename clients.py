@@ -0,0 +1,72 @@
+import asyncio
+import threading
+import weakref
+
+_clients = {}
+_async_clients = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+def get_client(factory, *args, **kwargs):
+    """Return a process-wide shared client, creating it on first use.
+
+    Clients are cached per (factory, arguments), so every caller asking for the
+    same client with the same credentials reuses one instance and its HTTP
+    connection pool for the lifetime of the process or Lambda container. A
+    different factory, such as a test double patched over ``OpenAI``, gets its
+    own entry, so existing ``patch("module.OpenAI")`` style tests keep working.
+
+    Args:
+        factory: A client class or callable, e.g. ``OpenAI`` or ``pc.Index``.
+        *args: Positional arguments passed to the factory on first use.
+        **kwargs: Keyword arguments passed to the factory on first use.
+
+    Returns:
+        The shared client instance.
+    """
+    key = (factory, args, tuple(sorted(kwargs.items())))
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = factory(*args, **kwargs)
+                _clients[key] = client
+    return client
+
+
+def reset_clients():
+    """Drop every cached client so the next call builds a fresh one.
+
+    Intended for tests and for rotating credentials in a long-lived process.
+    """
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
+
+
+def get_async_client(factory, *args, **kwargs):
+    """Return a shared async client for the running event loop.
+
+    Async clients such as ``AsyncOpenAI`` hold connection pools bound to the
+    event loop they were first used on, so they are cached per loop (and per
+    factory and arguments, as in ``get_client``). Clients of a loop that has been
+    garbage collected are dropped with it.
+
+    Args:
+        factory: An async client class or callable, e.g. ``AsyncOpenAI``.
+        *args: Positional arguments passed to the factory on first use.
+        **kwargs: Keyword arguments passed to the factory on first use.
+
+    Returns:
+        The shared client instance for the current event loop.
+    """
+    loop = asyncio.get_running_loop()
+    key = (factory, args, tuple(sorted(kwargs.items())))
+    with _lock:
+        loop_clients = _async_clients.setdefault(loop, {})
+        client = loop_clients.get(key)
+        if client is None:
+            client = factory(*args, **kwargs)
+            loop_clients[key] = client
+    return client
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+_portal_loop = None
+_portal_lock = threading.Lock()
+
+
+def _get_portal_loop():
+    """Start (once) the background event loop used by ``run_sync``."""
+    global _portal_loop
+    if _portal_loop is None:
+        with _portal_lock:
+            if _portal_loop is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="run-sync-portal", daemon=True
+                )
+                thread.start()
+                _portal_loop = loop
+    return _portal_loop
+
+
+def run_sync(coro):
+    """Run a coroutine to completion from synchronous code.
+
+    Coroutines are executed on one long-lived background event loop rather than
+    a fresh ``asyncio.run`` loop per call, so loop-bound async clients (and their
+    connection pools) are reused across synchronous callers.
+
+    Args:
+        coro: The coroutine to run.
+
+    Returns:
+        The coroutine's result. Exceptions raised by the coroutine propagate.
+
+    Raises:
+        RuntimeError: If called from a coroutine running on the background loop.
+    """
+    loop = _get_portal_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coro.close()
+        raise RuntimeError("run_sync() cannot be called from the run_sync loop")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
@@ -0,0 +1,74 @@
+import itertools
+import re
+import zlib
+
+from lazy import lazy_module
+
+# NumPy is only imported when the first vector is built.
+np = lazy_module("numpy")
+
+EMBED_DIM = 512
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Words that carry no meaning for matching travel questions against each other.
+_STOPWORDS = {
+    "a", "about", "an", "and", "any", "are", "at", "be", "best", "can", "could",
+    "do", "for", "good", "i", "in", "is", "it", "me", "most", "my", "of", "on",
+    "please", "should", "some", "tell", "the", "there", "to", "top", "us", "we",
+    "what", "whats", "where", "which", "while", "with", "would", "you",
+}  # fmt: skip
+
+# Common phrasings of the same intent, mapped onto one canonical feature.
+_SYNONYMS = {
+    "attraction": "sights",
+    "attractions": "sights",
+    "landmarks": "sights",
+    "see": "sights",
+    "sightseeing": "sights",
+    "sights": "sights",
+    "things": "sights",
+    "visit": "sights",
+    "eat": "food",
+    "eating": "food",
+    "dishes": "food",
+    "restaurants": "food",
+    "stay": "sleep",
+    "hotels": "sleep",
+    "accommodation": "sleep",
+}
+
+
+def _features(text):
+    """Return the unigram and bigram features of a text."""
+    words = []
+    for word in _WORD.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        word = _SYNONYMS.get(word, word)
+        if not words or words[-1] != word:
+            words.append(word)
+    return words + [f"{a} {b}" for a, b in itertools.pairwise(words)]
+
+
+def hash_embed(text, dim=EMBED_DIM):
+    """Embed a text locally with signed feature hashing.
+
+    A lightweight lexical embedding that needs no model or network call: each
+    unigram and bigram (after dropping stopwords and folding common synonyms) is
+    hashed to a signed dimension. Near-identical phrasings of a question end up
+    with a high cosine similarity.
+
+    Args:
+        text: The text to embed.
+        dim: Number of dimensions (default: EMBED_DIM).
+
+    Returns:
+        A unit-length float32 NumPy vector (all zeros for text without features).
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        h = zlib.crc32(feature.encode())
+        vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,225 @@
+import datetime
+import re
+
+from iata import get_place_index
+
+# Cities with a knowledge namespace in the vector index (see README).
+KNOWN_CITIES = (
+    "Bangkok",
+    "Hong Kong",
+    "Kuala Lumpur",
+    "Kyoto",
+    "Melbourne",
+    "Osaka",
+    "Seoul",
+    "Sydney",
+    "Taipei",
+    "Tokyo",
+)
+
+# Wikivoyage city-page sections chunks are tagged with, and words that point a
+# question at each of them.
+SECTION_KEYWORDS = {
+    "Get in": ("airport", "arrive", "arriving", "visa", "get to", "getting to"),
+    "Get around": (
+        "get around", "getting around", "transport", "metro", "subway",
+        "bus", "taxi", "train", "tram",
+    ),
+    "See": (
+        "see", "sights", "sightseeing", "attraction", "attractions",
+        "landmark", "landmarks", "museum", "museums", "temple", "temples",
+    ),
+    "Do": (
+        "things to do", "activities", "activity", "festival", "festivals",
+        "hiking", "tour",
+    ),
+    "Buy": ("buy", "shop", "shopping", "souvenir", "souvenirs", "market", "markets"),
+    "Eat": (
+        "eat", "food", "restaurant", "restaurants", "dish", "dishes",
+        "cuisine", "breakfast", "lunch", "dinner",
+    ),
+    "Drink": ("drink", "drinks", "bar", "bars", "nightlife", "cafe", "cafes", "beer"),
+    "Sleep": (
+        "sleep", "hotel", "hotels", "hostel", "hostels", "accommodation",
+        "where to stay",
+    ),
+    "Stay safe": ("safe", "safety", "scam", "scams", "crime"),
+}  # fmt: skip
+CITY_SECTIONS = tuple(SECTION_KEYWORDS)
+
+_SECTION_PATTERNS = {
+    section: re.compile(
+        r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b",
+        re.IGNORECASE,
+    )
+    for section, words in SECTION_KEYWORDS.items()
+}
+
+_CITY = re.compile(
+    r"\b(" + "|".join(re.escape(city) for city in KNOWN_CITIES) + r")\b",
+    re.IGNORECASE,
+)
+# Upper-case IATA codes joined by "to", an arrow or a dash, optionally after "from".
+_ROUTE = re.compile(r"\b([A-Z]{3})\s*(?:\bto\b|->|→|–|-)\s*([A-Z]{3})\b")
+# Codes in parentheses after place names: "New York (JFK) to London (LHR)".
+_NAMED_ROUTE = re.compile(r"\(([A-Z]{3})\)[^()]{0,40}?\bto\b[^()]{0,40}?\(([A-Z]{3})\)")
+# Words marking a prompt as a question about flying rather than about a city.
+_FLYING = re.compile(r"\b(?:fly|flying|flights?|airfares?|fares?)\b", re.IGNORECASE)
+_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_MONTHS = (
+    "january", "february", "march", "april", "may", "june",
+    "july", "august", "september", "october", "november", "december",
+)  # fmt: skip
+_MONTH = r"(" + "|".join(m[:3] + f"(?:{m[3:]})?" for m in _MONTHS) + r")\.?"
+_DAY = r"(\d{1,2})(?:st|nd|rd|th)?"
+# "December 15, 2025" and "15 Dec 2025".
+_MONTH_DAY_DATE = re.compile(rf"\b{_MONTH}\s+{_DAY},?\s+(\d{{4}})\b", re.IGNORECASE)
+_DAY_MONTH_DATE = re.compile(rf"\b{_DAY}\s+{_MONTH},?\s+(\d{{4}})\b", re.IGNORECASE)
+_NUMBER_WORDS = (
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+)  # fmt: skip
+_TRAVELLERS = r"(?:adults?|passengers?|people|persons|travell?ers)"
+_ADULTS = re.compile(
+    rf"\b(\d+|{'|'.join(_NUMBER_WORDS)})\s+{_TRAVELLERS}\b", re.IGNORECASE
+)
+# Any mention of travellers, including ones search_flights cannot book.
+_PASSENGERS = re.compile(
+    rf"\b(?:{_TRAVELLERS}|child|children|kids?|infants?|family|couple|group)\b",
+    re.IGNORECASE,
+)
+
+
+def _city_mentions(text):
+    for match in _CITY.finditer(text):
+        city = next(c for c in KNOWN_CITIES if c.casefold() == match[1].casefold())
+        yield city, match
+
+
+def find_cities(text):
+    """Return the known cities mentioned in ``text``, in order, without repeats."""
+    cities = []
+    for city, _ in _city_mentions(text):
+        if city not in cities:
+            cities.append(city)
+    return cities
+
+
+def find_date(text):
+    """Return the first full date in ``text`` as YYYY-MM-DD, or None.
+
+    ISO dates and dates with a month name and year ("December 15, 2025",
+    "15 Dec 2025") are recognized; relative dates ("next Friday") are not.
+    """
+    candidates = []
+    if match := _DATE.search(text):
+        candidates.append((match.start(), match[1]))
+    for pattern, groups in ((_MONTH_DAY_DATE, (1, 2)), (_DAY_MONTH_DATE, (2, 1))):
+        for match in pattern.finditer(text):
+            month = next(
+                i
+                for i, name in enumerate(_MONTHS, 1)
+                if name.startswith(match[groups[0]].casefold())
+            )
+            try:
+                date = datetime.date(int(match[3]), month, int(match[groups[1]]))
+            except ValueError:
+                continue
+            candidates.append((match.start(), date.isoformat()))
+            break
+    return min(candidates)[1] if candidates else None
+
+
+def _find_route(text):
+    """Return the first route match whose codes are both in the IATA index."""
+    index = get_place_index()
+    for pattern in (_ROUTE, _NAMED_ROUTE):
+        for match in pattern.finditer(text):
+            if index.get(match[1]) and index.get(match[2]):
+                return match
+    return None
+
+
+def _find_adults(text):
+    """Return the number of adults in ``text`` (default 1), or None if unclear."""
+    if not _PASSENGERS.search(text):
+        return 1
+    match = _ADULTS.search(text)
+    if not match or _PASSENGERS.search(text[: match.start()] + text[match.end() :]):
+        return None
+    count = match[1].casefold()
+    return int(count) if count.isdigit() else _NUMBER_WORDS.index(count) + 1
+
+
+def _in_route(text, mention, route):
+    """Whether a city mention names an endpoint of ``route`` ("Tokyo (HND) to ...")."""
+    if route.start() <= mention.start() < route.end():
+        return True
+    return (
+        mention.end() <= route.start()
+        and not text[mention.end() : route.start()].strip()
+    )
+
+
+def find_flight_search(text):
+    """Return search_flights arguments spelled out in ``text``, or None.
+
+    Only explicit requests are recognized: an upper-case route of codes known
+    to the IATA index, such as "KIX to HND", "JFK→LHR" or "New York (JFK) to
+    London (LHR)", and a full date (see ``find_date``). The number of adults
+    ("10 adults", "two passengers") defaults to 1; prompts mentioning
+    travellers in any other way ("a family of four", "2 adults and a child")
+    return None, leaving them to the model.
+    """
+    route = _find_route(text)
+    date = find_date(text)
+    adults = _find_adults(text)
+    if not route or not date or adults is None:
+        return None
+    return {
+        "origin": route[1],
+        "destination": route[2],
+        "date": date,
+        "adults": adults,
+    }
+
+
+def find_tool_calls(text):
+    """Return the tool calls a prompt unambiguously asks for.
+
+    A spelled-out flight search (see ``find_flight_search``) becomes a
+    ``search_flights`` call. Known cities become ``query_city`` calls asking
+    the prompt itself, unless the prompt is about flying and asks about no
+    guide section ("Cheaper to fly from Bangkok or Kuala Lumpur to Sydney?");
+    cities only named as endpoints of the flight route are never queried.
+
+    Returns:
+        A list of ``(name, args)`` tuples, empty when nothing was recognized.
+    """
+    calls = []
+    flight = find_flight_search(text)
+    if flight:
+        calls.append(("search_flights", flight))
+    if (flight or _FLYING.search(text)) and find_section(text) is None:
+        return calls
+
+    route = flight and _find_route(text)
+    cities = []
+    for city, mention in _city_mentions(text):
+        if city not in cities and not (route and _in_route(text, mention, route)):
+            cities.append(city)
+    calls += [("query_city", {"city": city, "question": text}) for city in cities]
+    return calls
+
+
+def find_section(text):
+    """Return the single city-page section ``text`` asks about, or None.
+
+    Questions matching the keywords of several sections ("food and hotels")
+    or none at all return None, so retrieval searches the whole page.
+    """
+    matches = [
+        section
+        for section, pattern in _SECTION_PATTERNS.items()
+        if pattern.search(text)
+    ]
+    return matches[0] if len(matches) == 1 else None
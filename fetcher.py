@@ -0,0 +1,225 @@
+import codecs
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from clients import get_client
+
+# Pages fetched for ingestion are kept here with their ETag/Last-Modified, so
+# re-ingesting a city sends a conditional request and reuses the stored body.
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", ".fetch_cache")
+# With FETCH_OFFLINE=true pages are only served from the cache (no network).
+FETCH_OFFLINE = os.getenv("FETCH_OFFLINE", "false").lower() == "true"
+# Seconds a cached page is used without revalidating it (0: always revalidate).
+FETCH_CACHE_TTL = float(os.getenv("FETCH_CACHE_TTL", "0"))
+# Politeness: concurrent requests per host and minimum seconds between them.
+FETCH_PER_HOST = int(os.getenv("FETCH_PER_HOST", "2"))
+FETCH_HOST_DELAY = float(os.getenv("FETCH_HOST_DELAY", "0.1"))
+FETCH_TIMEOUT = float(os.getenv("FETCH_TIMEOUT", "30"))
+FETCH_USER_AGENT = os.getenv("FETCH_USER_AGENT", "Mozilla/5.0")
+FETCH_READ_SIZE = 65536
+
+
+class CachedResponse:
+    """A fetched page, read back from the on-disk cache.
+
+    Offers the subset of ``requests.Response`` used by ingestion, so the body
+    can be streamed from disk in pieces instead of loaded at once.
+
+    Attributes:
+        url: The requested URL.
+        status_code: Always 200; failed fetches raise instead.
+        headers: The stored "ETag" and "Last-Modified" validators.
+        from_cache: True when the body was not downloaded by this fetch.
+        not_modified: True when the server answered 304 to a conditional GET.
+    """
+
+    status_code = 200
+
+    def __init__(self, url, path, meta, from_cache=False, not_modified=False):
+        self.url = url
+        self.path = path
+        self.encoding = meta.get("encoding") or "utf-8"
+        self.headers = {
+            key: meta[field]
+            for key, field in (("ETag", "etag"), ("Last-Modified", "last_modified"))
+            if meta.get(field)
+        }
+        self.from_cache = from_cache
+        self.not_modified = not_modified
+
+    def iter_content(self, chunk_size=FETCH_READ_SIZE, decode_unicode=False):
+        """Yield the body in pieces of ``chunk_size`` bytes (decoded if asked)."""
+        decoder = codecs.getincrementaldecoder(self.encoding)(errors="replace")
+        with open(self.path, "rb") as f:
+            while data := f.read(chunk_size):
+                yield decoder.decode(data) if decode_unicode else data
+        if decode_unicode:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+
+    @property
+    def text(self):
+        with open(self.path, "rb") as f:
+            return f.read().decode(self.encoding, errors="replace")
+
+    def raise_for_status(self):
+        pass
+
+
+class Fetcher:
+    """HTTP GET with a pooled session, an on-disk cache and per-host limits.
+
+    Bodies are stored with their ETag/Last-Modified. A later fetch of the same
+    URL sends If-None-Match/If-Modified-Since, and a 304 answer is served from
+    the cache without downloading the page again. Gzip-encoded responses are
+    decompressed by ``requests`` before they are stored.
+
+    Args:
+        cache_dir: Directory of the response cache.
+        offline: Only serve cached pages; a miss raises FileNotFoundError.
+        ttl: Seconds a cached page is served without revalidation.
+        per_host: Maximum concurrent requests to one host.
+        host_delay: Minimum seconds between the starts of requests to one host.
+        timeout: Request timeout in seconds.
+        session: Optional ``requests.Session`` (or stand-in) to send requests.
+    """
+
+    def __init__(
+        self,
+        cache_dir=FETCH_CACHE_DIR,
+        offline=FETCH_OFFLINE,
+        ttl=FETCH_CACHE_TTL,
+        per_host=FETCH_PER_HOST,
+        host_delay=FETCH_HOST_DELAY,
+        timeout=FETCH_TIMEOUT,
+        session=None,
+    ):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.ttl = ttl
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.timeout = timeout
+        self.session = session or self._session(per_host)
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session(per_host):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=max(per_host, 1))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = FETCH_USER_AGENT
+        return session
+
+    def _paths(self, url):
+        digest = hashlib.sha256(url.encode()).hexdigest()
+        base = os.path.join(self.cache_dir, digest[:2], digest)
+        return f"{base}.json", f"{base}.body"
+
+    def _load_meta(self, meta_path, body_path):
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        return meta if os.path.exists(body_path) else None
+
+    @contextmanager
+    def _host_slot(self, url):
+        """Hold one of the host's request slots, spacing out request starts."""
+        host = urlsplit(url).netloc
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                state = self._hosts[host] = {
+                    "slots": threading.BoundedSemaphore(max(self.per_host, 1)),
+                    "lock": threading.Lock(),
+                    "next": 0.0,
+                }
+        with state["slots"]:
+            with state["lock"]:
+                wait = state["next"] - time.monotonic()
+                state["next"] = max(state["next"], time.monotonic()) + self.host_delay
+            if wait > 0:
+                time.sleep(wait)
+            yield
+
+    def fetch(self, url):
+        """Return the page at ``url``, from the cache when it is still valid.
+
+        Raises:
+            FileNotFoundError: In offline mode, when the page is not cached.
+            requests.HTTPError: When the server answers with an error status.
+        """
+        meta_path, body_path = self._paths(url)
+        meta = self._load_meta(meta_path, body_path)
+
+        if self.offline:
+            if meta is None:
+                raise FileNotFoundError(f"{url} is not cached (offline mode)")
+            return CachedResponse(url, body_path, meta, from_cache=True)
+        if meta and time.time() - meta.get("fetched_at", 0) < self.ttl:
+            return CachedResponse(url, body_path, meta, from_cache=True)
+
+        headers = {}
+        if meta and meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta and meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+        with self._host_slot(url):
+            response = self.session.get(
+                url, headers=headers, timeout=self.timeout, stream=True
+            )
+            try:
+                if response.status_code == 304 and meta:
+                    meta["fetched_at"] = time.time()
+                    self._write_meta(meta_path, meta)
+                    return CachedResponse(
+                        url, body_path, meta, from_cache=True, not_modified=True
+                    )
+                response.raise_for_status()
+                meta = self._store(response, url, meta_path, body_path)
+            finally:
+                response.close()
+        return CachedResponse(url, body_path, meta)
+
+    def _store(self, response, url, meta_path, body_path):
+        """Stream a response body to the cache and record its validators."""
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        tmp_path = f"{body_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.writelines(response.iter_content(chunk_size=FETCH_READ_SIZE))
+        os.replace(tmp_path, body_path)
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "encoding": response.encoding,
+            "fetched_at": time.time(),
+        }
+        self._write_meta(meta_path, meta)
+        return meta
+
+    @staticmethod
+    def _write_meta(meta_path, meta):
+        tmp_path = f"{meta_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
+
+
+def get_fetcher():
+    """Return the shared Fetcher configured by the FETCH_* settings."""
+    return get_client(Fetcher, FETCH_CACHE_DIR, offline=FETCH_OFFLINE)
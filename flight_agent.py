@@ -1,31 +1,163 @@
+import asyncio
+import copy
+import datetime
+import functools
 import os
-from amadeus import Client
-from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import urlopen
 
-load_dotenv()
+from cache import AsyncSingleFlight, SingleFlight, TTLCache
+from clients import get_client
+from concurrency import run_sync
+from iata import resolve_code
+from lazy import lazy_import
+from resilience import AMADEUS_TIMEOUT, dependency
+from settings import load_env
+from tracing import annotate, span
+
+load_env()
+
+# The Amadeus SDK is only imported when the first flight search runs.
+Client = lazy_import("amadeus", "Client")
+
+# Offers for popular routes are requested repeatedly within minutes, so results
+# are cached briefly; error results are never cached.
+FLIGHT_CACHE_TTL = float(os.getenv("FLIGHT_CACHE_TTL", "300"))
+FLIGHT_CACHE_SIZE = int(os.getenv("FLIGHT_CACHE_SIZE", "1024"))
+
+flight_cache = TTLCache(maxsize=FLIGHT_CACHE_SIZE, ttl=FLIGHT_CACHE_TTL)
+_in_flight = SingleFlight()
+_async_in_flight = AsyncSingleFlight()
+
+# Flexible searches (several airports and/or days) fan out into single searches,
+# at most FLEX_SEARCH_CONCURRENCY at a time and FLEX_MAX_SEARCHES in total, and
+# return the FLEX_MAX_RESULTS cheapest offers.
+FLEX_SEARCH_CONCURRENCY = int(os.getenv("FLEX_SEARCH_CONCURRENCY", "4"))
+FLEX_MAX_SEARCHES = int(os.getenv("FLEX_MAX_SEARCHES", "14"))
+FLEX_MAX_RESULTS = int(os.getenv("FLEX_MAX_RESULTS", "10"))
+
+# Amadeus requests (and their hedged duplicates) run in their own threads, so
+# a slow Amadeus cannot exhaust the event loop's default executor. Its HTTP
+# requests time out with AMADEUS_TIMEOUT, so an attempt abandoned by the
+# deadline frees its thread soon after.
+_amadeus_pool = ThreadPoolExecutor(max_workers=16, thread_name_prefix="amadeus")
+_amadeus_http = functools.partial(urlopen, timeout=AMADEUS_TIMEOUT)
+
+
+def normalize_flight_query(origin, destination, date, adults=1):
+    """Validate and normalize flight search arguments.
+
+    Args:
+        origin: Origin airport or city IATA code in any case, or a place name
+            such as "Kuala Lumpur" (resolved with ``iata.resolve_code``).
+        destination: Destination airport or city IATA code or place name.
+        date: Departure date in YYYY-MM-DD format.
+        adults: Number of adult passengers (1-9).
+
+    Returns:
+        A ``(origin, destination, date, adults)`` tuple with uppercase codes, an
+        ISO date string and an int passenger count.
+
+    Raises:
+        ValueError: If a code or place, the date or the passenger count is
+            invalid.
+    """
+    origin = resolve_code(origin)
+    destination = resolve_code(destination)
+
+    date = _parse_date(date).isoformat()
+
+    adults = int(adults)
+    if not 1 <= adults <= 9:
+        raise ValueError("Number of adults must be between 1 and 9")
+
+    return origin, destination, date, adults
+
+
+def _parse_date(date):
+    try:
+        return datetime.date.fromisoformat(str(date).strip())
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}, expected YYYY-MM-DD") from None
 
 
 def search_flights(origin: str, destination: str, date: str, adults: int = 1):
     """Search flights using the Amadeus client and return simplified results.
 
+    Successful results are cached for FLIGHT_CACHE_TTL seconds, keyed on the
+    normalized (origin, destination, date, adults), and concurrent identical
+    searches share one Amadeus call.
+
     Args:
-        origin: Origin airport or city IATA code.
-        destination: Destination airport or city IATA code.
+        origin: Origin airport or city IATA code, or a place name.
+        destination: Destination airport or city IATA code, or a place name.
         date: Departure date in YYYY-MM-DD format.
         adults: Number of adult passengers.
 
     Returns:
         A list of flight options with price and first-itinerary segment details, or
-        an error dict if the Amadeus client raises a ResponseError.
+        an error dict if the arguments are invalid or the Amadeus client raises a
+        ResponseError.
     """
+    try:
+        key = normalize_flight_query(origin, destination, date, adults)
+    except ValueError as error:
+        return {"error": str(error)}
+
+    results = flight_cache.get(key)
+    annotate(flight_cache_hit=results is not None)
+    if results is None:
+        results = _in_flight.do(key, lambda: _search_and_cache(*key))
+    return copy.deepcopy(results)
+
+
+def _search_and_cache(origin, destination, date, adults):
+    """Synchronous wrapper around ``_search_and_cache_async``."""
+    return run_sync(_search_and_cache_async(origin, destination, date, adults))
+
+
+async def _search_and_cache_async(origin, destination, date, adults):
+    """Call Amadeus for a normalized query and cache successful results.
+
+    The cache is checked again first: a caller that missed it just before an
+    earlier identical search finished becomes a new leader, and must reuse
+    that result rather than call Amadeus a second time.
+    """
+    cached = flight_cache.peek((origin, destination, date, adults))
+    if cached is not None:
+        return cached
+    with span("amadeus.search", origin=origin, destination=destination) as s:
+        results = await _search_flights_uncached(origin, destination, date, adults)
+        if isinstance(results, dict):
+            s.set(error=str(results.get("error")))
+    if isinstance(results, list):
+        flight_cache.set((origin, destination, date, adults), results)
+    return results
+
+
+async def _in_amadeus_pool(fn, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_amadeus_pool, lambda: fn(**kwargs))
+
+
+async def _search_flights_uncached(origin, destination, date, adults):
+    """Query Amadeus for flight offers without consulting the cache."""
 
     AMADEUS_ID = os.getenv("AMADEUS_ID")
     AMADEUS_SECRET = os.getenv("AMADEUS_SECRET")
 
-    amadeus = Client(client_id=AMADEUS_ID, client_secret=AMADEUS_SECRET)
+    # The shared client keeps its OAuth token and only refreshes it on expiry.
+    amadeus = get_client(
+        Client, client_id=AMADEUS_ID, client_secret=AMADEUS_SECRET, http=_amadeus_http
+    )
 
     try:
-        response = amadeus.shopping.flight_offers_search.get(
+        # Flight searches are idempotent reads: deadline-bound, retried, hedged
+        # and behind the "amadeus" circuit breaker.
+        response = await dependency("amadeus").call(
+            _in_amadeus_pool,
+            amadeus.shopping.flight_offers_search.get,
+            idempotent=True,
             originLocationCode=origin,
             destinationLocationCode=destination,
             departureDate=date,
@@ -52,3 +184,168 @@ def search_flights(origin: str, destination: str, date: str, adults: int = 1):
         return results
     except Exception as error:
         return {"error": str(error)}
+
+
+async def search_flights_async(
+    origin: str, destination: str, date: str, adults: int = 1
+):
+    """Async variant of ``search_flights``.
+
+    The Amadeus call is awaited directly: only the SDK request itself runs in
+    a worker thread (the SDK has no async client), so no other thread sits
+    blocked waiting for it. Concurrent identical searches on the event loop
+    share one call, and the cache is shared with ``search_flights``.
+
+    Args:
+        origin: Origin airport or city IATA code, or a place name.
+        destination: Destination airport or city IATA code, or a place name.
+        date: Departure date in YYYY-MM-DD format.
+        adults: Number of adult passengers.
+
+    Returns:
+        The same result as ``search_flights``.
+    """
+    try:
+        key = normalize_flight_query(origin, destination, date, adults)
+    except ValueError as error:
+        return {"error": str(error)}
+
+    results = flight_cache.get(key)
+    annotate(flight_cache_hit=results is not None)
+    if results is None:
+        results = await _async_in_flight.do(key, lambda: _search_and_cache_async(*key))
+    return copy.deepcopy(results)
+
+
+def expand_flight_searches(origins, destinations, date_from, date_to=None, adults=1):
+    """Expand sets of airports and a date range into single searches.
+
+    Args:
+        origins: Origin IATA codes or place names, as a list or a
+            comma-separated string.
+        destinations: Destination IATA codes or place names, likewise.
+        date_from: First departure date in YYYY-MM-DD format.
+        date_to: Last departure date (inclusive); defaults to ``date_from``.
+        adults: Number of adult passengers.
+
+    Returns:
+        A list of normalized ``(origin, destination, date, adults)`` tuples, one
+        per route and day, skipping routes whose origin is also the destination.
+
+    Raises:
+        ValueError: If an argument is invalid, the range is reversed, or there
+            are more than FLEX_MAX_SEARCHES searches.
+    """
+    origins, destinations = _codes(origins), _codes(destinations)
+    first = _parse_date(date_from)
+    last = _parse_date(date_to) if date_to else first
+    days = (last - first).days + 1
+    if days < 1:
+        raise ValueError(f"date_to {last} is before date_from {first}")
+
+    routes = [(o, d) for o in origins for d in destinations if o != d]
+    if not routes:
+        raise ValueError("Origins and destinations must differ")
+    # Checked before expanding, so a huge range is rejected in constant time.
+    if days * len(routes) > FLEX_MAX_SEARCHES:
+        raise ValueError(
+            f"{days * len(routes)} searches requested, at most {FLEX_MAX_SEARCHES} "
+            "are allowed; narrow the dates or airports"
+        )
+    return [
+        normalize_flight_query(
+            origin, destination, first + datetime.timedelta(n), adults
+        )
+        for n in range(days)
+        for origin, destination in routes
+    ]
+
+
+def _codes(codes):
+    if isinstance(codes, str):
+        codes = codes.split(",")
+    codes = list(
+        dict.fromkeys(resolve_code(code) for code in codes or () if str(code).strip())
+    )
+    if not codes:
+        raise ValueError("At least one IATA code is required")
+    return codes
+
+
+def merge_flight_results(results, limit=None):
+    """Merge the offers of several searches into one price-ranked list.
+
+    Offers flying the same segments at the same times are kept once, at their
+    lowest price. Error results are skipped.
+
+    Args:
+        results: Search results, each a list of offers or an error dict.
+        limit: Maximum number of offers to return (default: FLEX_MAX_RESULTS).
+
+    Returns:
+        Up to ``limit`` offers, cheapest first.
+    """
+    best = {}
+    for offers in results:
+        if not isinstance(offers, list):
+            continue
+        for offer in offers:
+            signature = tuple(
+                (s.get("from"), s.get("to"), s.get("carrier"), s.get("departure_time"))
+                for s in offer.get("itineraries") or []
+            )
+            kept = best.get(signature)
+            if kept is None or _price(offer) < _price(kept):
+                best[signature] = offer
+    ranked = sorted(best.values(), key=_price)
+    return ranked[: limit or FLEX_MAX_RESULTS]
+
+
+def _price(offer):
+    try:
+        return float(offer.get("price"))
+    except (TypeError, ValueError):
+        return float("inf")
+
+
+async def search_flight_options_async(
+    origins, destinations, date_from, date_to=None, adults=1
+):
+    """Search every route and day of a flexible query and merge the offers.
+
+    The single searches run concurrently, at most FLEX_SEARCH_CONCURRENCY at a
+    time so a wide query does not exhaust the Amadeus quota, and each goes
+    through ``search_flights`` and so its cache.
+
+    Args:
+        origins: Origin IATA codes or place names, as a list or a
+            comma-separated string.
+        destinations: Destination IATA codes or place names, likewise.
+        date_from: First departure date in YYYY-MM-DD format.
+        date_to: Last departure date (inclusive); defaults to ``date_from``.
+        adults: Number of adult passengers.
+
+    Returns:
+        Up to FLEX_MAX_RESULTS offers, cheapest first, or an error dict if the
+        arguments are invalid or every search failed.
+    """
+    try:
+        searches = expand_flight_searches(
+            origins, destinations, date_from, date_to, adults
+        )
+    except (TypeError, ValueError) as error:
+        return {"error": str(error)}
+
+    semaphore = asyncio.Semaphore(FLEX_SEARCH_CONCURRENCY)
+
+    async def search(query):
+        async with semaphore:
+            return await search_flights_async(*query)
+
+    with span("amadeus.flexible", searches=len(searches)) as s:
+        results = await asyncio.gather(*(search(query) for query in searches))
+        errors = [r["error"] for r in results if isinstance(r, dict)]
+        s.set(errors=len(errors))
+    if len(errors) == len(results):
+        return {"error": errors[0]}
+    return merge_flight_results(results)
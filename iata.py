@@ -0,0 +1,302 @@
+import bisect
+import mmap
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+
+from clients import get_client
+
+# Bundled offline airport/city dataset (columns are described in its header).
+IATA_DATA_PATH = os.getenv(
+    "IATA_DATA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "iata.tsv"),
+)
+# Minimum name similarity (0-1) for a misspelling such as "Kula Lumpor" to be
+# resolved; less similar names (e.g. "Atlantis" for Atlanta) are only offered
+# as suggestions from IATA_SUGGEST_THRESHOLD up.
+IATA_FUZZY_THRESHOLD = float(os.getenv("IATA_FUZZY_THRESHOLD", "0.85"))
+IATA_SUGGEST_THRESHOLD = float(os.getenv("IATA_SUGGEST_THRESHOLD", "0.6"))
+# Names sharing the most trigrams with a query are the fuzzy candidates.
+IATA_FUZZY_CANDIDATES = 20
+
+_CODE = re.compile(r"^[A-Za-z]{3}$")
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+@dataclass(frozen=True)
+class Place:
+    """An airport or city of the bundled index.
+
+    Attributes:
+        kind: "airport" or "city".
+        code: The IATA code to search flights with: the airport's code, or a
+            city's metro code (e.g. "TYO"), or its main airport's code when it
+            has none.
+        name: The airport name, or the city's Wikivoyage page title.
+        city: The Wikivoyage page title of the city served.
+        country: ISO 3166-1 alpha-2 country code.
+        airports: Codes of the airports serving the place, main airport first.
+    """
+
+    kind: str
+    code: str
+    name: str
+    city: str
+    country: str
+    airports: tuple
+
+
+def normalize_name(text):
+    """Fold a place name for matching ("São Paulo" -> "sao paulo", "Xi'an" -> "xian")."""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.casefold().replace("'", "").replace("’", "")
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def _trigrams(key):
+    padded = f" {key} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class PlaceIndex:
+    """Airports and cities by IATA code, name and alias.
+
+    Names match exactly after ``normalize_name``, then as an unambiguous prefix
+    ("Kual" -> Kuala Lumpur), then fuzzily by trigram similarity, so a lookup
+    is a few dict and bisect operations. Fuzzy candidates are the names
+    sharing the most trigrams with the query, ranked by ``SequenceMatcher``
+    ratio. The data file is memory-mapped and the index is built on the first
+    lookup, keeping it off the cold start.
+
+    Args:
+        path: The tab-separated dataset (see ``iata.tsv``).
+        threshold: Minimum similarity of a fuzzy match.
+    """
+
+    def __init__(self, path=IATA_DATA_PATH, threshold=IATA_FUZZY_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _rows(self):
+        with (
+            open(self.path, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            for line in iter(data.readline, b""):
+                if line.strip() and not line.startswith(b"#"):
+                    fields = line.decode("utf-8").rstrip("\r\n").split("\t")
+                    yield fields + [""] * (6 - len(fields))
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            cities, airports = [], []
+            for row in self._rows():
+                (cities if row[0] == "city" else airports).append(row)
+
+            served = {}
+            for _, code, _, _, city, _ in airports:
+                served.setdefault(city, []).append(code)
+            metro = {name: code for _, code, name, *_ in cities if code}
+
+            self._codes = {}
+            self._names = {}
+            self._cities = {}
+            for _, code, name, country, city, aliases in airports:
+                place = Place("airport", code, name, city, country, (code,))
+                self._codes[code] = place
+                self._add_names(place, name, aliases)
+            for _, code, name, country, served_by, aliases in cities:
+                # A city without an airport (e.g. Kyoto) is searched as the
+                # city whose airports serve it.
+                codes = tuple(served.get(served_by or name, ()))
+                code = code or metro.get(served_by) or codes[0]
+                place = Place("city", code, name, name, country, codes)
+                self._cities[name] = place
+                self._codes.setdefault(place.code, place)
+                self._add_names(place, name, aliases)
+
+            self._keys = sorted(self._names)
+            self._grams = {}
+            for key in self._keys:
+                for gram in _trigrams(key):
+                    self._grams.setdefault(gram, []).append(key)
+            self._gram_counts = {key: len(_trigrams(key)) for key in self._keys}
+            self._loaded = True
+
+    def _add_names(self, place, name, aliases):
+        for alias in [name, *aliases.split(",")]:
+            key = normalize_name(alias)
+            # A city owns its name over an airport named after it.
+            if key and (key not in self._names or place.kind == "city"):
+                self._names[key] = place
+
+    def get(self, code):
+        """Return the place with IATA ``code`` (any case), or None."""
+        self._load()
+        return self._codes.get(str(code).strip().upper())
+
+    def city(self, name):
+        """Return the city with exactly this code, name or alias, or None."""
+        self._load()
+        text = str(name).strip()
+        place = self._codes.get(text.upper()) if _CODE.match(text) else None
+        place = place or self._names.get(normalize_name(text))
+        return place and self._cities.get(place.city)
+
+    def named(self, name):
+        """Return the place with exactly this name or alias, or None."""
+        self._load()
+        return self._names.get(normalize_name(name))
+
+    def lookup(self, query):
+        """Return the place best matching a code, name or alias, or None.
+
+        Known codes and exact names win; otherwise a prefix matching a single
+        place (or only one city and its airports) is used, and finally the most
+        similar name at or above the fuzzy threshold.
+        """
+        self._load()
+        text = str(query).strip()
+        if _CODE.match(text) and text.upper() in self._codes:
+            return self._codes[text.upper()]
+        key = normalize_name(text)
+        if not key:
+            return None
+        if key in self._names:
+            return self._names[key]
+        if len(key) >= 3:
+            place = self._prefix_match(key)
+            if place is not None:
+                return place
+        matches = self.similar(key, self.threshold, limit=1)
+        return matches[0] if matches else None
+
+    def _prefix_match(self, key):
+        start = bisect.bisect_left(self._keys, key)
+        end = bisect.bisect_left(self._keys, key + "\uffff", start)
+        places = {self._names[k] for k in self._keys[start:end]}
+        if len(places) == 1:
+            return places.pop()
+        cities = {place.city for place in places}
+        if len(cities) == 1:
+            return self._cities.get(cities.pop())
+        return None
+
+    def similar(self, query, threshold, limit=3):
+        """Return up to ``limit`` places whose names are similar to ``query``.
+
+        Args:
+            query: A place name, in any form.
+            threshold: Minimum ``SequenceMatcher`` ratio of the folded names.
+            limit: Maximum number of places.
+
+        Returns:
+            Distinct places, most similar first.
+        """
+        self._load()
+        key = normalize_name(query)
+        grams = _trigrams(key)
+        shared = Counter(name for gram in grams for name in self._grams.get(gram, ()))
+        candidates = sorted(
+            shared,
+            key=lambda name: -shared[name] / (self._gram_counts[name] + len(grams)),
+        )[:IATA_FUZZY_CANDIDATES]
+        matcher = SequenceMatcher(b=key, autojunk=False)
+        scored = []
+        for name in candidates:
+            matcher.set_seq1(name)
+            score = matcher.ratio()
+            if score >= threshold:
+                scored.append((score, name))
+        places = []
+        for _, key in sorted(scored, key=lambda item: (-item[0], item[1])):
+            place = self._names[key]
+            if place not in places:
+                places.append(place)
+        return places[:limit]
+
+
+def get_place_index():
+    """Return the shared PlaceIndex configured by IATA_DATA_PATH."""
+    return get_client(PlaceIndex, IATA_DATA_PATH, threshold=IATA_FUZZY_THRESHOLD)
+
+
+def lookup(query):
+    """Return the airport or city best matching ``query``, or None."""
+    return get_place_index().lookup(query)
+
+
+def resolve_code(value):
+    """Resolve an IATA code or a place name to the code to search flights with.
+
+    Upper-case known codes come first ("GOA" is Genoa), then exact names and
+    aliases ("Goa" is Goa, served by GOI). Other three-letter values are
+    taken as codes, including ones missing from the bundled dataset, which
+    only covers major airports; remaining names are matched as in
+    ``PlaceIndex.lookup``.
+
+    Args:
+        value: A code such as "kul", or a name such as "Kuala Lumpur".
+
+    Returns:
+        The uppercase IATA code, e.g. "KUL" (or a metro code such as "TYO").
+
+    Raises:
+        ValueError: If the value is neither a code nor a known place; the
+            message suggests similar places when there are any.
+    """
+    text = str(value).strip()
+    index = get_place_index()
+    if _CODE.match(text) and text.isupper() and index.get(text) is not None:
+        return text
+    place = index.named(text)
+    if place is not None:
+        return place.code
+    if _CODE.match(text):
+        return text.upper()
+    place = index.lookup(text)
+    if place is not None:
+        return place.code
+    message = f"Unknown airport or city {text!r}, expected an IATA code"
+    suggestions = index.similar(text, IATA_SUGGEST_THRESHOLD)
+    if suggestions:
+        hint = ", ".join(f"{place.name} ({place.code})" for place in suggestions)
+        message += f"; did you mean {hint}?"
+    raise ValueError(message)
+
+
+def airports_for(city):
+    """Return the codes of the airports serving a city, airport or code.
+
+    Returns:
+        A tuple of airport codes (e.g. ("HND", "NRT") for "Tokyo"), empty when
+        the place is unknown.
+    """
+    place = lookup(city)
+    return place.airports if place else ()
+
+
+def canonical_city(name):
+    """Return the Wikivoyage page title of a city, given its name, alias or code.
+
+    Only exact matches are used, so an unknown city is returned as given
+    (stripped) rather than mapped onto a similar one.
+    """
+    place = get_place_index().city(name)
+    return place.name if place else str(name).strip()
+
+
+def wikivoyage_slug(city):
+    """Return the Wikivoyage page slug of a city ("kuala lumpur" -> "Kuala_Lumpur")."""
+    return canonical_city(city).replace(" ", "_")
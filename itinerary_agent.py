@@ -1,34 +1,223 @@
+import asyncio
+import logging
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from pinecone import Pinecone
+import re
+from clients import get_async_client, get_client
+from concurrency import run_sync
+from extractors import find_section
+from iata import canonical_city, wikivoyage_slug
+from local_index import VECTOR_BACKEND, get_local_index
+from lazy import lazy_import
+from resilience import GROQ_TIMEOUT, PINECONE_TIMEOUT, dependency
+from semantic_cache import SemanticCache
+from settings import load_env
+from tracing import annotate, span, token_counts
 
-load_dotenv()
+load_env()
 
+logger = logging.getLogger(__name__)
 
-def query_city(city: str, question: str):
+# The Groq (OpenAI) and Pinecone SDKs are only imported when first used.
+AsyncOpenAI = lazy_import("openai", "AsyncOpenAI")
+Pinecone = lazy_import("pinecone", "Pinecone")
+
+# Near-identical questions about a city ("top things to do in Tokyo" / "what to
+# see in Tokyo") reuse a stored answer, skipping both Pinecone and Groq.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "86400"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH")
+
+# Chunks carry the page section they came from; a question aimed at one section
+# ("where to eat") searches only that section, needing fewer hits for context.
+CITY_SEARCH_TOP_K = int(os.getenv("CITY_SEARCH_TOP_K", "3"))
+SECTION_SEARCH_TOP_K = int(os.getenv("SECTION_SEARCH_TOP_K", "2"))
+
+# "answer" runs a nested completion per city and returns its prose; "retrieve"
+# returns the ranked passages themselves, leaving synthesis to the outer
+# completion (one model call per request instead of 2 + one per city).
+CITY_QUERY_MODE = os.getenv("CITY_QUERY_MODE", "answer")
+# Passages whose word sets overlap at least this much with a higher-ranked one
+# are dropped in retrieve mode (chunk overlap makes neighbours look alike).
+PASSAGE_DEDUPE_THRESHOLD = float(os.getenv("PASSAGE_DEDUPE_THRESHOLD", "0.8"))
+_WORD = re.compile(r"\w+")
+
+answer_cache = SemanticCache(
+    threshold=SEMANTIC_CACHE_THRESHOLD,
+    ttl=SEMANTIC_CACHE_TTL,
+    maxsize=SEMANTIC_CACHE_SIZE,
+    path=SEMANTIC_CACHE_PATH,
+)
+
+
+def get_index():
+    """Return the vector index used for city search.
+
+    This is the shared Pinecone "travel-knowledge" index, or the local
+    memory-mapped index when VECTOR_BACKEND is "local".
+    """
+    if VECTOR_BACKEND == "local":
+        return get_local_index()
+
+    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
+
+    # Searches are deadline-bound by the "pinecone" dependency; the client's
+    # own timeout ends the requests it has given up on.
+    pc = get_client(Pinecone, api_key=PINECONE_API_KEY, timeout=PINECONE_TIMEOUT)
+    return get_client(pc.Index, "travel-knowledge")
+
+
+def _search(index, city, question, section):
+    """Search a city's namespace, within ``section`` when one is given.
+
+    A section search that finds nothing (e.g. a city ingested before chunks
+    carried sections) falls back to searching the whole namespace. Namespaces
+    are Wikivoyage page slugs ("Kuala_Lumpur"), as written by ``embed_db``.
+    """
+    namespace = wikivoyage_slug(city)
+    if section:
+        results = index.search(
+            namespace=namespace,
+            query={
+                "inputs": {"text": question},
+                "top_k": SECTION_SEARCH_TOP_K,
+                "filter": {"section": {"$eq": section}},
+            },
+            fields=["text", "section"],
+        )
+        if results["result"]["hits"]:
+            return results
+    return index.search(
+        namespace=namespace,
+        query={"inputs": {"text": question}, "top_k": CITY_SEARCH_TOP_K},
+        fields=["text", "section"],
+    )
+
+
+async def _vector_search(index, city, question, section):
+    """Run ``_search`` in a worker thread.
+
+    Pinecone searches are idempotent reads, so they go through the "pinecone"
+    dependency: deadline-bound, retried, hedged and behind a circuit breaker.
+    """
+    if VECTOR_BACKEND == "local":
+        return await asyncio.to_thread(_search, index, city, question, section)
+    return await dependency("pinecone").call(
+        asyncio.to_thread, _search, index, city, question, section, idempotent=True
+    )
+
+
+def rank_passages(hits, threshold=None):
+    """Turn search hits into ranked, deduplicated passages.
+
+    Args:
+        hits: Pinecone-style hits with "_score" and "fields".
+        threshold: Word-set (Jaccard) similarity at which a passage counts as a
+            duplicate of a higher-scored one (default: PASSAGE_DEDUPE_THRESHOLD).
+
+    Returns:
+        A list of dicts with "text", "score" and, when known, "section",
+        highest score first.
+    """
+    threshold = PASSAGE_DEDUPE_THRESHOLD if threshold is None else threshold
+    passages = []
+    kept_words = []
+    for hit in sorted(hits, key=lambda h: h.get("_score", 0.0), reverse=True):
+        text = hit["fields"]["text"].strip()
+        words = set(_WORD.findall(text.casefold()))
+        if not words or any(
+            len(words & other) / len(words | other) >= threshold for other in kept_words
+        ):
+            continue
+        kept_words.append(words)
+        passage = {"text": text, "score": round(float(hit.get("_score", 0.0)), 3)}
+        if hit["fields"].get("section"):
+            passage["section"] = hit["fields"]["section"]
+        passages.append(passage)
+    return passages
+
+
+async def retrieve_city_context_async(
+    city: str, question: str, section: str | None = None
+):
+    """Return ranked context passages about a city without calling the LLM.
+
+    Args:
+        city: The city namespace to search in the vector index; a known
+            name, alias or code is mapped to it (see ``iata.canonical_city``).
+        question: The user's question about the city.
+        section: Page section to search; inferred from the question if omitted.
+
+    Returns:
+        Passages from ``rank_passages``, or an error dict on failure.
+    """
+    city = canonical_city(city)
+    index = get_index()
+    try:
+        section = section or find_section(question)
+        with span(
+            "vector.search", city=city, backend=VECTOR_BACKEND, section=section
+        ) as search_span:
+            results = await _vector_search(index, city, question, section)
+            passages = rank_passages(results["result"]["hits"])
+            search_span.set(passages=len(passages))
+        return passages
+    except Exception as e:
+        logger.exception("Retrieval for %s failed", city)
+        return {"error": f"Error while querying {city}: {e}"}
+
+
+async def query_city_async(city: str, question: str, section: str | None = None):
     """Query Pinecone for city context and ask the LLM to answer a question.
 
+    With CITY_QUERY_MODE=retrieve, the ranked passages from
+    ``retrieve_city_context_async`` are returned instead, so the caller's own
+    completion answers from them.
+
+    The Pinecone search runs in a worker thread (the sync SDK is used) and the
+    completion uses the async Groq client, so the event loop is never blocked.
+    Answers are kept in a per-city semantic cache, so a question similar enough
+    to an earlier one is answered without calling Pinecone or Groq.
+
     Args:
-        city: The city namespace to search in the vector index.
+        city: The city namespace to search in the vector index; a known
+            name, alias or code is mapped to it (see ``iata.canonical_city``).
         question: The user's question about the city.
+        section: Page section to search (e.g. "Eat"); inferred from the
+            question with ``find_section`` when omitted.
 
     Returns:
-        Model-generated answer string, or a human-readable error string on failure.
+        Model-generated answer string (in retrieve mode, a list of passages), or
+        an error dict on failure.
     """
+    city = canonical_city(city)
+    if CITY_QUERY_MODE == "retrieve":
+        return await retrieve_city_context_async(city, question, section)
+
+    if SEMANTIC_CACHE_ENABLED:
+        cached = answer_cache.lookup(city, question)
+        annotate(semantic_cache_hit=cached is not None)
+        if cached is not None:
+            return cached
+
     GROQ_API_KEY = os.getenv("GROQ_API_KEY")
-    PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-    client = OpenAI(base_url="https://api.groq.com/openai/v1", api_key=GROQ_API_KEY)
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("travel-knowledge")
+    # Retries are left to the "groq" dependency (see resilience.py); the HTTP
+    # timeout ends requests it has given up on.
+    client = get_async_client(
+        AsyncOpenAI,
+        base_url="https://api.groq.com/openai/v1",
+        api_key=GROQ_API_KEY,
+        max_retries=0,
+        timeout=GROQ_TIMEOUT,
+    )
+    index = get_index()
 
     try:
-        results = index.search(
-            namespace=city,
-            query={"inputs": {"text": question}, "top_k": 3},
-            fields=["text"],
-        )
+        section = section or find_section(question)
+        with span("vector.search", city=city, backend=VECTOR_BACKEND, section=section):
+            results = await _vector_search(index, city, question, section)
 
         context = "\n".join(
             [hit["fields"]["text"] for hit in results["result"]["hits"]]
@@ -42,11 +231,32 @@ def query_city(city: str, question: str):
         Question: {question}
         Answer:
         """
-        response = client.chat.completions.create(
-            model="openai/gpt-oss-120b", messages=[{"role": "user", "content": prompt}]
-        )
+        with span("llm.city_answer", city=city) as llm_span:
+            response = await dependency("groq").call(
+                client.chat.completions.create,
+                model="openai/gpt-oss-120b",
+                messages=[{"role": "user", "content": prompt}],
+            )
+            llm_span.set(**token_counts(response.usage))
 
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        if SEMANTIC_CACHE_ENABLED and answer:
+            answer_cache.store(city, question, answer)
+        return answer
 
     except Exception as e:
-        return f"Error while querying {city}: {e}"
+        return {"error": f"Error while querying {city}: {e}"}
+
+
+def query_city(city: str, question: str, section: str | None = None):
+    """Synchronous wrapper around ``query_city_async``.
+
+    Args:
+        city: The city namespace to search in the vector index.
+        question: The user's question about the city.
+        section: Page section to search, inferred from the question if omitted.
+
+    Returns:
+        Model-generated answer string, or an error dict on failure.
+    """
+    return run_sync(query_city_async(city, question, section))
@@ -0,0 +1,67 @@
+import importlib
+
+
+class LazyModule:
+    """A module that is imported the first time one of its attributes is used.
+
+    Args:
+        name: The module to import, e.g. ``"numpy"``.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+class LazyAttr:
+    """A module attribute (usually an SDK client class) imported on first use.
+
+    Calling the proxy or reading one of its attributes imports the module, so
+    heavy SDKs load when the tool that needs them first runs rather than at
+    startup. The proxy is a plain module-level object, so tests can still
+    ``patch("module.Name")`` it, and it is hashable for the client registry.
+
+    Args:
+        module: The module to import, e.g. ``"openai"``.
+        name: The attribute of that module, e.g. ``"AsyncOpenAI"``.
+    """
+
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+        self._target = None
+
+    def _load(self):
+        if self._target is None:
+            self._target = getattr(importlib.import_module(self._module), self._name)
+        return self._target
+
+    def __call__(self, *args, **kwargs):
+        return self._load()(*args, **kwargs)
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        return f"<lazy {self._module}.{self._name}>"
+
+
+def lazy_module(name):
+    """Return a proxy that imports module ``name`` on first attribute access."""
+    return LazyModule(name)
+
+
+def lazy_import(module, name):
+    """Return a proxy for ``module.name`` that imports ``module`` on first use."""
+    return LazyAttr(module, name)
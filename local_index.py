@@ -0,0 +1,245 @@
+import json
+import os
+import threading
+
+from clients import get_client
+from embeddings import EMBED_DIM, hash_embed
+from lazy import lazy_module
+
+# NumPy is only imported when the first vector is built.
+np = lazy_module("numpy")
+
+# "pinecone" (default) or "local" to serve city search from LOCAL_INDEX_PATH.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone")
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "local_index")
+LOCAL_INDEX_NLIST = int(os.getenv("LOCAL_INDEX_NLIST", "0"))
+
+
+class _Namespace:
+    """Memory-mapped vectors and sidecar records of one namespace."""
+
+    def __init__(self, directory, dim):
+        self.directory = directory
+        with open(os.path.join(directory, "records.json")) as f:
+            self.records = json.load(f)
+        n = len(self.records)
+        self.vectors = (
+            np.memmap(
+                os.path.join(directory, "vectors.f32"),
+                dtype=np.float32,
+                mode="r",
+                shape=(n, dim),
+            )
+            if n
+            else np.zeros((0, dim), dtype=np.float32)
+        )
+        self.centroids = None
+        self.offsets = None
+        ivf_path = os.path.join(directory, "ivf.npz")
+        if os.path.exists(ivf_path):
+            ivf = np.load(ivf_path)
+            self.centroids = ivf["centroids"]
+            self.offsets = ivf["offsets"]
+
+
+def _matches(record, filter):
+    """Return whether a record passes a Pinecone-style metadata filter.
+
+    Supports ``{"field": value}``, ``{"field": {"$eq": value}}`` and
+    ``{"field": {"$in": [values]}}``; all conditions must hold.
+    """
+    for field, condition in filter.items():
+        value = record.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        if "$eq" in condition and value != condition["$eq"]:
+            return False
+        if "$in" in condition and value not in condition["$in"]:
+            return False
+    return True
+
+
+def _kmeans(vectors, k, iterations=10, seed=0):
+    """Cluster unit vectors with spherical k-means; return (centroids, labels)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        for c in range(k):
+            members = vectors[labels == c]
+            if len(members):
+                mean = members.sum(axis=0)
+                norm = np.linalg.norm(mean)
+                centroids[c] = mean / norm if norm else mean
+    return centroids, np.argmax(vectors @ centroids.T, axis=1)
+
+
+class LocalIndex:
+    """On-disk vector index with the Pinecone index methods the app uses.
+
+    Each namespace (city) is a directory holding a float32 ``vectors.f32``
+    matrix, memory-mapped on first search so loading costs almost nothing at
+    cold start, and a ``records.json`` sidecar with the IDs, texts and metadata
+    of the rows. Queries are embedded locally and ranked with an exact top-k
+    over vectorized dot products. With ``nlist`` set, namespaces of at least
+    ``nlist * 8`` rows are also partitioned IVF-style and only the ``nprobe``
+    closest partitions are scanned.
+
+    ``search``, ``upsert_records`` and ``delete`` accept and return the same
+    shapes as a Pinecone index with integrated embedding, so the ingestion and
+    query code work unchanged against either backend.
+
+    Args:
+        path: Directory holding one subdirectory per namespace.
+        embed: Function mapping text to a unit-length vector of ``dim`` floats.
+        dim: Dimension of the vectors returned by ``embed``.
+        nlist: Number of IVF partitions (0 for exact search only).
+        nprobe: Number of partitions scanned per query when partitioned.
+    """
+
+    def __init__(self, path, embed=hash_embed, dim=EMBED_DIM, nlist=0, nprobe=4):
+        self.path = path
+        self.embed = embed
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._namespaces = {}
+        self._lock = threading.Lock()
+
+    def _directory(self, namespace):
+        return os.path.join(self.path, namespace)
+
+    def _load(self, namespace):
+        """Return the loaded namespace, or None if it does not exist."""
+        loaded = self._namespaces.get(namespace)
+        if loaded is None:
+            directory = self._directory(namespace)
+            if not os.path.exists(os.path.join(directory, "records.json")):
+                return None
+            loaded = self._namespaces[namespace] = _Namespace(directory, self.dim)
+        return loaded
+
+    def search(self, namespace, query, fields=None):
+        """Return the top-k records closest to ``query["inputs"]["text"]``.
+
+        Args:
+            namespace: The namespace (city) to search.
+            query: A Pinecone-style query dict with "inputs", "top_k" and an
+                optional metadata "filter" (see ``_matches``).
+            fields: Record fields to return (default: all).
+
+        Returns:
+            A Pinecone-style ``{"result": {"hits": [...]}}`` dict; each hit has
+            "_id", "_score" and "fields".
+        """
+        loaded = self._load(namespace)
+        if loaded is None or not len(loaded.records):
+            return {"result": {"hits": []}}
+
+        vector = self.embed(query["inputs"]["text"])
+        rows = None
+        if loaded.centroids is not None:
+            probes = np.argsort(loaded.centroids @ vector)[::-1][: self.nprobe]
+            rows = np.concatenate(
+                [np.arange(loaded.offsets[p], loaded.offsets[p + 1]) for p in probes]
+            )
+        if query.get("filter"):
+            candidates = range(len(loaded.records)) if rows is None else rows
+            rows = np.array(
+                [
+                    int(i)
+                    for i in candidates
+                    if _matches(loaded.records[int(i)], query["filter"])
+                ],
+                dtype=np.int64,
+            )
+            if not len(rows):
+                return {"result": {"hits": []}}
+        candidates = loaded.vectors if rows is None else loaded.vectors[rows]
+        scores = candidates @ vector
+
+        top_k = min(query.get("top_k", 10), len(scores))
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+        best = best[np.argsort(-scores[best])]
+
+        hits = []
+        for i in best:
+            record = loaded.records[int(i if rows is None else rows[i])]
+            hits.append(
+                {
+                    "_id": record["_id"],
+                    "_score": float(scores[i]),
+                    "fields": {
+                        k: v
+                        for k, v in record.items()
+                        if k != "_id" and (fields is None or k in fields)
+                    },
+                }
+            )
+        return {"result": {"hits": hits}}
+
+    def _read_all(self, namespace):
+        """Return the namespace's records and vectors keyed by ID."""
+        loaded = self._load(namespace)
+        if loaded is None:
+            return {}
+        return {
+            record["_id"]: (record, np.array(loaded.vectors[i]))
+            for i, record in enumerate(loaded.records)
+        }
+
+    def _write_all(self, namespace, rows):
+        """Rewrite a namespace from ``{id: (record, vector)}`` atomically."""
+        records = [record for record, _ in rows.values()]
+        vectors = np.array(
+            [vector for _, vector in rows.values()], dtype=np.float32
+        ).reshape(-1, self.dim)
+
+        offsets = None
+        if self.nlist and len(records) >= self.nlist * 8:
+            centroids, labels = _kmeans(vectors, self.nlist)
+            order = np.argsort(labels, kind="stable")
+            records = [records[i] for i in order]
+            vectors = vectors[order]
+            offsets = np.searchsorted(labels[order], np.arange(self.nlist + 1))
+
+        directory = self._directory(namespace)
+        os.makedirs(directory, exist_ok=True)
+        self._namespaces.pop(namespace, None)
+        vectors.tofile(os.path.join(directory, "vectors.f32.tmp"))
+        os.replace(
+            os.path.join(directory, "vectors.f32.tmp"),
+            os.path.join(directory, "vectors.f32"),
+        )
+        with open(os.path.join(directory, "records.json.tmp"), "w") as f:
+            json.dump(records, f)
+        os.replace(
+            os.path.join(directory, "records.json.tmp"),
+            os.path.join(directory, "records.json"),
+        )
+        ivf_path = os.path.join(directory, "ivf.npz")
+        if offsets is not None:
+            np.savez(ivf_path, centroids=centroids, offsets=offsets)
+        elif os.path.exists(ivf_path):
+            os.remove(ivf_path)
+
+    def upsert_records(self, namespace, records):
+        """Embed and insert or replace records with "_id" and "text" fields."""
+        with self._lock:
+            rows = self._read_all(namespace)
+            for record in records:
+                rows[record["_id"]] = (dict(record), self.embed(record["text"]))
+            self._write_all(namespace, rows)
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        """Delete records by ID, or every record of the namespace."""
+        with self._lock:
+            rows = {} if delete_all else self._read_all(namespace)
+            for record_id in ids or []:
+                rows.pop(record_id, None)
+            self._write_all(namespace, rows)
+
+
+def get_local_index():
+    """Return the shared LocalIndex configured by LOCAL_INDEX_PATH/NLIST."""
+    return get_client(LocalIndex, LOCAL_INDEX_PATH, nlist=LOCAL_INDEX_NLIST)
@@ -1,18 +1,35 @@
-import time
-from collections import defaultdict
-from dotenv import load_dotenv
-from fastapi import FastAPI, Depends, HTTPException, status, Request
-from fastapi.responses import PlainTextResponse
-from pydantic import BaseModel
-from travel_llm import run_travel_llm
+import asyncio
+import hmac
+import json
+import logging
+import os
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from travel_llm import run_travel_llm_async, stream_travel_llm
+from response_cache import get_or_compute
+from ratelimit import limiter_from_env
+from sessions import sessions
+from metrics import metrics
+import resilience
+from tracing import recent_traces, span
+from settings import load_env
 from mangum import Mangum
 
-load_dotenv()
+load_env()
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Travel Assistant API")
 
 
-request_counts = defaultdict(list)
+limiter = limiter_from_env()
+# POST /ask/batch: most prompts per request and prompts answered at once.
+BATCH_MAX_PROMPTS = int(os.getenv("BATCH_MAX_PROMPTS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+# Bearer token for GET /metrics and /traces, which expose other users' request
+# details; both endpoints are disabled (404) while it is unset.
+OPS_TOKEN = os.getenv("OPS_TOKEN", "")
 system_prompt = """
 You are a travel planning assistant. 
 You ONLY answer questions related to flights, travel itineraries, or trip planning. 
@@ -22,43 +39,114 @@ If the user asks something outside of this domain, politely respond with:
 format = "Always return the response in simple plaintext, no tables."
 
 
-def rate_limit(request: Request):
+def rate_limit(request: Request, response: Response):
     """
-    Simple rate limiter: 20 requests per 5 minutes per IP.
+    Rate limiter: 20 requests per 5 minutes per IP by default.
+
+    Uses sliding-window counters with O(1) state per IP, kept in the backend
+    chosen by RATE_LIMIT_BACKEND (in-process, SQLite or Redis). Requests to all
+    endpoints count together, except on routes given their own limit. Limits
+    can be configured per route and per key via RATE_LIMIT_* variables, and every
+    response carries RateLimit-Limit/Remaining/Reset headers.
 
     Args:
         request: FastAPI Request object
+        response: FastAPI Response object the headers are added to
 
     Raises:
-        HTTPException: If rate limit exceeded (429 Too Many Requests)
+        HTTPException: If rate limit exceeded (429 Too Many Requests), with a
+            Retry-After header
     """
-    client_ip = request.client.host
-    now = time.time()
+    response.headers.update(charge_rate_limit(request).headers())
+
 
-    # Remove old requests (older than 5 minutes)
-    request_counts[client_ip] = [
-        req_time for req_time in request_counts[client_ip] if now - req_time < 300
-    ]
+def charge_rate_limit(request: Request, cost=1):
+    """Count ``cost`` requests against the client's limit (see ``rate_limit``).
 
-    # Check if over limit (10 requests per 5 minutes)
-    if len(request_counts[client_ip]) >= 20:
+    Returns:
+        The RateLimitResult, whose headers go on the response.
+
+    Raises:
+        HTTPException: 429 when they do not all fit under the limit.
+    """
+    result = limiter.check(request.url.path, request.client.host, cost=cost)
+    if not result.allowed:
+        rule = limiter.rule_for(request.url.path, request.client.host)
+        period = (
+            f"{rule.window // 60} minutes"
+            if rule.window % 60 == 0
+            else f"{rule.window} seconds"
+        )
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail="Rate limit: 20 requests per 5 minutes. Please wait.",
+            detail=f"Rate limit: {rule.limit} requests per {period}. Please wait.",
+            headers=result.headers(),
         )
+    return result
+
+
+def require_ops_token(request: Request):
+    """
+    Guard for the operational endpoints (/metrics, /traces).
 
-    request_counts[client_ip].append(now)
+    Raises:
+        HTTPException: 404 when OPS_TOKEN is unset, 401 unless the request
+            sends it as `Authorization: Bearer <OPS_TOKEN>`.
+    """
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.encode(), OPS_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            headers={"WWW-Authenticate": "Bearer"},
+        )
 
 
 class LLMRequest(BaseModel):
     """Schema for general LLM queries via the API."""
 
     prompt: str
+    session: bool = False
+    session_id: str | None = None
+
+
+def _session_for(req: LLMRequest):
+    """Return the session a request continues or starts, or None.
+
+    Raises:
+        HTTPException: 404 when ``session_id`` is unknown or expired.
+    """
+    if req.session_id:
+        session = sessions.get(req.session_id)
+        if session is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail='Unknown or expired session; send "session": true to start one.',
+            )
+        return session
+    if req.session:
+        return sessions.create(instructions=system_prompt + format)
+    return None
+
+
+def _tools_failed(steps):
+    """Whether a pipeline run (see its ``steps``) had a tool or upstream fail."""
+    return any(step.get("errors") for step in steps)
+
+
+class BatchRequest(BaseModel):
+    """Schema for answering several independent prompts in one request."""
+
+    prompts: list[str] = Field(min_length=1, max_length=BATCH_MAX_PROMPTS)
+    concurrency: int | None = Field(default=None, ge=1)
 
 
 # Endpoint
 @app.post("/ask", response_class=PlainTextResponse, dependencies=[Depends(rate_limit)])
-def ask_travel_assistant(req: LLMRequest):
+async def ask_travel_assistant(req: LLMRequest, response: Response):
     """
     Endpoint: Free-form natural language assistant powered by the agentic LLM.
 
@@ -66,12 +154,229 @@ def ask_travel_assistant(req: LLMRequest):
     ask open-ended travel-related questions. The request payload must contain
     a prompt string, which is passed to the travel assistant LLM. The LLM may
     leverage connected tools (e.g., flight search, itinerary lookup) to
-    generate a contextual, helpful response.
+    generate a contextual, helpful response. The pipeline runs on the event loop,
+    so a slow LLM round trip does not hold a threadpool thread.
+
+    Answers are cached per normalized prompt (shorter for time-sensitive prompts
+    such as flight searches) and identical concurrent prompts share one
+    computation. Answers written around a failed tool call are not cached. The `X-Cache` response header is `HIT`, `MISS` or `COALESCED`.
+
+    With `"session": true` a conversation starts server-side, under an ID the
+    server generates and returns in the `X-Session-Id` header. Sending that
+    `session_id` continues it: earlier turns (compacted to a token budget) are
+    sent along, tool results such as the last flight search are reused within
+    the session, and the response cache is bypassed.
 
     Request Body:
         prompt (str): A travel-related natural language question or instruction.
+        session (bool, optional): Start a conversation.
+        session_id (str, optional): Conversation to continue; unknown or
+            expired IDs are rejected with 404.
+    """
+    session = _session_for(req)
+    with span("ask", session=session is not None) as ask_span:
+        if session is not None:
+            async with session.lock:
+                answer = await run_travel_llm_async(req.prompt, session=session)
+            response.headers["X-Session-Id"] = session.session_id
+            return answer
+
+        prompt = req.prompt + system_prompt + format
+        steps = []
+        answer, cache_status = await get_or_compute(
+            prompt,
+            lambda: run_travel_llm_async(
+                req.prompt, steps=steps, instructions=system_prompt + format
+            ),
+            ttl_prompt=req.prompt,
+            degraded=lambda: _tools_failed(steps),
+        )
+        ask_span.set(response_cache=cache_status)
+        response.headers["X-Cache"] = cache_status
+        return answer
+
+
+async def _events(prompt, session=None):
+    """Stream pipeline events, holding the session's lock for the whole turn."""
+    with span("ask.stream", session=session is not None):
+        if session is None:
+            async for event in stream_travel_llm(
+                prompt, instructions=system_prompt + format
+            ):
+                yield event
+            return
+        async with session.lock:
+            async for event in stream_travel_llm(prompt, session=session):
+                yield event
+
+
+async def _sse_events(prompt, session=None):
+    """Format pipeline events as Server-Sent Events."""
+    async for event in _events(prompt, session):
+        yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    yield "event: done\ndata: {}\n\n"
+
+
+async def _plaintext_events(prompt, session=None):
+    """Format pipeline events as chunked plaintext with bracketed progress lines."""
+    async for event in _events(prompt, session):
+        if event["type"] == "token":
+            yield event["text"]
+        else:
+            yield f"[{event['message']}]\n"
+
+
+@app.post("/ask/stream", dependencies=[Depends(rate_limit)])
+async def ask_travel_assistant_stream(req: LLMRequest, request: Request):
+    """
+    Endpoint: Streaming variant of /ask.
+
+    Sends progress events while tools run (e.g. "searching flights JFK→LHR…")
+    and the answer token by token as the model produces it. Responds with
+    Server-Sent Events by default, or chunked plaintext when the client sends
+    `Accept: text/plain`.
+
+    Behind the Mangum `handler` the body is buffered by the Lambda integration,
+    so the same stream arrives in a single response there.
+
+    Request Body:
+        prompt (str): A travel-related natural language question or instruction.
+        session (bool, optional): Start a conversation, as for /ask.
+        session_id (str, optional): Conversation to continue, as for /ask.
+    """
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    session = _session_for(req)
+    if session is not None:
+        headers["X-Session-Id"] = session.session_id
+    prompt = req.prompt
+    if "text/plain" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _plaintext_events(prompt, session), media_type="text/plain", headers=headers
+        )
+    return StreamingResponse(
+        _sse_events(prompt, session), media_type="text/event-stream", headers=headers
+    )
+
+
+async def _batch_results(prompts, concurrency):
+    """Answer prompts concurrently, yielding one NDJSON line per finished item."""
+    semaphore = asyncio.Semaphore(concurrency)
+    shared_tools = {}
+
+    async def answer(index, user_prompt):
+        async with semaphore:
+            prompt = user_prompt + system_prompt + format
+            steps = []
+            try:
+                answer, cache_status = await get_or_compute(
+                    prompt,
+                    lambda: run_travel_llm_async(
+                        user_prompt,
+                        steps=steps,
+                        shared_tools=shared_tools,
+                        instructions=system_prompt + format,
+                    ),
+                    ttl_prompt=user_prompt,
+                    degraded=lambda: _tools_failed(steps),
+                )
+            except Exception as error:
+                logger.exception("Batch prompt %d failed", index)
+                return {"index": index, "error": str(error)}
+            return {"index": index, "answer": answer, "cache": cache_status}
+
+    with span("ask.batch", size=len(prompts), concurrency=concurrency) as batch_span:
+        tasks = [asyncio.create_task(answer(i, p)) for i, p in enumerate(prompts)]
+        errors = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                item = await finished
+                errors += "error" in item
+                yield json.dumps(item) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        batch_span.set(tool_calls=len(shared_tools), errors=errors)
+        yield (
+            json.dumps(
+                {
+                    "done": True,
+                    "count": len(prompts),
+                    "errors": errors,
+                    "tool_calls": len(shared_tools),
+                }
+            )
+            + "\n"
+        )
+
+
+@app.post("/ask/batch")
+async def ask_travel_assistant_batch(req: BatchRequest, request: Request):
+    """
+    Endpoint: Answer many independent prompts in one request.
+
+    Prompts run concurrently, at most `concurrency` at a time (default and cap:
+    BATCH_CONCURRENCY), and each prompt counts as one request for the rate
+    limiter: a batch that does not fit in what is left of the limit is rejected
+    whole with 429. Identical tool calls made by different prompts of the batch
+    (the same city lookup or flight search) run only once. Answers go through
+    the same response cache as /ask.
+
+    The response is newline-delimited JSON streamed as items finish, in
+    completion order: `{"index": 0, "answer": "...", "cache": "MISS"}` or
+    `{"index": 3, "error": "..."}` per prompt, then a final
+    `{"done": true, "count": ..., "errors": ..., "tool_calls": ...}` line where
+    `tool_calls` is the number of distinct tool calls run for the batch.
+
+    Request Body:
+        prompts (list[str]): 1 to BATCH_MAX_PROMPTS travel prompts.
+        concurrency (int, optional): Prompts answered at once.
+    """
+    limit = charge_rate_limit(request, cost=len(req.prompts))
+    concurrency = min(req.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)
+    return StreamingResponse(
+        _batch_results(req.prompts, concurrency),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+            **limit.headers(),
+        },
+    )
+
+
+@app.get("/metrics", dependencies=[Depends(require_ops_token)])
+def get_metrics(output: str = Query("prometheus", alias="format")):
+    """
+    Endpoint: Latency histograms per request stage and per tool.
+
+    Every traced stage (`ask`, `llm.completion`, `tools`, `tool.search_flights`,
+    `tool.query_city`, `vector.search`, `llm.city_answer`, `amadeus.search`, ...)
+    is recorded in a fixed-bucket histogram. The default response is the
+    Prometheus text format, including p50/p95/p99 estimates; `?format=json`
+    returns the count, mean, max and p50/p95/p99 of each stage.
+
+    The circuit breaker state and call, retry, timeout, rejection and hedge
+    counters of each upstream (Groq, Pinecone, Amadeus) are included too, as
+    `travel_upstream_*` series or under the JSON `upstreams` key along with
+    the hedge win rate.
+
+    Requires `Authorization: Bearer <OPS_TOKEN>`; disabled while OPS_TOKEN is
+    unset.
+    """
+    if output == "json":
+        return {**metrics.summary(), "upstreams": resilience.summary()}
+    return PlainTextResponse(metrics.prometheus() + resilience.prometheus())
+
+
+@app.get("/traces", dependencies=[Depends(require_ops_token)])
+def get_traces(limit: int = 20):
+    """
+    Endpoint: The most recent request traces, newest first.
+
+    Each trace lists its spans with their parent, start time, duration and
+    attributes (token counts, cache hits, errors). Protected like /metrics.
     """
-    return run_travel_llm(req.prompt + system_prompt + format)
+    return list(reversed(recent_traces.traces))[:limit]
 
 
 handler = Mangum(app)
@@ -0,0 +1,120 @@
+import bisect
+import threading
+
+# Upper bounds (ms) of the latency buckets, roughly logarithmic from 1 ms to 2 min.
+LATENCY_BUCKETS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 300, 500, 750,
+    1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 30000, 60000, 120000,
+)  # fmt: skip
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with percentile estimates.
+
+    Memory and recording cost are constant however many samples are recorded;
+    percentiles are interpolated linearly inside the bucket they fall in.
+
+    Args:
+        buckets: Increasing bucket upper bounds in milliseconds.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def record(self, value_ms):
+        """Add one sample."""
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.sum += value_ms
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, q):
+        """Return the estimated ``q``-th percentile (0-100), or 0.0 if empty."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = lower + (upper - lower) * (rank - seen) / n
+                return min(estimate, self.max)
+            seen += n
+        return self.max
+
+    def summary(self):
+        """Return count, mean, max and p50/p95/p99 in milliseconds."""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.sum / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max, 1),
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "p99_ms": round(self.percentile(99), 1),
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe latency histograms keyed by stage name."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, value_ms):
+        """Record one latency sample for ``stage``."""
+        with self._lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = LatencyHistogram()
+            histogram.record(value_ms)
+
+    def summary(self):
+        """Return ``{stage: summary}`` for every stage seen so far."""
+        with self._lock:
+            return {
+                stage: histogram.summary()
+                for stage, histogram in sorted(self._histograms.items())
+            }
+
+    def prometheus(self, name="travel_stage_latency_ms"):
+        """Render the histograms in the Prometheus text exposition format."""
+        lines = [
+            f"# HELP {name} Latency of each request stage and tool in milliseconds.",
+            f"# TYPE {name} histogram",
+        ]
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for stage, histogram in items:
+                cumulative = 0
+                for bound, n in zip(histogram.buckets, histogram.counts):
+                    cumulative += n
+                    lines.append(
+                        f'{name}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(
+                    f'{name}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}'
+                )
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum:.3f}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+            lines.append(f"# TYPE {name}_quantile gauge")
+            for stage, histogram in items:
+                for q in (50, 95, 99):
+                    lines.append(
+                        f'{name}_quantile{{stage="{stage}",quantile="0.{q}"}} '
+                        f"{histogram.percentile(q):.1f}"
+                    )
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        """Forget every sample."""
+        with self._lock:
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
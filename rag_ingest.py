@@ -1,87 +1,422 @@
+import hashlib
+import json
 import os
-import requests
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pinecone import Pinecone
+from chunking import iter_chunks, iter_text_chunks
+from clients import get_client
+from fetcher import get_fetcher
+from iata import wikivoyage_slug
+from local_index import VECTOR_BACKEND, get_local_index
+from resilience import is_not_found
+from settings import load_env
 
-load_dotenv()
+load_env()
+
+# Pinecone accepts at most 96 records per upsert_records call for indexes with
+# integrated embedding.
+UPSERT_BATCH_SIZE = 96
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_RETRIES = int(os.getenv("UPSERT_RETRIES", "3"))
+UPSERT_BACKOFF = float(os.getenv("UPSERT_BACKOFF", "0.5"))
+INGEST_CITY_WORKERS = int(os.getenv("INGEST_CITY_WORKERS", "3"))
+# Pinecone deletes at most 1000 IDs per request.
+DELETE_BATCH_SIZE = 1000
+# Per-city manifests of chunk hashes used by incremental ingestion.
+INGEST_MANIFEST_DIR = os.getenv("INGEST_MANIFEST_DIR", ".ingest_manifest")
+# Bytes read from the page at a time while it is parsed.
+INGEST_READ_SIZE = int(os.getenv("INGEST_READ_SIZE", "65536"))
 
 
 def chunk_text(text, size=500, overlap=50):
     """
-    Split a text string into overlapping chunks.
+    Split a text string into overlapping, sentence-aligned chunks.
+
+    Chunks end on a sentence boundary when possible and otherwise between
+    words; only words longer than ``size`` are cut.
 
     Args:
         text (str): The input text to chunk.
-        size (int): Maximum size of each chunk (default: 500).
-        overlap (int): Number of characters to overlap between chunks (default: 50).
+        size (int): Maximum size of each chunk in characters (default: 500).
+        overlap (int): Maximum characters of trailing whole words repeated at
+            the start of the next chunk (default: 50).
 
     Returns:
         list[str]: A list of text chunks.
     """
-    chunks = []
-    start = 0
-    while start < len(text):
-        end = min(start + size, len(text))
-        chunk = text[start:end]
-        if len(chunk) >= overlap:  # only include if big enough
-            chunks.append(chunk)
-        start += size - overlap
-    return chunks
+    return list(iter_text_chunks([text], size=size, overlap=overlap))
+
+
+def iter_city_chunks(city, size=500, overlap=50, fetcher=None):
+    """
+    Fetch a Wikivoyage city page and yield its chunks as they are parsed.
+
+    The page comes from the fetcher's on-disk cache (revalidated with a
+    conditional GET) and is read in INGEST_READ_SIZE pieces and parsed
+    incrementally, so it is never held in memory as a whole.
+
+    Args:
+        city (str): The city name (must match Wikivoyage URL format, e.g. "Tokyo").
+        size (int): Maximum size of each chunk (default: 500).
+        overlap (int): Overlap between chunks in characters (default: 50).
+        fetcher (Fetcher): Fetcher to use instead of the shared one.
+
+    Yields:
+        dict: "text", "section" (the page heading it falls under) and "position".
+    """
+    response = (fetcher or get_fetcher()).fetch(_city_url(city))
+    yield from iter_chunks(_body(response), size=size, overlap=overlap)
 
 
-def scrape_city(city, size=500, overlap=50):
+def scrape_city(city, size=500, overlap=50, metadata=False, fetcher=None):
     """
     Scrape Wikivoyage for a given city and return cleaned text chunks.
 
     Args:
         city (str): The city name (must match Wikivoyage URL format, e.g. "Tokyo").
+        metadata (bool): Return dicts with "text", "section" and "position"
+            instead of plain strings (default: False).
+        fetcher (Fetcher): Fetcher to use instead of the shared one.
 
     Returns:
-        list[str]: A list of text chunks extracted from the city page.
+        list[str] | list[dict]: The chunks extracted from the city page.
     """
-    url = f"https://en.wikivoyage.org/wiki/{city}"
-    html = requests.get(url, headers={"User-Agent": "Mozilla/5.0"}).text
-    soup = BeautifulSoup(html, "html.parser")
+    chunks = iter_city_chunks(city, size=size, overlap=overlap, fetcher=fetcher)
+    if metadata:
+        return list(chunks)
+    return [chunk["text"] for chunk in chunks]
 
-    paragraphs = [p.get_text() for p in soup.find_all("p")]
-    text = " ".join(paragraphs)
-    chunks = chunk_text(text, size=size, overlap=overlap)
-    return chunks
 
-
-def embed_db(city):
+def parse_city_html(html, size=500, overlap=50, metadata=False):
     """
-    Scrape city information and embed it into Pinecone vector database.
+    Extract the paragraph text of a Wikivoyage page and split it into chunks.
 
     Args:
-        city (str): The city name (e.g., "Tokyo").
+        html (str): The page HTML.
+        size (int): Maximum size of each chunk (default: 500).
+        overlap (int): Overlap between chunks in characters (default: 50).
+        metadata (bool): Return dicts with "text", "section" and "position"
+            instead of plain strings (default: False).
 
     Returns:
-        dict: A status message if successful, or an error dictionary on failure.
+        list[str] | list[dict]: A list of text chunks.
     """
+    chunks = iter_chunks([html], size=size, overlap=overlap)
+    if metadata:
+        return list(chunks)
+    return [chunk["text"] for chunk in chunks]
+
+
+def _city_url(city):
+    return f"https://en.wikivoyage.org/wiki/{wikivoyage_slug(city)}"
+
+
+def _body(response):
+    """Iterate over a streamed response body in INGEST_READ_SIZE pieces."""
+    return response.iter_content(chunk_size=INGEST_READ_SIZE, decode_unicode=True)
+
+
+def _record(chunk_id, chunk):
+    """Build an index record from a chunk (a dict from ``iter_chunks`` or a str)."""
+    if isinstance(chunk, str):
+        return {"_id": chunk_id, "text": chunk}
+    record = {"_id": chunk_id, "text": chunk["text"]}
+    if chunk.get("section"):
+        record["section"] = chunk["section"]
+    if chunk.get("position") is not None:
+        record["position"] = chunk["position"]
+    return record
+
+
+def _get_index():
+    """Return the index used for ingestion (Pinecone, or local per VECTOR_BACKEND)."""
+    if VECTOR_BACKEND == "local":
+        return get_local_index()
+
     PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index("travel-knowledge")
+    pc = get_client(Pinecone, api_key=PINECONE_API_KEY)
+    return get_client(pc.Index, "travel-knowledge")
+
+
+def upsert_with_retry(index, namespace, records, retries=None, backoff=None):
+    """
+    Upsert one batch of records, retrying with jittered exponential backoff.
+
+    Args:
+        index: A Pinecone index (or any object with ``upsert_records``).
+        namespace (str): The namespace to write to.
+        records (list[dict]): The records to upsert.
+        retries (int): Retries after the first failure (default: UPSERT_RETRIES).
+        backoff (float): Base delay in seconds (default: UPSERT_BACKOFF).
+
+    Raises:
+        Exception: The last error once all retries are exhausted.
+    """
+    retries = UPSERT_RETRIES if retries is None else retries
+    backoff = UPSERT_BACKOFF if backoff is None else backoff
+
+    for attempt in range(retries + 1):
+        try:
+            index.upsert_records(namespace, records)
+            return
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * 2**attempt * random.uniform(0.5, 1.5))
+
+
+def upsert_batches(
+    index, namespace, records, batch_size=UPSERT_BATCH_SIZE, max_workers=None
+):
+    """
+    Upsert records in batches, sending several batches concurrently.
+
+    Args:
+        index: A Pinecone index (or any object with ``upsert_records``).
+        namespace (str): The namespace to write to.
+        records (list[dict]): The records to upsert.
+        batch_size (int): Records per request (default: UPSERT_BATCH_SIZE).
+        max_workers (int): Concurrent requests (default: UPSERT_WORKERS).
+
+    Returns:
+        int: The number of batches sent.
+    """
+    batches = [records[i : i + batch_size] for i in range(0, len(records), batch_size)]
+    if not batches:
+        return 0
+
+    workers = min(max_workers or UPSERT_WORKERS, len(batches))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # list() re-raises the first batch that failed after all retries.
+        list(
+            pool.map(lambda batch: upsert_with_retry(index, namespace, batch), batches)
+        )
+    return len(batches)
+
+
+def _content_hash(text):
+    """Return a stable hex digest of a text."""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _manifest_path(city, manifest_dir=None):
+    return os.path.join(manifest_dir or INGEST_MANIFEST_DIR, f"{city}.json")
+
+
+def load_manifest(city, manifest_dir=None):
+    """
+    Load the ingestion manifest of a city.
+
+    Args:
+        city (str): The city name.
+        manifest_dir (str): Manifest directory (default: INGEST_MANIFEST_DIR).
+
+    Returns:
+        dict | None: The manifest with "etag", "last_modified", "page_hash" and
+            "chunks" (chunk ID -> content hash), or None if the city has never
+            been ingested incrementally.
+    """
+    try:
+        with open(_manifest_path(city, manifest_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_manifest(city, manifest, manifest_dir=None):
+    """Atomically write the ingestion manifest of a city."""
+    path = _manifest_path(city, manifest_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def delete_ids(index, namespace, ids):
+    """Delete record IDs from a namespace in batches of DELETE_BATCH_SIZE."""
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        index.delete(ids=ids[i : i + DELETE_BATCH_SIZE], namespace=namespace)
 
+
+def _clear_namespace(index, namespace):
+    """Delete every record of a namespace.
+
+    A namespace that does not exist yet is already clear, so the 404 Pinecone
+    answers for it is ignored.
+    """
     try:
-        chunks = scrape_city(city)
-
-        for i, chunk in enumerate(chunks):
-            index.upsert_records(
-                city,
-                [
-                    {
-                        "_id": f"{city}-{i}",
-                        "text": chunk,
-                    }
-                ],
-            )
+        index.delete(delete_all=True, namespace=namespace)
+    except Exception as error:
+        if not is_not_found(error):
+            raise
+
+
+def _embed_incremental(city, index, manifest_dir=None, fetcher=None):
+    """
+    Re-ingest a city, writing only what changed since the last run.
+
+    The page is revalidated by the fetcher with a conditional GET; validators
+    matching the manifest's or an unchanged page hash skip the city. Otherwise chunks
+    get content-addressed IDs, so only new or changed chunks are upserted and
+    IDs no longer on the page are deleted. The first incremental run of a city
+    clears its namespace, removing records written with positional IDs.
+    """
+    manifest = load_manifest(city, manifest_dir)
+    response = (fetcher or get_fetcher()).fetch(_city_url(city))
+    validators = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+    }
+    # The ETag is the stronger validator; Last-Modified is used without one.
+    key = "etag" if validators["etag"] else "last_modified"
+    if manifest and validators[key] and manifest.get(key) == validators[key]:
+        return {"status": "unchanged", "message": f"{city} not modified", "chunks": 0}
+
+    chunks = list(iter_chunks(_body(response)))
+    # Sections are part of the hashed content, so moving a paragraph under
+    # another heading re-indexes it with the new metadata.
+    contents = [f"{chunk['section']}\n{chunk['text']}" for chunk in chunks]
+    page_hash = _content_hash("\n".join(contents))
+
+    if manifest and manifest.get("page_hash") == page_hash:
+        save_manifest(city, {**manifest, **validators}, manifest_dir)
+        return {
+            "status": "unchanged",
+            "message": f"{city} content unchanged",
+            "chunks": 0,
+        }
+
+    hashes = {}
+    records = []
+    for chunk, content in zip(chunks, contents):
+        digest = _content_hash(content)
+        chunk_id = f"{city}-{digest[:16]}"
+        if chunk_id in hashes:
+            continue
+        hashes[chunk_id] = digest
+        records.append(_record(chunk_id, chunk))
+
+    if manifest is None:
+        _clear_namespace(index, city)
+        previous = {}
+    else:
+        previous = manifest.get("chunks", {})
+
+    changed = [record for record in records if record["_id"] not in previous]
+    orphaned = sorted(set(previous) - set(hashes))
+
+    upsert_batches(index, city, changed)
+    delete_ids(index, city, orphaned)
+    save_manifest(
+        city, {**validators, "page_hash": page_hash, "chunks": hashes}, manifest_dir
+    )
+    return {
+        "status": "success",
+        "message": (
+            f"Upserted {len(changed)} and deleted {len(orphaned)} chunks for {city}"
+        ),
+        "chunks": len(changed),
+        "deleted": len(orphaned),
+        "unchanged": len(records) - len(changed),
+    }
+
+
+def embed_db(city, index=None, incremental=False, manifest_dir=None, fetcher=None):
+    """
+    Scrape city information and embed it into Pinecone vector database.
+
+    Chunks are upserted in batches of up to UPSERT_BATCH_SIZE records, with
+    batches sent concurrently and retried on failure.
+
+    Args:
+        city (str): The city name (e.g., "Tokyo"). Cities are stored under
+            their Wikivoyage page slug, so "kuala lumpur", "Kuala_Lumpur" and
+            "KL" share the "Kuala_Lumpur" namespace (see ``iata.wikivoyage_slug``).
+        index: Optional index to write to instead of the shared Pinecone index
+            (e.g. a local fake in tests).
+        incremental (bool): Only upsert new or changed chunks and delete
+            orphaned ones, using a local manifest of content hashes; the city is
+            skipped entirely if the page has not changed (default: False).
+        manifest_dir (str): Manifest directory (default: INGEST_MANIFEST_DIR).
+        fetcher (Fetcher): Fetcher to use instead of the shared one.
+
+    Returns:
+        dict: A status message with chunk count, elapsed seconds and throughput if
+            successful, or an error dictionary on failure.
+    """
+    index = index or _get_index()
+    city = wikivoyage_slug(city)
+
+    try:
+        start = time.perf_counter()
+        if incremental:
+            result = _embed_incremental(city, index, manifest_dir, fetcher)
+            result["seconds"] = round(time.perf_counter() - start, 3)
+            return result
+
+        chunks = scrape_city(city, metadata=True, fetcher=fetcher)
+
+        records = [_record(f"{city}-{i}", chunk) for i, chunk in enumerate(chunks)]
+        batches = upsert_batches(index, city, records)
+
+        seconds = time.perf_counter() - start
         return {
             "status": "success",
             "message": f"Successfully embedded {len(chunks)} chunks for {city}",
+            "chunks": len(chunks),
+            "batches": batches,
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(len(chunks) / seconds, 1) if seconds else None,
         }
 
     except Exception as error:
         return {"error": str(error)}
+
+
+def embed_cities(cities, max_workers=None, index=None, incremental=False, fetcher=None):
+    """
+    Ingest several cities concurrently with a bounded pool.
+
+    Page downloads share the fetcher, which also bounds concurrent requests
+    to each host (FETCH_PER_HOST) and spaces them out (FETCH_HOST_DELAY).
+
+    Args:
+        cities (list[str]): City names (e.g., ["Tokyo", "Kyoto"]).
+        max_workers (int): Cities processed at once (default: INGEST_CITY_WORKERS).
+        index: Optional index to write to instead of the shared Pinecone index.
+        incremental (bool): Use incremental ingestion for every city.
+        fetcher (Fetcher): Fetcher to use instead of the shared one.
+
+    Returns:
+        dict: Per-city results from ``embed_db`` under "cities", plus total chunks,
+            elapsed seconds and overall chunks per second.
+    """
+    index = index or _get_index()
+    fetcher = fetcher or get_fetcher()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers or INGEST_CITY_WORKERS) as pool:
+        results = dict(
+            zip(
+                cities,
+                pool.map(
+                    lambda city: embed_db(
+                        city, index=index, incremental=incremental, fetcher=fetcher
+                    ),
+                    cities,
+                ),
+            )
+        )
+
+    seconds = time.perf_counter() - start
+    chunks = sum(result.get("chunks", 0) for result in results.values())
+    return {
+        "cities": results,
+        "chunks": chunks,
+        "seconds": round(seconds, 3),
+        "chunks_per_second": round(chunks / seconds, 1) if seconds else None,
+    }
@@ -0,0 +1,300 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Rule:
+    """Allow ``limit`` requests per ``window`` seconds."""
+
+    limit: int
+    window: int
+
+
+# The documented limit: 20 requests per 5 minutes per IP.
+DEFAULT_RULE = Rule(20, 300)
+
+
+@dataclass
+class RateLimitResult:
+    """Outcome of a rate limit check, with the values for response headers."""
+
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: int
+    retry_after: int = 0
+
+    def headers(self):
+        """Return the RateLimit-* (and, when denied, Retry-After) headers."""
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
+
+
+def _roll(window_start, prev, curr, now, window):
+    """Advance sliding-window counter state to the window containing ``now``."""
+    current_start = now - (now % window)
+    if current_start != window_start:
+        prev = curr if current_start - window_start == window else 0
+        curr = 0
+        window_start = current_start
+    return window_start, prev, curr
+
+
+def _estimate(window_start, prev, curr, now, window):
+    """Weighted request count over the last ``window`` seconds."""
+    return prev * (1 - (now - window_start) / window) + curr
+
+
+def _retry_after(window_start, prev, curr, now, rule, cost=1):
+    """Seconds until ``cost`` more requests would fit under the limit."""
+    if cost > rule.limit:
+        return rule.window
+    allowed = rule.limit - cost
+    if curr > allowed:
+        # Wait for the next window, then for the carried-over count to decay.
+        decay = rule.window * (1 - allowed / curr)
+        return window_start + rule.window - now + decay
+    elapsed = rule.window * (1 - (allowed - curr) / prev)
+    return max(elapsed - (now - window_start), 0)
+
+
+def _decide(state, now, rule, cost=1):
+    """Apply a request counting as ``cost`` requests to ``(window_start, prev, curr)``.
+
+    Returns:
+        A ``(new_state, result)`` tuple; the state only counts allowed requests.
+    """
+    window_start, prev, curr = _roll(*state, now, rule.window)
+    estimate = _estimate(window_start, prev, curr, now, rule.window)
+    reset = math.ceil(window_start + rule.window - now)
+
+    if estimate + cost > rule.limit:
+        retry = math.ceil(_retry_after(window_start, prev, curr, now, rule, cost))
+        result = RateLimitResult(False, rule.limit, 0, reset, max(retry, 1))
+        return (window_start, prev, curr), result
+
+    remaining = max(math.floor(rule.limit - estimate - cost), 0)
+    result = RateLimitResult(True, rule.limit, remaining, reset)
+    return (window_start, prev, curr + cost), result
+
+
+class MemoryBackend:
+    """In-process sliding-window counters: three numbers per key.
+
+    Keys idle for longer than two windows are evicted by an amortized sweep
+    that runs at most once every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._state = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def hit(self, key, rule, now=None, cost=1):
+        """Count ``cost`` requests for ``key`` under ``rule`` and return the result."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._sweep(now)
+            entry = self._state.get(key)
+            state = entry[0] if entry else (0, 0, 0)
+            new_state, result = _decide(state, now, rule, cost)
+            self._state[key] = (new_state, now + 2 * rule.window)
+            return result
+
+    def _sweep(self, now):
+        idle = [key for key, (_, expires) in self._state.items() if expires <= now]
+        for key in idle:
+            del self._state[key]
+        self._last_sweep = now
+
+    def clear(self):
+        with self._lock:
+            self._state.clear()
+
+    def __len__(self):
+        return len(self._state)
+
+
+class SQLiteBackend:
+    """Sliding-window counters in a SQLite file shared by local processes.
+
+    Each check runs in an immediate transaction, so uvicorn workers on the same
+    host see one consistent count per key. Rows idle for two windows are
+    deleted by a sweep that runs at most once every ``sweep_interval`` seconds.
+    """
+
+    def __init__(self, path, sweep_interval=60):
+        self.sweep_interval = sweep_interval
+        self._db = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, "
+            "window_start REAL, prev INTEGER, curr INTEGER, expires_at REAL)"
+        )
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def hit(self, key, rule, now=None, cost=1):
+        """Count ``cost`` requests for ``key`` under ``rule`` and return the result."""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if now - self._last_sweep >= self.sweep_interval:
+                    self._db.execute(
+                        "DELETE FROM rate_limits WHERE expires_at <= ?", (now,)
+                    )
+                    self._last_sweep = now
+                row = self._db.execute(
+                    "SELECT window_start, prev, curr FROM rate_limits WHERE key = ?",
+                    (key,),
+                ).fetchone()
+                new_state, result = _decide(row or (0, 0, 0), now, rule, cost)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?, ?, ?)",
+                    (key, *new_state, now + 2 * rule.window),
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            return result
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM rate_limits")
+
+
+class RedisBackend:
+    """Sliding-window counters in Redis, shared by every process and container.
+
+    Works with any client exposing redis-py's ``get``, ``incr``, ``decr`` and
+    ``expire`` (a local stand-in in tests). Each window is one integer key that
+    Redis expires after two windows, so idle keys cost nothing.
+
+    The request is counted with an atomic INCR before deciding, and the count
+    is taken back with DECR when it is denied. Concurrent workers therefore
+    each see a distinct count and cannot all be let through on the same one.
+    """
+
+    def __init__(self, client, prefix="ratelimit"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url, prefix="ratelimit"):
+        """Create a backend from a ``redis://`` URL (requires the redis package)."""
+        import redis
+
+        return cls(redis.Redis.from_url(url), prefix)
+
+    def hit(self, key, rule, now=None, cost=1):
+        """Count ``cost`` requests for ``key`` under ``rule`` and return the result."""
+        now = time.time() if now is None else now
+        window_start = now - (now % rule.window)
+        index = int(window_start // rule.window)
+        curr_key = f"{self.prefix}:{key}:{index}"
+        curr = int(self.client.incr(curr_key, cost))
+        self.client.expire(curr_key, 2 * rule.window)
+        prev = int(self.client.get(f"{self.prefix}:{key}:{index - 1}") or 0)
+
+        # Decide as if this request had not been counted yet.
+        _, result = _decide((window_start, prev, curr - cost), now, rule, cost)
+        if not result.allowed:
+            self.client.decr(curr_key, cost)
+        return result
+
+    def clear(self):
+        """Counters expire on their own; nothing to clear locally."""
+
+
+class RateLimiter:
+    """Per-route, per-key rate limiting over a pluggable counter backend.
+
+    A key's requests to every route share one counter, except on routes with
+    a rule of their own, which count separately.
+
+    Args:
+        backend: A ``MemoryBackend``, ``SQLiteBackend`` or ``RedisBackend``.
+        default: Rule for routes without their own rule.
+        routes: Mapping of route path to Rule.
+        keys: Mapping of client key (e.g. IP) to Rule, overriding route rules.
+    """
+
+    def __init__(self, backend, default=DEFAULT_RULE, routes=None, keys=None):
+        self.backend = backend
+        self.default = default
+        self.routes = routes or {}
+        self.keys = keys or {}
+
+    def rule_for(self, route, key):
+        """Return the rule that applies to ``key`` on ``route``."""
+        return self.keys.get(key) or self.routes.get(route) or self.default
+
+    def check(self, route, key, now=None, cost=1):
+        """Count a request from ``key`` to ``route``.
+
+        Args:
+            route: The route path.
+            key: The client key (e.g. IP).
+            now: Current time in seconds (default: ``time.time()``).
+            cost: How many requests this one counts as (e.g. the prompts of a
+                batch); it is denied unless all of them fit under the limit.
+
+        Returns:
+            A RateLimitResult; ``allowed`` is False once the limit is reached.
+        """
+        rule = self.rule_for(route, key)
+        scope = route if key not in self.keys and route in self.routes else "*"
+        return self.backend.hit(f"{scope}|{key}", rule, now, cost)
+
+    def reset(self):
+        """Forget every counter (for tests)."""
+        self.backend.clear()
+
+
+def parse_rules(spec):
+    """Parse "name=limit/window,..." (e.g. "/ask=20/300") into a dict of Rules."""
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.rpartition("=")
+        limit, _, window = value.partition("/")
+        rules[name] = Rule(int(limit), int(window))
+    return rules
+
+
+def limiter_from_env():
+    """Build the app's RateLimiter from RATE_LIMIT_* environment variables.
+
+    RATE_LIMIT_BACKEND selects "memory" (default), "sqlite" (RATE_LIMIT_SQLITE_PATH)
+    or "redis" (RATE_LIMIT_REDIS_URL). RATE_LIMIT_DEFAULT is "limit/window",
+    RATE_LIMIT_ROUTES and RATE_LIMIT_KEYS are "name=limit/window" lists.
+    """
+    backend_name = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    if backend_name == "sqlite":
+        backend = SQLiteBackend(os.getenv("RATE_LIMIT_SQLITE_PATH", "ratelimit.db"))
+    elif backend_name == "redis":
+        backend = RedisBackend.from_url(os.getenv("RATE_LIMIT_REDIS_URL"))
+    else:
+        backend = MemoryBackend()
+
+    default = parse_rules(f"default={os.getenv('RATE_LIMIT_DEFAULT', '20/300')}")
+    return RateLimiter(
+        backend,
+        default=default["default"],
+        routes=parse_rules(os.getenv("RATE_LIMIT_ROUTES", "")),
+        keys=parse_rules(os.getenv("RATE_LIMIT_KEYS", "")),
+    )
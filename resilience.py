@@ -0,0 +1,367 @@
+import asyncio
+import contextvars
+import inspect
+import math
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import LatencyHistogram
+
+# Overall time budget of one request. Every upstream call is given at most its
+# dependency's timeout and never more than what is left of the budget, so a
+# slow upstream cannot hold a request past it (keep it below the Lambda timeout).
+REQUEST_BUDGET = float(os.getenv("REQUEST_BUDGET", "90"))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "30"))
+PINECONE_TIMEOUT = float(os.getenv("PINECONE_TIMEOUT", "5"))
+AMADEUS_TIMEOUT = float(os.getenv("AMADEUS_TIMEOUT", "15"))
+# Transient failures (timeouts, connection errors, 429 and 5xx answers) are
+# retried with jittered exponential backoff.
+UPSTREAM_RETRIES = int(os.getenv("UPSTREAM_RETRIES", "1"))
+UPSTREAM_BACKOFF = float(os.getenv("UPSTREAM_BACKOFF", "0.2"))
+# Idempotent reads send one duplicate request once the first has been running
+# for the dependency's HEDGE_QUANTILE latency, after HEDGE_MIN_SAMPLES calls.
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() == "true"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "95"))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+# At most this fraction of calls is hedged, so a saturated upstream (where
+# every call is slow) does not get twice the load.
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.1"))
+# After BREAKER_FAILURES failed calls in a row a dependency's calls fail fast
+# for BREAKER_RESET seconds; then one trial call decides whether it recovered.
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET = float(os.getenv("BREAKER_RESET", "30"))
+
+# Exception classes (by name, so no SDK has to be imported) that signal a
+# transient network problem: requests/urllib3, openai and amadeus errors.
+_TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ConnectTimeout",
+    "MaxRetryError",
+    "NetworkError",
+    "ProtocolError",
+    "ReadTimeout",
+    "ReadTimeoutError",
+}
+
+# Per-dependency counters exposed as metrics.
+COUNTERS = (
+    "calls", "failures", "timeouts", "retries", "rejected", "hedges", "hedge_wins",
+)  # fmt: skip
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose circuit breaker is open."""
+
+
+class UpstreamTimeout(TimeoutError):
+    """Raised when a dependency does not answer within its deadline."""
+
+
+@contextmanager
+def request_budget(seconds=None):
+    """Limit upstream calls made inside the block to ``seconds`` in total.
+
+    Nested budgets can only shorten the deadline of the enclosing one.
+
+    Args:
+        seconds: The budget in seconds (default: REQUEST_BUDGET).
+    """
+    deadline = time.monotonic() + (REQUEST_BUDGET if seconds is None else seconds)
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget():
+    """Return the seconds left of the current request budget (inf without one)."""
+    deadline = _deadline.get()
+    return math.inf if deadline is None else deadline - time.monotonic()
+
+
+def _status(error):
+    for obj in (error, getattr(error, "response", None)):
+        for field in ("status_code", "status"):
+            status = getattr(obj, field, None)
+            if isinstance(status, int):
+                return status
+    return None
+
+
+def is_transient(error):
+    """Return True if ``error`` is worth retrying (and hedging around)."""
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    status = _status(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    return any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+def is_not_found(error):
+    """Return True if ``error`` is a 404 answer (e.g. Pinecone's NotFoundException)."""
+    return _status(error) == 404 or any(
+        cls.__name__ == "NotFoundException" for cls in type(error).__mro__
+    )
+
+
+def _is_client_error(error):
+    status = _status(error)
+    return status is not None and 400 <= status < 500 and status != 429
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed, calls go through. After ``failures`` failed calls in a row it opens
+    and rejects calls for ``reset_timeout`` seconds, then lets a single trial
+    call through (half-open): success closes it, failure opens it again.
+    The breaker is shared by threads and event loops, so it is lock-protected.
+
+    Args:
+        failures: Consecutive failures that open the circuit.
+        reset_timeout: Seconds the circuit stays open before a trial call.
+    """
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+    def __init__(self, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET):
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go ahead, moving open to half-open on time."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            # A trial that never reported back (e.g. it was cancelled) is
+            # replaced by a new one after another reset_timeout.
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if (
+                self.state == self.HALF_OPEN
+                or self.consecutive_failures >= self.failures
+            ):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Dependency:
+    """Deadlines, retries, hedging and a circuit breaker for one upstream.
+
+    Args:
+        name: The dependency's name in errors and metrics, e.g. "amadeus".
+        timeout: Seconds one attempt may take (capped by the request budget).
+        retries: Retries after a transient failure (default: UPSTREAM_RETRIES).
+        backoff: Base backoff delay in seconds (default: UPSTREAM_BACKOFF).
+        breaker: The CircuitBreaker to use (default: a new one).
+    """
+
+    def __init__(self, name, timeout, retries=None, backoff=None, breaker=None):
+        self.name = name
+        self.timeout = timeout
+        self.retries = UPSTREAM_RETRIES if retries is None else retries
+        self.backoff = UPSTREAM_BACKOFF if backoff is None else backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.reset()
+
+    def reset(self):
+        """Close the circuit and forget latencies and counters."""
+        self.breaker.record_success()
+        self.latency = LatencyHistogram()
+        self.counts = dict.fromkeys(COUNTERS, 0)
+
+    def hedge_delay(self):
+        """Seconds after which to send a duplicate read, or None not to hedge.
+
+        Reads are not hedged before HEDGE_MIN_SAMPLES latencies are known or
+        once HEDGE_BUDGET of the calls have been hedged.
+        """
+        if (
+            not HEDGE_ENABLED
+            or self.latency.count < HEDGE_MIN_SAMPLES
+            or self.counts["hedges"] >= HEDGE_BUDGET * self.counts["calls"]
+        ):
+            return None
+        return max(self.latency.percentile(HEDGE_QUANTILE) / 1000, HEDGE_MIN_DELAY)
+
+    async def call(self, fn, *args, idempotent=False, **kwargs):
+        """Call ``fn(*args, **kwargs)`` (awaiting it if needed) resiliently.
+
+        Blocking functions should be passed through ``asyncio.to_thread``, e.g.
+        ``call(asyncio.to_thread, index.search, ...)``. Idempotent reads are
+        hedged; transient failures are retried while the budget allows.
+
+        Raises:
+            CircuitOpenError: If the circuit is open; nothing is called.
+            UpstreamTimeout: If the last attempt ran out of time.
+            Exception: The last error raised by ``fn``.
+        """
+        if not self.breaker.allow():
+            self.counts["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+        self.counts["calls"] += 1
+        for attempt in range(self.retries + 1):
+            timeout = min(self.timeout, remaining_budget())
+            try:
+                if timeout <= 0:
+                    raise UpstreamTimeout(f"{self.name}: request budget exhausted")
+                result = await self._attempt(fn, args, kwargs, timeout, idempotent)
+            except Exception as error:
+                if _is_client_error(error):
+                    # The upstream answered; the request itself was wrong.
+                    self.breaker.record_success()
+                    raise
+                delay = self.backoff * 2**attempt * random.uniform(0.5, 1.5)
+                if (
+                    attempt == self.retries
+                    or not is_transient(error)
+                    or delay >= remaining_budget()
+                ):
+                    self.counts["failures"] += 1
+                    self.breaker.record_failure()
+                    raise
+                self.counts["retries"] += 1
+                await asyncio.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    async def _invoke(self, fn, args, kwargs):
+        result = fn(*args, **kwargs)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _attempt(self, fn, args, kwargs, timeout, hedge):
+        """Run one attempt, adding a hedged duplicate after ``hedge_delay``."""
+        started = time.monotonic()
+        delay = self.hedge_delay() if hedge else None
+        pending = {asyncio.ensure_future(self._invoke(fn, args, kwargs))}
+        hedged = None
+        error = None
+        try:
+            while pending:
+                elapsed = time.monotonic() - started
+                if elapsed >= timeout:
+                    break
+                wake = timeout - elapsed
+                if delay is not None and hedged is None:
+                    wake = min(wake, max(delay - elapsed, 0))
+                done, pending = await asyncio.wait(
+                    pending, timeout=wake, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self.latency.record((time.monotonic() - started) * 1000)
+                        if task is hedged:
+                            self.counts["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+                if (
+                    pending
+                    and hedged is None
+                    and delay is not None
+                    and time.monotonic() - started >= delay
+                ):
+                    self.counts["hedges"] += 1
+                    hedged = asyncio.ensure_future(self._invoke(fn, args, kwargs))
+                    pending.add(hedged)
+            if not pending:
+                raise error
+            self.counts["timeouts"] += 1
+            raise UpstreamTimeout(f"{self.name} did not answer within {timeout:.1f}s")
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def summary(self):
+        """Return the breaker state, counters, hedge win rate and latencies."""
+        hedges = self.counts["hedges"]
+        return {
+            "state": self.breaker.state,
+            **self.counts,
+            "hedge_win_rate": round(self.counts["hedge_wins"] / hedges, 3)
+            if hedges
+            else 0.0,
+            "p50_ms": round(self.latency.percentile(50), 1),
+            "p95_ms": round(self.latency.percentile(95), 1),
+        }
+
+
+dependencies = {
+    "groq": Dependency("groq", GROQ_TIMEOUT),
+    "pinecone": Dependency("pinecone", PINECONE_TIMEOUT),
+    "amadeus": Dependency("amadeus", AMADEUS_TIMEOUT),
+}
+
+
+def dependency(name):
+    """Return the shared Dependency for "groq", "pinecone" or "amadeus"."""
+    return dependencies[name]
+
+
+def reset_dependencies():
+    """Close every circuit and clear every dependency's latencies and counters."""
+    for dep in dependencies.values():
+        dep.reset()
+
+
+def summary():
+    """Return ``{name: Dependency.summary()}`` for every dependency."""
+    return {name: dep.summary() for name, dep in dependencies.items()}
+
+
+_BREAKER_STATES = {
+    CircuitBreaker.CLOSED: 0,
+    CircuitBreaker.HALF_OPEN: 1,
+    CircuitBreaker.OPEN: 2,
+}
+
+
+def prometheus(prefix="travel_upstream"):
+    """Render breaker states and call counters in the Prometheus text format."""
+    lines = [
+        (
+            f"# HELP {prefix}_circuit_state Circuit breaker state "
+            "(0 closed, 1 half-open, 2 open)."
+        ),
+        f"# TYPE {prefix}_circuit_state gauge",
+    ]
+    lines += [
+        f'{prefix}_circuit_state{{dependency="{name}"}} '
+        f"{_BREAKER_STATES[dep.breaker.state]}"
+        for name, dep in dependencies.items()
+    ]
+    for counter in COUNTERS:
+        lines.append(f"# TYPE {prefix}_{counter}_total counter")
+        lines += [
+            f'{prefix}_{counter}_total{{dependency="{name}"}} {dep.counts[counter]}'
+            for name, dep in dependencies.items()
+        ]
+    return "\n".join(lines) + "\n"
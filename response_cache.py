@@ -0,0 +1,77 @@
+import hashlib
+import os
+import re
+
+from cache import AsyncSingleFlight, TTLCache
+from travel_llm import MODEL, TOOL_SCHEMA_VERSION
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "512"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+# Prompts whose answer depends on live data (flight offers, dates) expire sooner.
+RESPONSE_CACHE_SHORT_TTL = float(os.getenv("RESPONSE_CACHE_SHORT_TTL", "300"))
+
+response_cache = TTLCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+_in_flight = AsyncSingleFlight()
+
+_TIME_SENSITIVE = re.compile(
+    r"\b(flights?|fly|flying|airfares?|fares?|tickets?|prices?|today|tonight|"
+    r"tomorrow|weekend|next week|this week)\b|\d{4}-\d{2}-\d{2}|"
+    r"\b(jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?\s+\d{1,2}\b",
+    re.IGNORECASE,
+)
+
+
+def normalize_prompt(prompt):
+    """Collapse whitespace and case so trivially different prompts share a key."""
+    return " ".join(prompt.split()).casefold()
+
+
+def cache_key(prompt):
+    """Return the cache key for a prompt, model and tool schema version."""
+    material = "\0".join((MODEL, TOOL_SCHEMA_VERSION, normalize_prompt(prompt)))
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def ttl_for(prompt):
+    """Return the TTL class for a prompt: short for time-sensitive prompts."""
+    if _TIME_SENSITIVE.search(prompt):
+        return RESPONSE_CACHE_SHORT_TTL
+    return RESPONSE_CACHE_TTL
+
+
+async def get_or_compute(prompt, compute, ttl_prompt=None, degraded=None):
+    """Return the cached answer for ``prompt`` or compute and cache it.
+
+    Identical prompts arriving while an answer is being computed wait for that
+    computation instead of starting their own. Exceptions, empty answers and
+    degraded answers are never cached.
+
+    Args:
+        prompt: The full prompt sent to the pipeline.
+        compute: Zero-argument coroutine function producing the answer.
+        ttl_prompt: The text ``ttl_for`` classifies (default: ``prompt``). Pass
+            the user's own prompt, so that instructions appended to it (which
+            mention flights) do not make every answer time-sensitive.
+        degraded: Optional zero-argument callable, checked once the answer is
+            computed; when it returns true (e.g. a tool failed while a breaker
+            was open) the answer is returned but not cached.
+
+    Returns:
+        A ``(answer, status)`` tuple where status is "HIT", "MISS" or
+        "COALESCED" (served by a concurrent identical request).
+    """
+    key = cache_key(prompt)
+    answer = response_cache.get(key)
+    if answer is not None:
+        return answer, "HIT"
+
+    status = "COALESCED" if key in _in_flight else "MISS"
+
+    async def compute_and_store():
+        answer = await compute()
+        if answer and not (degraded and degraded()):
+            ttl = ttl_for(prompt if ttl_prompt is None else ttl_prompt)
+            response_cache.set(key, answer, ttl=ttl)
+        return answer
+
+    return await _in_flight.do(key, compute_and_store), status
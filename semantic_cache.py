@@ -0,0 +1,151 @@
+import sqlite3
+import threading
+import time
+
+from embeddings import EMBED_DIM, hash_embed
+from lazy import lazy_module
+
+# NumPy is only imported when the first vector is built.
+np = lazy_module("numpy")
+
+
+class _CityIndex:
+    """In-memory vectors and answers cached for one city."""
+
+    def __init__(self, capacity, dim):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.questions = [None] * capacity
+        self.answers = [None] * capacity
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+
+    def free_slot(self, now):
+        """Return an unused or expired slot, or the least recently used one."""
+        expired = np.flatnonzero(self.expires_at <= now)
+        if len(expired):
+            return int(expired[0])
+        return int(np.argmin(self.last_used))
+
+
+class SemanticCache:
+    """Per-city cache that answers questions similar to ones seen before.
+
+    Questions are embedded and compared against the cached questions of the same
+    city with one vectorized dot product; the stored answer is returned when the
+    best cosine similarity reaches ``threshold``. Entries expire after ``ttl``
+    seconds, and each city keeps at most ``maxsize`` entries (expired first,
+    then least recently used are replaced).
+
+    Args:
+        threshold: Minimum cosine similarity for a hit.
+        ttl: Seconds an answer stays valid.
+        maxsize: Maximum number of entries per city.
+        embed: Function mapping text to a unit-length vector of ``dim`` floats.
+        dim: Dimension of the vectors returned by ``embed``.
+        path: Optional SQLite file that persists entries across processes.
+    """
+
+    def __init__(
+        self,
+        threshold=0.9,
+        ttl=86400,
+        maxsize=256,
+        embed=hash_embed,
+        dim=EMBED_DIM,
+        path=None,
+    ):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.embed = embed
+        self.dim = dim
+        self.hits = 0
+        self.misses = 0
+        self._cities = {}
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                "city TEXT, slot INTEGER, question TEXT, answer TEXT, "
+                "vector BLOB, expires_at REAL, PRIMARY KEY (city, slot))"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def _key(city):
+        return city.strip().casefold()
+
+    def _city_index(self, city):
+        """Return the index for a city, loading persisted entries on first use."""
+        index = self._cities.get(city)
+        if index is None:
+            index = self._cities[city] = _CityIndex(self.maxsize, self.dim)
+            if self._db is not None:
+                rows = self._db.execute(
+                    "SELECT slot, question, answer, vector, expires_at "
+                    "FROM semantic_cache WHERE city = ? AND slot < ?",
+                    (city, self.maxsize),
+                )
+                for slot, question, answer, vector, expires_at in rows:
+                    index.vectors[slot] = np.frombuffer(vector, dtype=np.float32)
+                    index.questions[slot] = question
+                    index.answers[slot] = answer
+                    index.expires_at[slot] = expires_at
+        return index
+
+    def lookup(self, city, question):
+        """Return the cached answer for a similar question about ``city``, or None."""
+        vector = self.embed(question)
+        now = time.time()
+        with self._lock:
+            index = self._city_index(self._key(city))
+            scores = index.vectors @ vector
+            scores[index.expires_at <= now] = -1.0
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                index.last_used[best] = now
+                self.hits += 1
+                return index.answers[best]
+            self.misses += 1
+            return None
+
+    def store(self, city, question, answer):
+        """Cache ``answer`` for ``question`` about ``city``."""
+        vector = self.embed(question)
+        now = time.time()
+        key = self._key(city)
+        with self._lock:
+            index = self._city_index(key)
+            slot = index.free_slot(now)
+            index.vectors[slot] = vector
+            index.questions[slot] = question
+            index.answers[slot] = answer
+            index.expires_at[slot] = now + self.ttl
+            index.last_used[slot] = now
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO semantic_cache VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, slot, question, answer, vector.tobytes(), now + self.ttl),
+                )
+                self._db.commit()
+
+    def clear(self):
+        """Remove every entry (including persisted ones) and reset the counters."""
+        with self._lock:
+            self._cities.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM semantic_cache")
+                self._db.commit()
+
+    def stats(self):
+        """Return the hit/miss counters and the number of live entries."""
+        now = time.time()
+        with self._lock:
+            size = sum(
+                int(np.count_nonzero(index.expires_at > now))
+                for index in self._cities.values()
+            )
+            return {"hits": self.hits, "misses": self.misses, "size": size}
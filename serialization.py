@@ -0,0 +1,207 @@
+import ast
+import json
+import os
+import re
+
+# Approximate token budgets for one tool result in the follow-up prompt.
+FLIGHT_RESULT_TOKENS = int(os.getenv("FLIGHT_RESULT_TOKENS", "400"))
+CITY_RESULT_TOKENS = int(os.getenv("CITY_RESULT_TOKENS", "300"))
+# Retrieved passages (CITY_QUERY_MODE=retrieve) replace a city answer as context.
+CITY_CONTEXT_TOKENS = int(os.getenv("CITY_CONTEXT_TOKENS", "500"))
+TOOL_RESULT_TOKENS = int(os.getenv("TOOL_RESULT_TOKENS", "400"))
+
+TOOL_TOKEN_BUDGETS = {
+    "search_flights": FLIGHT_RESULT_TOKENS,
+    "search_flexible_flights": FLIGHT_RESULT_TOKENS,
+    "query_city": CITY_RESULT_TOKENS,
+}
+
+FLIGHT_TOOLS = ("search_flights", "search_flexible_flights")
+FLIGHT_COLUMNS = "offer|price|from|to|carrier|departure|arrival"
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WHITESPACE = re.compile(r"[ \t]+")
+
+
+def estimate_tokens(text):
+    """Roughly estimate the number of tokens in ``text`` (about 4 chars each)."""
+    return len(text) // 4 + 1
+
+
+def truncate(text, limit):
+    """Cut ``text`` to at most ``limit`` characters, marking the cut."""
+    if len(text) <= limit:
+        return text
+    return text[: max(limit - 14, 0)] + " …[truncated]"
+
+
+def parse_arguments(arguments):
+    """Parse the arguments of a tool call into a dict without evaluating code.
+
+    Arguments are JSON; Python-style literals (single quotes, True/None), which
+    some models emit, are accepted through ``ast.literal_eval``.
+
+    Raises:
+        ValueError: If the arguments are neither JSON nor a Python literal.
+        TypeError: If they parse to something other than an object.
+    """
+    if isinstance(arguments, dict):
+        return arguments
+    try:
+        parsed = json.loads(arguments)
+    except (TypeError, ValueError):
+        try:
+            parsed = ast.literal_eval(arguments)
+        except (SyntaxError, ValueError) as error:
+            raise ValueError(f"Invalid tool arguments: {arguments!r}") from error
+    if not isinstance(parsed, dict):
+        raise TypeError(f"Tool arguments must be an object: {arguments!r}")
+    return parsed
+
+
+def _time(value):
+    """Shorten an ISO timestamp to minutes ("2025-10-10T08:00:00" -> "...T08:00")."""
+    return str(value or "")[:16]
+
+
+def flight_rows(results):
+    """Return the table rows of flight offers, one per segment.
+
+    Offers with the same segments as an earlier (cheaper) one are dropped.
+    The price is only given on an offer's first segment, and an arrival on the
+    day of departure is written as a time only.
+    """
+    rows = []
+    seen = set()
+    for offer in results:
+        segments = offer.get("itineraries") or []
+        signature = tuple(
+            (s.get("from"), s.get("to"), s.get("carrier"), s.get("departure_time"))
+            for s in segments
+        )
+        if signature in seen:
+            continue
+        seen.add(signature)
+        offer_rows = []
+        for i, segment in enumerate(segments):
+            departure = _time(segment.get("departure_time"))
+            arrival = _time(segment.get("arrival_time"))
+            if arrival[:10] == departure[:10]:
+                arrival = arrival[11:]
+            price = offer.get("price", "") if i == 0 else ""
+            offer_rows.append(
+                f"{len(seen)}|{price}|{segment.get('from', '')}|"
+                f"{segment.get('to', '')}|{segment.get('carrier', '')}|"
+                f"{departure}|{arrival}"
+            )
+        rows.append(offer_rows or [f"{len(seen)}|{offer.get('price', '')}|||||"])
+    return rows
+
+
+def format_flights(results, budget=FLIGHT_RESULT_TOKENS):
+    """Render flight offers as a compact table within ``budget`` tokens.
+
+    Whole offers are dropped from the end when the table is over budget, with
+    a note of how many were left out.
+    """
+    if not results:
+        return "No flights found."
+    offers = flight_rows(results)
+    lines = [FLIGHT_COLUMNS]
+    for shown, offer_rows in enumerate(offers):
+        remaining = len(offers) - shown
+        candidate = "\n".join([*lines, *offer_rows])
+        note = f"\n(+{remaining - 1} more)" if remaining > 1 else ""
+        if shown and estimate_tokens(candidate + note) > budget:
+            lines.append(f"(+{remaining} more)")
+            break
+        lines.extend(offer_rows)
+    return "\n".join(lines)
+
+
+def compact_text(text, budget):
+    """Collapse whitespace, drop repeated sentences and cut ``text`` to budget.
+
+    Line breaks (e.g. list items) are kept; the cut falls on a sentence or line
+    boundary when one is within budget.
+    """
+    lines = []
+    seen = set()
+    for line in text.splitlines():
+        kept = []
+        for sentence in _SENTENCE_END.split(_WHITESPACE.sub(" ", line).strip()):
+            key = sentence.casefold()
+            if sentence and key not in seen:
+                seen.add(key)
+                kept.append(sentence)
+        if kept:
+            lines.append(" ".join(kept))
+    compact = "\n".join(lines)
+    limit = budget * 4
+    if len(compact) <= limit:
+        return compact
+    head = compact[: max(limit - 14, 0)]
+    cut = max(head.rfind(boundary) for boundary in (". ", "! ", "? ", "\n"))
+    if cut > 0:
+        head = head[: cut + 1]
+    return head.rstrip() + " …[truncated]"
+
+
+def format_passages(passages, budget=CITY_CONTEXT_TOKENS):
+    """Render ranked passages as numbered lines within ``budget`` tokens.
+
+    Each line starts with the rank, score and section, e.g.
+    ``[1 0.82 Eat] Dotonbori is lined with ramen stalls.`` Lower-ranked
+    passages are dropped when over budget; a first passage that is too long
+    on its own is cut.
+    """
+    if not passages:
+        return "No passages found."
+    lines = []
+    for rank, passage in enumerate(passages, 1):
+        label = " ".join(
+            str(part)
+            for part in (rank, passage.get("score"), passage.get("section"))
+            if part is not None
+        )
+        line = f"[{label}] {passage['text']}"
+        if estimate_tokens("\n".join([*lines, line])) > budget:
+            if not lines:
+                lines.append(truncate(line, budget * 4))
+            break
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def serialize_tool_result(name, result, budget=None):
+    """Render a tool result as compact text for the follow-up completion.
+
+    Flight searches become a table (see ``format_flights``), retrieved city
+    passages numbered lines (see ``format_passages``, held to
+    CITY_CONTEXT_TOKENS), prose such as city answers is deduplicated and
+    trimmed, errors become one line, and any
+    other value is minified JSON. Each tool is held to its budget in
+    TOOL_TOKEN_BUDGETS (TOOL_RESULT_TOKENS for other tools).
+
+    Args:
+        name: The tool name.
+        result: The tool's return value.
+        budget: Approximate token budget overriding the tool's default.
+
+    Returns:
+        The text sent to the model as the tool message content.
+    """
+    if name == "query_city" and isinstance(result, list):
+        return format_passages(
+            result, CITY_CONTEXT_TOKENS if budget is None else budget
+        )
+    if budget is None:
+        budget = TOOL_TOKEN_BUDGETS.get(name, TOOL_RESULT_TOKENS)
+    if isinstance(result, dict) and "error" in result:
+        return truncate(f"error: {result['error']}", budget * 4)
+    if name in FLIGHT_TOOLS and isinstance(result, list):
+        return format_flights(result, budget)
+    if isinstance(result, str):
+        return compact_text(result, budget)
+    text = json.dumps(result, separators=(",", ":"), ensure_ascii=False, default=str)
+    return truncate(text, budget * 4)
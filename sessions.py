@@ -0,0 +1,168 @@
+import asyncio
+import os
+import uuid
+from collections import deque
+
+from cache import TTLCache
+from serialization import estimate_tokens, truncate
+
+SESSION_STORE_SIZE = int(os.getenv("SESSION_STORE_SIZE", "1000"))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+# Approximate token budget for the history sent with each turn.
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "3000"))
+# Tool outputs from earlier turns are cut to this many characters.
+SESSION_TOOL_OUTPUT_CHARS = int(os.getenv("SESSION_TOOL_OUTPUT_CHARS", "1200"))
+# Older turns collapsed into the summary keep this much of each question.
+_SUMMARY_QUESTION_CHARS = 200
+# Each session stores at most SESSION_MAX_TURNS full turns (older ones only
+# keep their question, for the summary) and SESSION_TOOL_RESULTS tool results.
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "20"))
+SESSION_TOOL_RESULTS = int(os.getenv("SESSION_TOOL_RESULTS", "32"))
+
+
+class Session:
+    """Conversation state of one client: past turns and cached tool results.
+
+    Both are bounded: beyond SESSION_MAX_TURNS the oldest turns are folded into
+    the summary (their questions only, at most SESSION_MAX_TURNS of them), and
+    tool results are kept in an LRU of SESSION_TOOL_RESULTS entries.
+
+    Args:
+        session_id: The client-visible session ID.
+        instructions: Optional system prompt sent once at the top of the context.
+    """
+
+    def __init__(self, session_id, instructions=None):
+        self.session_id = session_id
+        self.instructions = instructions
+        self.turns = []
+        # Questions of the turns folded out of ``turns``, oldest first.
+        self.earlier_questions = deque(maxlen=SESSION_MAX_TURNS)
+        # (tool name, normalized arguments) -> result, reused for the session.
+        self.tool_results = TTLCache(maxsize=SESSION_TOOL_RESULTS, ttl=SESSION_TTL)
+        # Serializes turns so each one sees the previous turn's history.
+        self.lock = asyncio.Lock()
+
+    def add_turn(self, question, answer, tools=()):
+        """Record a finished turn.
+
+        Args:
+            question: The user's message.
+            answer: The assistant's answer.
+            tools: ``(name, arguments, output)`` tuples of the tools it ran.
+        """
+        self.turns.append(
+            {"question": question, "answer": answer or "", "tools": list(tools)}
+        )
+        while len(self.turns) > SESSION_MAX_TURNS:
+            folded = self.turns.pop(0)
+            self.earlier_questions.append(
+                truncate(folded["question"], _SUMMARY_QUESTION_CHARS)
+            )
+
+    @staticmethod
+    def _turn_messages(turn):
+        messages = [{"role": "user", "content": turn["question"]}]
+        if turn["tools"]:
+            lines = [
+                f"{name}({arguments}) returned: "
+                f"{truncate(output, SESSION_TOOL_OUTPUT_CHARS)}"
+                for name, arguments, output in turn["tools"]
+            ]
+            messages.append(
+                {
+                    "role": "system",
+                    "content": "Tool results for this turn:\n" + "\n".join(lines),
+                }
+            )
+        messages.append({"role": "assistant", "content": turn["answer"]})
+        return messages
+
+    def context(self, budget=None):
+        """Return the history messages to send before the next user message.
+
+        The most recent turns are kept as user/assistant messages, with their
+        tool outputs cut to SESSION_TOOL_OUTPUT_CHARS. Once the token budget is
+        used up, older turns are collapsed into a single summary message listing
+        the questions asked; the oldest questions are dropped if even that does
+        not fit.
+
+        Args:
+            budget: Approximate token budget (default: SESSION_CONTEXT_TOKENS).
+
+        Returns:
+            A list of chat messages, oldest first.
+        """
+        budget = SESSION_CONTEXT_TOKENS if budget is None else budget
+        head = []
+        if self.instructions:
+            head.append({"role": "system", "content": self.instructions})
+            budget -= estimate_tokens(self.instructions)
+
+        recent = []
+        older = list(self.turns)
+        while older:
+            messages = self._turn_messages(older[-1])
+            cost = sum(estimate_tokens(m["content"]) for m in messages)
+            if cost > budget:
+                break
+            budget -= cost
+            recent[:0] = messages
+            older.pop()
+
+        questions = []
+        asked = [*self.earlier_questions, *(turn["question"] for turn in older)]
+        for question in reversed(asked):
+            line = f"- {truncate(question, _SUMMARY_QUESTION_CHARS)}"
+            if estimate_tokens(line) > budget:
+                break
+            budget -= estimate_tokens(line)
+            questions.insert(0, line)
+        if questions:
+            head.append(
+                {
+                    "role": "system",
+                    "content": "Earlier in this conversation the user asked:\n"
+                    + "\n".join(questions),
+                }
+            )
+        return head + recent
+
+
+class SessionStore:
+    """Bounded in-memory session store with LRU and TTL eviction.
+
+    Args:
+        maxsize: Maximum number of sessions kept.
+        ttl: Seconds a session lives after its last use.
+    """
+
+    def __init__(self, maxsize=SESSION_STORE_SIZE, ttl=SESSION_TTL):
+        self._sessions = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def create(self, instructions=None):
+        """Start a session under a new random ID and return it."""
+        session = Session(uuid.uuid4().hex, instructions)
+        self._sessions.set(session.session_id, session)
+        return session
+
+    def get(self, session_id):
+        """Return the session for ``session_id``, or None if unknown or expired.
+
+        Sessions are only created by ``create``, so an ID chosen by a caller
+        never opens a session. Each hit renews the session's TTL.
+        """
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions.set(session_id, session)
+        return session
+
+    def clear(self):
+        """Remove every session."""
+        self._sessions.clear()
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+sessions = SessionStore()
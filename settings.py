@@ -0,0 +1,15 @@
+from dotenv import load_dotenv
+
+_env_loaded = False
+
+
+def load_env():
+    """Load variables from the .env file into the environment, once per process.
+
+    Every module calls this at import time so it can read its configuration;
+    only the first call searches for and parses the file.
+    """
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
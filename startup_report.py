@@ -0,0 +1,135 @@
+"""Break down the import time of the Lambda entry point.
+
+Run ``python -m startup_report`` to import ``main`` in a fresh interpreter with
+``-X importtime`` and print the slowest modules and top-level packages. With
+``--budget-ms`` the command exits with status 1 when the total import time
+exceeds the budget, so CI can catch cold-start regressions.
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+_HEADER = "import time: self [us] | cumulative | imported package"
+
+
+def parse_importtime(output):
+    """Parse ``-X importtime`` output into a list of per-module timings.
+
+    Args:
+        output: The interpreter's stderr.
+
+    Returns:
+        A list of ``{"module", "self_us", "cumulative_us", "depth"}`` dicts in
+        the order the imports finished.
+    """
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or line.startswith(_HEADER):
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:") :].split("|")
+            timings.append(
+                {
+                    "module": name.strip(),
+                    "self_us": int(self_us),
+                    "cumulative_us": int(cumulative_us),
+                    "depth": (len(name) - len(name.lstrip())) // 2,
+                }
+            )
+        except ValueError:
+            continue
+    return timings
+
+
+def summarize(timings, top=15):
+    """Aggregate timings into a report dict.
+
+    Args:
+        timings: Output of ``parse_importtime``.
+        top: Number of modules and packages to list.
+
+    Returns:
+        A dict with "total_ms" (the sum of top-level cumulative times),
+        "modules" (the slowest modules by cumulative time) and "packages"
+        (the slowest top-level packages by self time).
+    """
+    total_us = sum(t["cumulative_us"] for t in timings if t["depth"] == 0)
+    packages = {}
+    for t in timings:
+        package = t["module"].split(".")[0]
+        packages[package] = packages.get(package, 0) + t["self_us"]
+
+    modules = sorted(timings, key=lambda t: t["cumulative_us"], reverse=True)[:top]
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": [
+            {
+                "module": t["module"],
+                "self_ms": round(t["self_us"] / 1000, 1),
+                "cumulative_ms": round(t["cumulative_us"] / 1000, 1),
+            }
+            for t in modules
+        ],
+        "packages": [
+            {"package": name, "self_ms": round(us / 1000, 1)}
+            for name, us in sorted(packages.items(), key=lambda p: p[1], reverse=True)[
+                :top
+            ]
+        ],
+    }
+
+
+def measure(module="main"):
+    """Import ``module`` in a fresh interpreter and return its parsed timings."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{completed.stderr}")
+    return parse_importtime(completed.stderr)
+
+
+def format_report(report):
+    """Render a report dict as a plain-text table."""
+    lines = [f"Total import time: {report['total_ms']:.1f} ms", ""]
+    lines.append(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for m in report["modules"]:
+        lines.append(f"{m['cumulative_ms']:>14.1f} {m['self_ms']:>9.1f}  {m['module']}")
+    lines += ["", f"{'self ms':>14}  package"]
+    for p in report["packages"]:
+        lines.append(f"{p['self_ms']:>14.1f}  {p['package']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main", help="module to import")
+    parser.add_argument("--top", type=int, default=15, help="rows per table")
+    parser.add_argument("--json", action="store_true", help="print JSON")
+    parser.add_argument(
+        "--budget-ms",
+        type=float,
+        help="exit with status 1 when the total import time exceeds this",
+    )
+    args = parser.parse_args(argv)
+
+    report = summarize(measure(args.module), top=args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+
+    if args.budget_ms is not None and report["total_ms"] > args.budget_ms:
+        print(
+            f"Import time {report['total_ms']:.1f} ms exceeds the budget of "
+            f"{args.budget_ms:.0f} ms",
+            file=sys.stderr,
+        )
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
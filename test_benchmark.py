@@ -0,0 +1,101 @@
+import unittest
+
+from benchmark import Latency, compare, run_benchmarks
+
+
+class TestBenchmark(unittest.TestCase):
+    """Tests for the offline benchmark harness."""
+
+    def test_latency_specs(self):
+        """Latency specs are parsed into seeded distributions (in seconds)."""
+        self.assertEqual(Latency("fixed:250").sample(), 0.25)
+        self.assertTrue(0.1 <= Latency("uniform:100:200").sample() <= 0.2)
+        self.assertEqual(
+            Latency("lognormal:300:0.4", seed=1).sample(),
+            Latency("lognormal:300:0.4", seed=1).sample(),
+        )
+        with self.assertRaises(ValueError):
+            Latency("gamma:1")
+
+    def test_api_scenarios_with_fakes(self):
+        """Every scenario completes offline and reports latency and status codes."""
+        report = run_benchmarks(
+            scenarios=("flight_search", "multi_city_itinerary", "rate_limit_storm"),
+            requests=30,
+            concurrency=5,
+            llm_latency="fixed:0",
+            index_latency="fixed:0",
+            amadeus_latency="fixed:0",
+        )
+        scenarios = report["scenarios"]
+
+        self.assertEqual(scenarios["flight_search"]["status_codes"], {"200": 30})
+        self.assertIn("tool.search_flights", scenarios["flight_search"]["stages"])
+        self.assertEqual(
+            scenarios["multi_city_itinerary"]["stages"]["tool.query_city"]["count"], 90
+        )
+        self.assertEqual(
+            scenarios["rate_limit_storm"]["status_codes"], {"200": 20, "429": 10}
+        )
+        self.assertGreater(scenarios["flight_search"]["throughput_rps"], 0)
+        self.assertIn("p99_ms", scenarios["flight_search"]["latency"])
+
+    def test_retrieve_mode_skips_nested_completions(self):
+        """With retrieved passages, each itinerary costs two model calls."""
+        report = run_benchmarks(
+            scenarios=("multi_city_itinerary",),
+            requests=10,
+            concurrency=5,
+            llm_latency="fixed:0",
+            index_latency="fixed:0",
+            amadeus_latency="fixed:0",
+            city_mode="retrieve",
+            router="off",
+        )
+        scenario = report["scenarios"]["multi_city_itinerary"]
+
+        self.assertEqual(report["config"]["city_mode"], "retrieve")
+        self.assertEqual(scenario["status_codes"], {"200": 10})
+        self.assertNotIn("llm.city_answer", scenario["stages"])
+        self.assertEqual(scenario["llm_calls"], 20)
+
+    def test_rules_router_skips_tool_selection(self):
+        """Routed flight searches cost one model call instead of two."""
+        calls = {}
+        for router in ("off", "rules"):
+            report = run_benchmarks(
+                scenarios=("flight_search",),
+                requests=10,
+                concurrency=5,
+                llm_latency="fixed:0",
+                index_latency="fixed:0",
+                amadeus_latency="fixed:0",
+                router=router,
+            )
+            calls[router] = report["scenarios"]["flight_search"]["llm_calls"]
+        stages = report["scenarios"]["flight_search"]["stages"]
+
+        self.assertEqual(calls, {"off": 20, "rules": 10})
+        self.assertEqual(stages["router.rules"]["count"], 10)
+
+    def test_compare(self):
+        """Comparisons report the relative change per scenario."""
+        old = {
+            "scenarios": {
+                "flight_search": {"throughput_rps": 10, "latency": {"p95_ms": 200}}
+            }
+        }
+        new = {
+            "scenarios": {
+                "flight_search": {"throughput_rps": 12, "latency": {"p95_ms": 150}}
+            }
+        }
+
+        lines = compare(old, new)
+
+        self.assertIn("+20.0%", lines[0])
+        self.assertIn("-25.0%", lines[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+from cache import SingleFlight, TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    """Tests for the LRU + TTL cache."""
+
+    def test_get_set_and_counters(self):
+        """Hits and misses are counted."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(
+            cache.stats(), {"hits": 1, "misses": 1, "evictions": 0, "size": 1}
+        )
+        self.assertEqual(cache.peek("a"), 1)
+        self.assertIsNone(cache.peek("b"))
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first."""
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        """Entries are dropped once their TTL has passed, per-entry TTL included."""
+        cache = TTLCache(maxsize=10, ttl=60)
+        cache.set("short", 1, ttl=0.05)
+        cache.set("long", 2)
+        time.sleep(0.1)
+
+        self.assertIsNone(cache.get("short"))
+        self.assertEqual(cache.get("long"), 2)
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Tests for collapsing concurrent identical calls."""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Threads asking for the same key get the leader's result."""
+        flight = SingleFlight()
+        calls = []
+        barrier = threading.Event()
+
+        def work():
+            calls.append(1)
+            barrier.wait(1)
+            return "result"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("k", work)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.1)
+        barrier.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(calls, [1])
+        self.assertEqual(results, ["result"] * 5)
+
+    def test_exceptions_propagate_and_are_not_kept(self):
+        """A failed call raises for its waiters and the next call runs again."""
+        flight = SingleFlight()
+
+        def fail():
+            raise ValueError("Boom")
+
+        with self.assertRaises(ValueError):
+            flight.do("k", fail)
+        self.assertEqual(flight.do("k", lambda: "ok"), "ok")
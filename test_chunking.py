@@ -0,0 +1,101 @@
+import unittest
+from itertools import pairwise
+from unittest.mock import patch
+
+import chunking
+from chunking import LEAD_SECTION, iter_chunks, iter_paragraphs, iter_text_chunks
+
+PAGE = (
+    "<html><body>"
+    "<p>Tokyo is the capital of Japan.</p>"
+    '<h2><span class="mw-headline">See</span>'
+    '<span class="mw-editsection">[<a href="#">edit</a>]</span></h2>'
+    "<p>Senso-ji is the oldest temple. It is in <b>Asakusa</b>.</p>"
+    "<p>Tokyo Tower is red.</p>"
+    "<h2>Eat</h2>"
+    "<p>Try sushi at the market.</p>"
+    "</body></html>"
+)
+
+
+class TestChunking(unittest.TestCase):
+    """Tests for the streaming HTML parser and sentence-aware chunker."""
+
+    def test_paragraphs_carry_their_section(self):
+        """Paragraphs are tagged with the preceding <h2>, minus edit links."""
+        self.assertEqual(
+            list(iter_paragraphs([PAGE])),
+            [
+                (LEAD_SECTION, "Tokyo is the capital of Japan."),
+                ("See", "Senso-ji is the oldest temple. It is in Asakusa."),
+                ("See", "Tokyo Tower is red."),
+                ("Eat", "Try sushi at the market."),
+            ],
+        )
+
+    def test_stdlib_backend_matches_lxml(self):
+        """Without lxml the pure-Python parser yields the same paragraphs."""
+        expected = list(iter_paragraphs([PAGE]))
+        with patch("chunking.etree", None):
+            self.assertEqual(list(iter_paragraphs([PAGE])), expected)
+
+    def test_fragments_split_mid_tag(self):
+        """A page fed in small pieces parses the same as in one piece."""
+        pieces = [PAGE[i : i + 7] for i in range(0, len(PAGE), 7)]
+        for etree in (chunking.etree, None):
+            with patch("chunking.etree", etree):
+                self.assertEqual(
+                    list(iter_paragraphs(pieces)), list(iter_paragraphs([PAGE]))
+                )
+
+    def test_chunks_end_on_sentence_or_word_boundaries(self):
+        """Chunks respect the size, never cut words and overlap whole words."""
+        text = " ".join(f"Sentence number {i} is about temples." for i in range(40))
+        words = set(text.split())
+
+        chunks = list(iter_text_chunks([text], size=100, overlap=20))
+
+        self.assertGreater(len(chunks), 1)
+        for previous, chunk in pairwise(chunks):
+            self.assertLessEqual(len(chunk), 100)
+            self.assertTrue(previous.endswith("."))
+            self.assertTrue(set(chunk.split()) <= words)
+            carried = chunk[: chunk.index(" Sentence")]
+            self.assertTrue(previous.endswith(f" {carried}"))
+            self.assertLessEqual(len(carried), 20)
+
+    def test_words_longer_than_size_are_sliced(self):
+        """A single oversized token is the only thing cut mid-word."""
+        self.assertEqual(
+            list(iter_text_chunks(["abcdefghijklmnopqrstuvwxyz"], size=10, overlap=3)),
+            ["abcdefghij", "klmnopqrst", "uvwxyz"],
+        )
+
+    def test_chunks_stay_within_a_section(self):
+        """Each chunk belongs to one section and positions count up."""
+        chunks = list(iter_chunks([PAGE], size=40, overlap=10))
+
+        self.assertEqual([c["position"] for c in chunks], list(range(len(chunks))))
+        self.assertEqual(chunks[-1]["section"], "Eat")
+        self.assertIn("Try sushi at the market.", [c["text"] for c in chunks])
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk["text"]), 40)
+            self.assertFalse(chunk["text"].startswith("edit"))
+
+    def test_chunks_stream_before_the_page_ends(self):
+        """A long section yields chunks before the rest of the page is read."""
+        consumed = []
+
+        def fragments():
+            for i in range(500):
+                consumed.append(i)
+                yield f"<p>Paragraph {i} describes one more quiet street.</p>"
+
+        first = next(iter_chunks(fragments(), size=100, overlap=10))
+
+        self.assertEqual(first["section"], LEAD_SECTION)
+        self.assertLess(len(consumed), 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
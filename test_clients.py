@@ -0,0 +1,44 @@
+import unittest
+from unittest.mock import MagicMock
+
+import clients
+
+
+class TestClientRegistry(unittest.TestCase):
+    """Tests for the process-wide shared client registry."""
+
+    def setUp(self):
+        clients.reset_clients()
+
+    def test_get_client_reuses_instance(self):
+        """The same factory and arguments return one shared instance."""
+        factory = MagicMock(side_effect=lambda **kwargs: object())
+
+        first = clients.get_client(factory, api_key="key")
+        second = clients.get_client(factory, api_key="key")
+
+        self.assertIs(first, second)
+        factory.assert_called_once_with(api_key="key")
+
+    def test_get_client_separates_factories_and_arguments(self):
+        """Different factories or credentials get their own clients."""
+        factory_a = MagicMock(side_effect=lambda **kwargs: object())
+        factory_b = MagicMock(side_effect=lambda **kwargs: object())
+
+        a1 = clients.get_client(factory_a, api_key="key-1")
+        a2 = clients.get_client(factory_a, api_key="key-2")
+        b1 = clients.get_client(factory_b, api_key="key-1")
+
+        self.assertIsNot(a1, a2)
+        self.assertIsNot(a1, b1)
+
+    def test_reset_clients(self):
+        """reset_clients forces the next call to build a new client."""
+        factory = MagicMock(side_effect=lambda: object())
+
+        first = clients.get_client(factory)
+        clients.reset_clients()
+        second = clients.get_client(factory)
+
+        self.assertIsNot(first, second)
+        self.assertEqual(factory.call_count, 2)
@@ -0,0 +1,34 @@
+import asyncio
+import unittest
+
+from concurrency import run_sync
+
+
+class TestRunSync(unittest.TestCase):
+    """Tests for running coroutines from synchronous code."""
+
+    def test_run_sync_returns_result(self):
+        """run_sync returns the coroutine's result."""
+
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        self.assertEqual(run_sync(add(1, 2)), 3)
+
+    def test_run_sync_uses_one_loop(self):
+        """Every call runs on the same long-lived event loop."""
+
+        async def current_loop():
+            return asyncio.get_running_loop()
+
+        self.assertIs(run_sync(current_loop()), run_sync(current_loop()))
+
+    def test_run_sync_propagates_exceptions(self):
+        """Exceptions raised by the coroutine reach the caller."""
+
+        async def fail():
+            raise ValueError("Boom")
+
+        with self.assertRaises(ValueError):
+            run_sync(fail())
@@ -0,0 +1,28 @@
+import unittest
+
+import numpy as np
+
+from embeddings import EMBED_DIM, hash_embed
+
+
+class TestHashEmbed(unittest.TestCase):
+    """Tests for the local feature-hashing embedder."""
+
+    def test_unit_length_and_deterministic(self):
+        """Vectors are normalized and identical for identical text."""
+        vector = hash_embed("Temples in Kyoto")
+
+        self.assertEqual(vector.shape, (EMBED_DIM,))
+        self.assertAlmostEqual(float(np.linalg.norm(vector)), 1.0, places=5)
+        np.testing.assert_array_equal(vector, hash_embed("temples in kyoto"))
+
+    def test_rephrasings_are_similar(self):
+        """Synonymous phrasings score higher than different intents."""
+        sights = hash_embed("top things to do in Tokyo")
+
+        self.assertGreater(float(sights @ hash_embed("what to see in Tokyo")), 0.9)
+        self.assertLess(float(sights @ hash_embed("where to eat in Tokyo")), 0.5)
+
+    def test_empty_text(self):
+        """Text made only of stopwords embeds to the zero vector."""
+        self.assertFalse(hash_embed("what is the").any())
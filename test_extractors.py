@@ -0,0 +1,97 @@
+import unittest
+
+from extractors import (
+    find_cities,
+    find_date,
+    find_flight_search,
+    find_section,
+    find_tool_calls,
+)
+
+
+class TestExtractors(unittest.TestCase):
+    """Tests for the prompt entity extractors."""
+
+    def test_find_cities(self):
+        """Known cities are found case-insensitively, in order, once each."""
+        self.assertEqual(
+            find_cities("kyoto first, then Hong Kong and back to Kyoto"),
+            ["Kyoto", "Hong Kong"],
+        )
+        self.assertEqual(find_cities("Paris in spring"), [])
+
+    def test_find_flight_search(self):
+        """A route with an ISO date becomes search_flights arguments."""
+        self.assertEqual(
+            find_flight_search("Flights KIX to HND on 2025-10-10 for 2 adults"),
+            {"origin": "KIX", "destination": "HND", "date": "2025-10-10", "adults": 2},
+        )
+        self.assertEqual(find_flight_search("JFK→LHR 2025-12-15")["destination"], "LHR")
+        self.assertIsNone(find_flight_search("Flights from KIX next Friday"))
+        self.assertIsNone(find_flight_search("What does ABC-DEF mean on 2025-01-01?"))
+
+    def test_find_flight_search_passengers(self):
+        """Passenger counts are parsed, and unclear ones are left to the model."""
+        for prompt, adults in [
+            ("Flights SIN-NRT 2025-12-01 for 10 adults", 10),
+            ("Flights SIN-NRT 2025-12-01 for two passengers", 2),
+            ("Flights SIN-NRT 2025-12-01", 1),
+            ("Flights SIN-NRT 2025-12-01 for 2 adults and a child", None),
+            ("Flights SIN-NRT 2025-12-01 for a family of four", None),
+            ("Flights SIN-NRT 2025-12-01 for several travellers", None),
+        ]:
+            flight = find_flight_search(prompt)
+            self.assertEqual(flight and flight["adults"], adults, prompt)
+        self.assertEqual(
+            find_flight_search(
+                "Flights from New York (JFK) to London (LHR) on December 15, 2025"
+            )["origin"],
+            "JFK",
+        )
+
+    def test_find_date(self):
+        """ISO and month-name dates are normalized; invalid ones are skipped."""
+        self.assertEqual(find_date("leaving December 15, 2025"), "2025-12-15")
+        self.assertEqual(find_date("on the 3rd Mar. 2026"), "2026-03-03")
+        self.assertEqual(find_date("Feb 30, 2025 or 2025-03-02"), "2025-03-02")
+        self.assertIsNone(find_date("next Friday"))
+
+    def test_find_tool_calls(self):
+        """Spelled-out flights and known cities become tool calls."""
+        prompt = "Things to do in Osaka, and flights KIX to HND 2025-10-10"
+        self.assertEqual(
+            [name for name, _ in find_tool_calls(prompt)],
+            ["search_flights", "query_city"],
+        )
+        self.assertEqual(find_tool_calls(prompt)[1][1]["question"], prompt)
+        self.assertEqual(find_tool_calls("Somewhere warm in December?"), [])
+
+    def test_find_tool_calls_skips_flight_endpoints(self):
+        """Cities named only as flight endpoints are not queried."""
+        calls = find_tool_calls("Flights from Tokyo (HND) to Seoul (ICN) on 2025-12-15")
+        self.assertEqual([name for name, _ in calls], ["search_flights"])
+        self.assertEqual(
+            find_tool_calls("Cheaper to fly from Bangkok or Kuala Lumpur to Sydney?"),
+            [],
+        )
+        calls = find_tool_calls(
+            "Flights from Tokyo (HND) to Seoul (ICN) on 2025-12-15, "
+            "and where to eat in Seoul?"
+        )
+        self.assertEqual(
+            [(name, args.get("city")) for name, args in calls],
+            [("search_flights", None), ("query_city", "Seoul")],
+        )
+
+    def test_find_section(self):
+        """Questions aimed at one guide section map to it; others to None."""
+        self.assertEqual(find_section("Best ramen restaurants in Tokyo?"), "Eat")
+        self.assertEqual(
+            find_section("How do I get around Seoul by subway"), "Get around"
+        )
+        self.assertIsNone(find_section("Good food near cheap hotels"))
+        self.assertIsNone(find_section("Tell me about Kyoto"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import gzip
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from fetcher import Fetcher
+
+
+class _StandIn(BaseHTTPRequestHandler):
+    """Local stand-in for Wikivoyage that honours If-None-Match."""
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            time.sleep(server.delay)
+            page = server.pages.get(self.path)
+            if page is None:
+                self.send_response(404)
+                self.end_headers()
+                return
+            body, etag = page
+            if self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            data = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", etag)
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                data = gzip.compress(data)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestFetcher(unittest.TestCase):
+    """Tests for the cached, conditional-GET page fetcher."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StandIn)
+        self.server.pages = {"/wiki/Tokyo": ("<p>Senso-ji temple.</p>", '"v1"')}
+        self.server.requests = []
+        self.server.lock = threading.Lock()
+        self.server.active = self.server.max_active = 0
+        self.server.delay = 0
+        thread = threading.Thread(
+            target=self.server.serve_forever, args=(0.01,), daemon=True
+        )
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/wiki/Tokyo"
+
+    def _fetcher(self, **kwargs):
+        kwargs.setdefault("host_delay", 0)
+        return Fetcher(self.tmp.name, **kwargs)
+
+    def test_conditional_get_serves_304_from_cache(self):
+        """A second fetch revalidates with the ETag and reuses the stored body."""
+        fetcher = self._fetcher()
+
+        first = fetcher.fetch(self.url)
+        second = fetcher.fetch(self.url)
+
+        self.assertFalse(first.from_cache)
+        self.assertEqual(first.headers["ETag"], '"v1"')
+        self.assertTrue(second.not_modified)
+        self.assertEqual(second.text, "<p>Senso-ji temple.</p>")
+        self.assertEqual(self.server.requests[1][1]["If-None-Match"], '"v1"')
+
+    def test_changed_page_replaces_cached_body(self):
+        """A new ETag downloads and stores the new body."""
+        fetcher = self._fetcher()
+        fetcher.fetch(self.url)
+        self.server.pages["/wiki/Tokyo"] = ("<p>Tokyo Tower.</p>", '"v2"')
+
+        response = fetcher.fetch(self.url)
+
+        self.assertFalse(response.not_modified)
+        self.assertEqual(response.text, "<p>Tokyo Tower.</p>")
+        self.assertEqual(response.headers["ETag"], '"v2"')
+
+    def test_gzip_body_is_stored_decoded(self):
+        """Compressed responses are decompressed and streamed from disk."""
+        response = self._fetcher().fetch(self.url)
+
+        self.assertIn("gzip", self.server.requests[0][1]["Accept-Encoding"])
+        self.assertEqual(
+            "".join(response.iter_content(chunk_size=4, decode_unicode=True)),
+            "<p>Senso-ji temple.</p>",
+        )
+
+    def test_offline_mode_only_uses_the_cache(self):
+        """Offline fetches never hit the network and fail on a cache miss."""
+        self._fetcher().fetch(self.url)
+        offline = self._fetcher(offline=True)
+
+        self.assertEqual(offline.fetch(self.url).text, "<p>Senso-ji temple.</p>")
+        with self.assertRaises(FileNotFoundError):
+            offline.fetch(self.url.replace("Tokyo", "Kyoto"))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_fresh_entry_skips_revalidation(self):
+        """Within the TTL a cached page is served without a request."""
+        fetcher = self._fetcher(ttl=60)
+        fetcher.fetch(self.url)
+
+        self.assertTrue(fetcher.fetch(self.url).from_cache)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_error_status_raises_and_is_not_cached(self):
+        """HTTP errors propagate and leave nothing to serve offline."""
+        missing = self.url.replace("Tokyo", "Atlantis")
+        with self.assertRaises(requests.HTTPError):
+            self._fetcher().fetch(missing)
+        with self.assertRaises(FileNotFoundError):
+            self._fetcher(offline=True).fetch(missing)
+
+    def test_requests_per_host_are_bounded(self):
+        """Concurrent fetches to one host never exceed ``per_host``."""
+        self.server.delay = 0.05
+        for city in ("Kyoto", "Osaka", "Seoul", "Taipei"):
+            self.server.pages[f"/wiki/{city}"] = (f"<p>{city}</p>", f'"{city}"')
+        fetcher = self._fetcher(per_host=2)
+        urls = [self.url.replace("Tokyo", c) for c in ("Kyoto", "Osaka", "Seoul")]
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            texts = [r.text for r in pool.map(fetcher.fetch, urls + [self.url])]
+
+        self.assertEqual(texts[0], "<p>Kyoto</p>")
+        self.assertLessEqual(self.server.max_active, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,13 @@ from unittest.mock import patch, MagicMock
 class TestSearchFlights(unittest.TestCase):
     """Tests for the flight search wrapper over the Amadeus client."""
 
+    def setUp(self):
+        from flight_agent import flight_cache
+        from resilience import reset_dependencies
+
+        flight_cache.clear()
+        reset_dependencies()
+
     @patch("flight_agent.Client")
     @patch("flight_agent.os.getenv")
     def test_search_flights_success(self, mock_getenv, mock_client_class):
@@ -78,3 +85,310 @@ class TestSearchFlights(unittest.TestCase):
 
         self.assertIsInstance(result, dict)
         self.assertIn("error", result)
+
+
+def _offer(price="123.45"):
+    return {
+        "price": {"total": price},
+        "itineraries": [
+            {
+                "segments": [
+                    {
+                        "departure": {"iataCode": "SFO", "at": "2025-10-10T08:00"},
+                        "arrival": {"iataCode": "LAX", "at": "2025-10-10T09:30"},
+                        "carrierCode": "UA",
+                    }
+                ]
+            }
+        ],
+    }
+
+
+@patch("flight_agent.os.getenv", return_value="test")
+@patch("flight_agent.Client")
+class TestSearchFlightsCache(unittest.TestCase):
+    """Tests for the TTL cache in front of search_flights."""
+
+    def setUp(self):
+        from flight_agent import flight_cache
+        from resilience import reset_dependencies
+
+        flight_cache.clear()
+        reset_dependencies()
+
+    def test_normalized_queries_share_cache_entry(self, mock_client_class, _):
+        """Case and whitespace variants of one route hit the same entry."""
+        from flight_agent import flight_cache, search_flights
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.return_value.data = [_offer()]
+
+        first = search_flights("sfo", "lax", "2025-10-10")
+        second = search_flights(" SFO", "LAX ", "2025-10-10", adults=1)
+
+        self.assertEqual(first, second)
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.kwargs["originLocationCode"], "SFO")
+        self.assertEqual(flight_cache.stats()["hits"], 1)
+
+    def test_place_names_resolve_to_codes(self, mock_client_class, _):
+        """City names search by their code and share the code's cache entry."""
+        from flight_agent import search_flights
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.return_value.data = [_offer()]
+
+        first = search_flights("Kuala Lumpur", "tokyo", "2025-10-10")
+        second = search_flights("KUL", "TYO", "2025-10-10")
+
+        self.assertEqual(first, second)
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args.kwargs["originLocationCode"], "KUL")
+        self.assertEqual(mock_get.call_args.kwargs["destinationLocationCode"], "TYO")
+
+    def test_errors_are_not_cached(self, mock_client_class, _):
+        """Error dicts are returned but the next call retries Amadeus."""
+        from flight_agent import search_flights
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.side_effect = [Exception("Boom"), MagicMock(data=[_offer()])]
+
+        self.assertIn("error", search_flights("SFO", "LAX", "2025-10-10"))
+        self.assertIsInstance(search_flights("SFO", "LAX", "2025-10-10"), list)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_invalid_arguments_skip_amadeus(self, mock_client_class, _):
+        """Malformed codes or dates are rejected before any Amadeus call."""
+        from flight_agent import search_flights
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+
+        self.assertIn("IATA", search_flights("Atlantis", "LAX", "2025-10-10")["error"])
+        self.assertIn("date", search_flights("SFO", "LAX", "10/10/2025")["error"])
+        self.assertIn("adults", search_flights("SFO", "LAX", "2025-10-10", 12)["error"])
+        mock_get.assert_not_called()
+
+    def test_open_circuit_skips_amadeus(self, mock_client_class, _):
+        """Once Amadeus keeps failing, searches fail fast with an error dict."""
+        from flight_agent import search_flights
+        from resilience import BREAKER_FAILURES, dependency
+
+        patcher = patch.object(dependency("amadeus"), "backoff", 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.side_effect = ConnectionError("Amadeus down")
+
+        for day in range(10, 10 + BREAKER_FAILURES):
+            search_flights("SFO", "LAX", f"2025-10-{day}")
+        calls = mock_get.call_count
+        result = search_flights("SFO", "LAX", "2025-10-28")
+
+        self.assertIn("circuit open", result["error"])
+        self.assertEqual(mock_get.call_count, calls)
+
+    def test_concurrent_misses_make_one_call(self, mock_client_class, _):
+        """N concurrent identical misses result in a single upstream call."""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        from flight_agent import search_flights
+
+        calls = []
+        lock = threading.Lock()
+
+        def slow_get(**kwargs):
+            with lock:
+                calls.append(kwargs)
+            time.sleep(0.2)
+            return MagicMock(data=[_offer()])
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.side_effect = slow_get
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(
+                pool.map(lambda _: search_flights("SFO", "LAX", "2025-10-10"), range(8))
+            )
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(r[0]["price"] == "123.45" for r in results))
+
+    def test_async_misses_await_amadeus_directly(self, mock_client_class, _):
+        """Async searches share one call and never block on the portal loop."""
+        import asyncio
+
+        from flight_agent import search_flights_async
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.return_value.data = [_offer()]
+
+        async def search_all():
+            return await asyncio.gather(
+                *(search_flights_async("SFO", "LAX", "2025-10-10") for _ in range(4))
+            )
+
+        with patch("flight_agent.run_sync", side_effect=AssertionError):
+            results = asyncio.run(search_all())
+
+        mock_get.assert_called_once()
+        self.assertTrue(all(r[0]["price"] == "123.45" for r in results))
+
+    def test_late_leader_reuses_cached_result(self, mock_client_class, _):
+        """A miss racing a finished search reuses its result, not Amadeus."""
+        from flight_agent import flight_cache, search_flights
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.return_value.data = [_offer()]
+        first = search_flights("SFO", "LAX", "2025-10-10")
+
+        # The lookup missed just before the first search stored its result.
+        with patch.object(flight_cache, "get", return_value=None):
+            second = search_flights("SFO", "LAX", "2025-10-10")
+
+        self.assertEqual(first, second)
+        mock_get.assert_called_once()
+
+
+def _route_offer(origin, destination, date, price, carrier="UA"):
+    return {
+        "price": {"total": price},
+        "itineraries": [
+            {
+                "segments": [
+                    {
+                        "departure": {"iataCode": origin, "at": f"{date}T08:00"},
+                        "arrival": {"iataCode": destination, "at": f"{date}T15:00"},
+                        "carrierCode": carrier,
+                    }
+                ]
+            }
+        ],
+    }
+
+
+class TestFlexibleSearch(unittest.TestCase):
+    """Tests for date-range and multi-airport flight searches."""
+
+    def setUp(self):
+        from flight_agent import flight_cache
+        from resilience import reset_dependencies
+
+        flight_cache.clear()
+        reset_dependencies()
+
+    def test_expand_routes_and_dates(self):
+        """Every route is searched on every day, skipping same-airport pairs."""
+        from flight_agent import expand_flight_searches
+
+        searches = expand_flight_searches(
+            "kul, sin", ["SIN", "NRT"], "2025-10-10", "2025-10-11", adults=2
+        )
+
+        self.assertEqual(len(searches), 6)
+        self.assertIn(("KUL", "SIN", "2025-10-11", 2), searches)
+        self.assertNotIn(("SIN", "SIN", "2025-10-10", 2), searches)
+
+    def test_expand_rejects_bad_ranges(self):
+        """Reversed, oversized or malformed queries raise ValueError."""
+        from flight_agent import FLEX_MAX_SEARCHES, expand_flight_searches
+
+        with self.assertRaises(ValueError):
+            expand_flight_searches(["SIN"], ["NRT"], "2025-10-12", "2025-10-10")
+        with self.assertRaises(ValueError):
+            expand_flight_searches(["SIN"], ["NRT"], "2025-10-01", "2025-12-31")
+        with self.assertRaises(ValueError):
+            expand_flight_searches(["SIN"], ["SIN"], "2025-10-10")
+        with self.assertRaises(ValueError):
+            expand_flight_searches(["Atlantis"], ["NRT"], "2025-10-10")
+        self.assertGreater(FLEX_MAX_SEARCHES, 1)
+
+    def test_expand_rejects_huge_ranges_without_expanding(self):
+        """The search count is checked before any single search is built."""
+        from flight_agent import expand_flight_searches
+
+        with (
+            patch("flight_agent.normalize_flight_query") as normalize,
+            self.assertRaises(ValueError) as raised,
+        ):
+            expand_flight_searches(["SIN", "KUL"], ["NRT"], "2025-01-01", "2034-12-31")
+
+        self.assertIn("7304 searches requested", str(raised.exception))
+        normalize.assert_not_called()
+
+    def test_merge_ranks_by_price_and_deduplicates(self):
+        """Offers are merged cheapest first, keeping the cheapest duplicate."""
+        from flight_agent import merge_flight_results
+
+        segment = {"from": "SIN", "to": "NRT", "carrier": "SQ"}
+        offer = {"price": "300.00", "itineraries": [segment]}
+        merged = merge_flight_results(
+            [
+                [offer, {"price": "150.50", "itineraries": [{**segment, "to": "HND"}]}],
+                {"error": "Boom"},
+                [{**offer, "price": "280.00"}],
+            ]
+        )
+
+        self.assertEqual([o["price"] for o in merged], ["150.50", "280.00"])
+        self.assertEqual(len(merge_flight_results([[offer]] * 3, limit=1)), 1)
+
+    @patch("flight_agent.os.getenv", return_value="test")
+    @patch("flight_agent.Client")
+    def test_fan_out_is_bounded_and_merged(self, mock_client_class, _):
+        """Searches run concurrently up to the bound and merge into one list."""
+        import asyncio
+        import threading
+        import time
+
+        from flight_agent import search_flight_options_async
+
+        lock = threading.Lock()
+        state = {"active": 0, "max": 0}
+        prices = {"KUL": "210.00", "SIN": "180.00"}
+
+        def get(**kwargs):
+            with lock:
+                state["active"] += 1
+                state["max"] = max(state["max"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            origin = kwargs["originLocationCode"]
+            date = kwargs["departureDate"]
+            price = "99.00" if date == "2025-10-12" else prices[origin]
+            return MagicMock(data=[_route_offer(origin, "NRT", date, price)])
+
+        mock_get = mock_client_class.return_value.shopping.flight_offers_search.get
+        mock_get.side_effect = get
+
+        with patch("flight_agent.FLEX_SEARCH_CONCURRENCY", 2):
+            results = asyncio.run(
+                search_flight_options_async(
+                    ["KUL", "SIN"], ["NRT"], "2025-10-10", "2025-10-12"
+                )
+            )
+
+        self.assertEqual(mock_get.call_count, 6)
+        self.assertLessEqual(state["max"], 2)
+        self.assertEqual([r["price"] for r in results[:2]], ["99.00", "99.00"])
+        self.assertEqual(results[2]["price"], "180.00")
+        self.assertEqual(len(results), 6)
+
+    def test_invalid_or_failed_searches_return_errors(self):
+        """Bad arguments and searches that all fail give an error dict."""
+        import asyncio
+
+        from flight_agent import search_flight_options_async
+
+        result = asyncio.run(search_flight_options_async(["SIN"], ["NRT"], "soon"))
+        self.assertIn("date", result["error"])
+
+        with patch(
+            "flight_agent.search_flights_async", return_value={"error": "quota"}
+        ):
+            result = asyncio.run(
+                search_flight_options_async(["SIN"], ["NRT", "HND"], "2025-10-10")
+            )
+        self.assertEqual(result, {"error": "quota"})
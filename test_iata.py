@@ -0,0 +1,79 @@
+import os
+import tempfile
+import unittest
+
+from iata import (
+    PlaceIndex,
+    airports_for,
+    canonical_city,
+    lookup,
+    resolve_code,
+    wikivoyage_slug,
+)
+
+
+class TestPlaceIndex(unittest.TestCase):
+    """Tests for the bundled airport/city index."""
+
+    def test_codes_names_and_aliases_resolve(self):
+        """Codes, names and aliases resolve in any case and spelling."""
+        self.assertEqual(resolve_code("kul"), "KUL")
+        self.assertEqual(resolve_code("Kuala Lumpur"), "KUL")
+        self.assertEqual(resolve_code("tokyo"), "TYO")
+        self.assertEqual(resolve_code("Heathrow"), "LHR")
+        self.assertEqual(resolve_code("Sao Paulo"), "SAO")
+        self.assertEqual(lookup("KL").name, "Kuala Lumpur")
+        self.assertEqual(lookup("NRT").city, "Tokyo")
+
+    def test_unknown_codes_pass_and_unknown_names_raise(self):
+        """Names beat unchecked codes; unknown names get suggestions."""
+        self.assertEqual(resolve_code("xyz"), "XYZ")
+        self.assertEqual(resolve_code("Goa"), "GOI")
+        self.assertEqual(resolve_code("goa"), "GOI")
+        self.assertEqual(resolve_code("GOA"), "GOA")
+        self.assertEqual(resolve_code("gox"), "GOX")
+        self.assertEqual(resolve_code("Rio"), "RIO")
+        with self.assertRaises(ValueError) as raised:
+            resolve_code("Atlantis")
+        self.assertIn("IATA", str(raised.exception))
+        self.assertIn("Atlanta (ATL)", str(raised.exception))
+
+    def test_prefix_and_fuzzy_matches(self):
+        """Unambiguous prefixes and close misspellings resolve."""
+        self.assertEqual(lookup("Kual").code, "KUL")
+        self.assertEqual(lookup("lond").code, "LON")
+        self.assertEqual(lookup("Kula Lumpor").code, "KUL")
+        self.assertEqual(lookup("Bangkock").code, "BKK")
+        self.assertIsNone(lookup("Tokio"))
+        self.assertIsNone(lookup(""))
+
+    def test_cities_map_to_airports_and_wikivoyage_pages(self):
+        """Cities list their airports; names map to Wikivoyage titles and slugs."""
+        self.assertEqual(airports_for("Tokyo"), ("HND", "NRT"))
+        self.assertEqual(airports_for("Kyoto"), ("KIX", "ITM"))
+        self.assertEqual(resolve_code("Kyoto"), "OSA")
+        self.assertEqual(airports_for("Atlantis"), ())
+        self.assertEqual(wikivoyage_slug("kuala lumpur"), "Kuala_Lumpur")
+        self.assertEqual(wikivoyage_slug("HCMC"), "Ho_Chi_Minh_City")
+        self.assertEqual(canonical_city("HND"), "Tokyo")
+        self.assertEqual(canonical_city(" Atlantis "), "Atlantis")
+
+    def test_index_loads_lazily_from_a_data_file(self):
+        """The file is only read on the first lookup."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "places.tsv")
+            index = PlaceIndex(path)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(
+                    "# header\n"
+                    "city\t\tGotham\tUS\t\tGotham City\n"
+                    "airport\tGTM\tGotham International Airport\tUS\tGotham\t\n"
+                )
+
+            self.assertEqual(index.lookup("gotham city").code, "GTM")
+            self.assertEqual(index.get("gtm").kind, "airport")
+            self.assertIsNone(index.lookup("Metropolis"))
+
+
+if __name__ == "__main__":
+    unittest.main()
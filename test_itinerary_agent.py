@@ -1,9 +1,14 @@
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
 
 
 class TestQueryCity(unittest.TestCase):
-    @patch("itinerary_agent.OpenAI")
+    def setUp(self):
+        from itinerary_agent import answer_cache
+
+        answer_cache.clear()
+
+    @patch("itinerary_agent.AsyncOpenAI")
     @patch("itinerary_agent.Pinecone")
     @patch("itinerary_agent.os.getenv")
     def test_query_city_success(
@@ -38,13 +43,13 @@ class TestQueryCity(unittest.TestCase):
         mock_choice.message.content = "Here is an answer about the city."
         mock_resp = MagicMock()
         mock_resp.choices = [mock_choice]
-        mock_client.chat.completions.create.return_value = mock_resp
+        mock_client.chat.completions.create = AsyncMock(return_value=mock_resp)
 
         result = query_city("paris", "What to see?")
 
         self.assertIn("answer", result.lower())
 
-    @patch("itinerary_agent.OpenAI")
+    @patch("itinerary_agent.AsyncOpenAI")
     @patch("itinerary_agent.Pinecone")
     @patch("itinerary_agent.os.getenv")
     def test_query_city_exception(
@@ -67,5 +72,180 @@ class TestQueryCity(unittest.TestCase):
 
         result = query_city("paris", "What to see?")
 
-        self.assertIsInstance(result, str)
-        self.assertIn("error while querying", result.lower())
+        self.assertEqual(result, {"error": "Error while querying Paris: Search failed"})
+
+    @patch("itinerary_agent.AsyncOpenAI")
+    @patch("itinerary_agent.Pinecone")
+    @patch("itinerary_agent.os.getenv")
+    def test_query_city_semantic_cache_hit(
+        self, mock_getenv, mock_pinecone_class, mock_openai_class
+    ):
+        """A rephrased question about the same city skips Pinecone and Groq."""
+        from itinerary_agent import query_city
+
+        mock_getenv.return_value = "test-key"
+        mock_index = mock_pinecone_class.return_value.Index.return_value
+        mock_index.search.return_value = {
+            "result": {"hits": [{"fields": {"text": "Senso-ji temple."}}]}
+        }
+        mock_resp = MagicMock()
+        mock_resp.choices[0].message.content = "Visit Senso-ji."
+        mock_create = AsyncMock(return_value=mock_resp)
+        mock_openai_class.return_value.chat.completions.create = mock_create
+
+        first = query_city("Tokyo", "Top things to do in Tokyo?")
+        second = query_city("tokyo", "What to see in Tokyo")
+        other = query_city("Tokyo", "Where to eat ramen in Tokyo?")
+
+        self.assertEqual(first, second)
+        self.assertEqual(other, "Visit Senso-ji.")
+        self.assertEqual(mock_index.search.call_count, 2)
+        self.assertEqual(mock_create.await_count, 2)
+
+    @patch("itinerary_agent.AsyncOpenAI")
+    @patch("itinerary_agent.os.getenv", return_value="test-key")
+    def test_query_city_local_backend(self, mock_getenv, mock_openai_class):
+        """With the local backend, context comes from the local index."""
+        import tempfile
+
+        from itinerary_agent import query_city
+        from local_index import LocalIndex
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LocalIndex(tmp)
+            index.upsert_records(
+                "Kyoto", [{"_id": "Kyoto-0", "text": "Fushimi Inari has red gates."}]
+            )
+            mock_resp = MagicMock()
+            mock_resp.choices[0].message.content = "See the gates."
+            mock_create = AsyncMock(return_value=mock_resp)
+            mock_openai_class.return_value.chat.completions.create = mock_create
+
+            with (
+                patch("itinerary_agent.VECTOR_BACKEND", "local"),
+                patch("itinerary_agent.get_local_index", return_value=index),
+            ):
+                result = query_city("Kyoto", "Where are the red gates?")
+
+        self.assertEqual(result, "See the gates.")
+        prompt = mock_create.await_args.kwargs["messages"][0]["content"]
+        self.assertIn("Fushimi Inari", prompt)
+
+    @patch("itinerary_agent.AsyncOpenAI")
+    @patch("itinerary_agent.os.getenv", return_value="test-key")
+    def test_query_city_searches_question_section(self, mock_getenv, mock_openai_class):
+        """A question about one section retrieves from it with a smaller top_k,
+        falling back to the whole namespace when the section has no chunks."""
+        import tempfile
+
+        from itinerary_agent import query_city
+        from local_index import LocalIndex
+
+        mock_resp = MagicMock()
+        mock_resp.choices[0].message.content = "Try the ramen."
+        mock_create = AsyncMock(return_value=mock_resp)
+        mock_openai_class.return_value.chat.completions.create = mock_create
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LocalIndex(tmp)
+            index.upsert_records(
+                "Osaka",
+                [
+                    {"_id": "a", "text": "Dotonbori ramen stalls.", "section": "Eat"},
+                    {"_id": "b", "text": "Ramen museum in Ikeda.", "section": "See"},
+                    {"_id": "c", "text": "Osaka castle.", "section": "See"},
+                ],
+            )
+            with (
+                patch("itinerary_agent.VECTOR_BACKEND", "local"),
+                patch("itinerary_agent.get_local_index", return_value=index),
+                patch.object(index, "search", wraps=index.search) as search,
+            ):
+                query_city("Osaka", "Where to eat ramen in Osaka?")
+                query_city("Osaka", "Best bars in Osaka?")
+
+        prompt = mock_create.await_args_list[0].kwargs["messages"][0]["content"]
+        self.assertIn("Dotonbori", prompt)
+        self.assertNotIn("museum", prompt)
+        first, fallback_filtered, fallback = [
+            c.kwargs["query"] for c in search.call_args_list
+        ]
+        self.assertEqual(first["filter"], {"section": {"$eq": "Eat"}})
+        self.assertEqual(first["top_k"], 2)
+        self.assertEqual(fallback_filtered["filter"], {"section": {"$eq": "Drink"}})
+        self.assertNotIn("filter", fallback)
+        self.assertEqual(fallback["top_k"], 3)
+
+    @patch("itinerary_agent.AsyncOpenAI")
+    @patch("itinerary_agent.os.getenv", return_value="test-key")
+    def test_retrieve_mode_returns_ranked_passages(
+        self, mock_getenv, mock_openai_class
+    ):
+        """Retrieve mode returns scored, deduplicated passages without an LLM call."""
+        import tempfile
+
+        from itinerary_agent import query_city
+        from local_index import LocalIndex
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index = LocalIndex(tmp)
+            index.upsert_records(
+                "Kyoto",
+                [
+                    {
+                        "_id": "a",
+                        "text": "Fushimi Inari has red gates.",
+                        "section": "See",
+                    },
+                    {
+                        "_id": "b",
+                        "text": "Fushimi Inari has red gates!",
+                        "section": "See",
+                    },
+                    {"_id": "c", "text": "Kinkaku-ji is golden.", "section": "See"},
+                ],
+            )
+            with (
+                patch("itinerary_agent.VECTOR_BACKEND", "local"),
+                patch("itinerary_agent.CITY_QUERY_MODE", "retrieve"),
+                patch("itinerary_agent.get_local_index", return_value=index),
+            ):
+                passages = query_city("Kyoto", "Where are the red gates?")
+
+        mock_openai_class.assert_not_called()
+        self.assertEqual(len(passages), 2)
+        self.assertIn("red gates", passages[0]["text"])
+        self.assertEqual(passages[0]["section"], "See")
+        self.assertGreaterEqual(passages[0]["score"], passages[1]["score"])
+
+    @patch("itinerary_agent.Pinecone")
+    @patch("itinerary_agent.os.getenv", return_value="test-key")
+    def test_retrieve_mode_error(self, mock_getenv, mock_pinecone_class):
+        """Search failures in retrieve mode become an error dict."""
+        from itinerary_agent import query_city
+
+        mock_index = mock_pinecone_class.return_value.Index.return_value
+        mock_index.search.side_effect = Exception("Search failed")
+
+        with patch("itinerary_agent.CITY_QUERY_MODE", "retrieve"):
+            result = query_city("Kyoto", "What to see?")
+
+        self.assertEqual(result, {"error": "Error while querying Kyoto: Search failed"})
+
+    @patch("itinerary_agent.Pinecone")
+    @patch("itinerary_agent.os.getenv", return_value="test-key")
+    def test_query_city_searches_the_slug_namespace(
+        self, mock_getenv, mock_pinecone_class
+    ):
+        """Any spelling of a city searches the namespace ``embed_db`` writes."""
+        from itinerary_agent import query_city
+
+        mock_index = mock_pinecone_class.return_value.Index.return_value
+        mock_index.search.return_value = {"result": {"hits": []}}
+
+        with patch("itinerary_agent.CITY_QUERY_MODE", "retrieve"):
+            query_city("KL", "Tell me about the city")
+
+        self.assertEqual(
+            mock_index.search.call_args.kwargs["namespace"], "Kuala_Lumpur"
+        )
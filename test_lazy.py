@@ -0,0 +1,39 @@
+import subprocess
+import sys
+import unittest
+
+from lazy import lazy_import, lazy_module
+
+
+class TestLazy(unittest.TestCase):
+    """Tests for the deferred import proxies."""
+
+    def test_lazy_module_forwards_attributes(self):
+        """Attributes of the proxied module are reachable through the proxy."""
+        json_module = lazy_module("json")
+
+        self.assertEqual(json_module.dumps([1]), "[1]")
+
+    def test_lazy_import_calls_and_forwards(self):
+        """Calling the proxy calls the target; attributes are forwarded."""
+        ordered = lazy_import("collections", "OrderedDict")
+
+        self.assertEqual(ordered(a=1), {"a": 1})
+        self.assertTrue(callable(ordered.fromkeys))
+
+    def test_main_does_not_import_sdks(self):
+        """Importing the Lambda entry point leaves the heavy SDKs unloaded."""
+        code = (
+            "import sys, main; "
+            "print(','.join(m for m in ('openai', 'pinecone', 'amadeus', 'numpy') "
+            "if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+
+        self.assertEqual(result.stdout.strip(), "")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,128 @@
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import rag_ingest
+from local_index import LocalIndex
+
+DOCS = {
+    "temples": "Senso-ji is the oldest Buddhist temple in Tokyo.",
+    "food": "Tsukiji outer market serves fresh sushi and street food.",
+    "park": "Ueno park is famous for cherry blossom viewing in spring.",
+    "shopping": "Ginza is the upscale shopping district with department stores.",
+}
+
+
+class TestLocalIndex(unittest.TestCase):
+    """Tests for the memory-mapped local vector index."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = LocalIndex(self.tmp.name)
+        self.index.upsert_records(
+            "Tokyo", [{"_id": key, "text": text} for key, text in DOCS.items()]
+        )
+
+    def _search(self, index, text, top_k=2):
+        return index.search(
+            namespace="Tokyo",
+            query={"inputs": {"text": text}, "top_k": top_k},
+            fields=["text"],
+        )["result"]["hits"]
+
+    def test_search_ranks_by_similarity(self):
+        """The closest record comes first with Pinecone-shaped hits."""
+        hits = self._search(self.index, "Which temple is oldest?")
+
+        self.assertEqual(len(hits), 2)
+        self.assertEqual(hits[0]["_id"], "temples")
+        self.assertEqual(hits[0]["fields"], {"text": DOCS["temples"]})
+        self.assertGreaterEqual(hits[0]["_score"], hits[1]["_score"])
+
+    def test_persisted_and_reloaded(self):
+        """A new instance memory-maps the stored namespace."""
+        hits = self._search(LocalIndex(self.tmp.name), "sushi street food")
+
+        self.assertEqual(hits[0]["_id"], "food")
+
+    def test_upsert_replaces_and_delete_removes(self):
+        """Upserts replace records by ID and deletes drop them."""
+        self.index.upsert_records(
+            "Tokyo", [{"_id": "park", "text": "Yoyogi park hosts weekend festivals."}]
+        )
+        self.index.delete(ids=["temples"], namespace="Tokyo")
+
+        hits = self._search(self.index, "park", top_k=10)
+        self.assertEqual(len(hits), 3)
+        self.assertNotIn("temples", {hit["_id"] for hit in hits})
+        self.assertIn("Yoyogi", hits[0]["fields"]["text"])
+
+        self.index.delete(delete_all=True, namespace="Tokyo")
+        self.assertEqual(self._search(self.index, "park"), [])
+
+    def test_unknown_namespace_returns_no_hits(self):
+        """Searching a city that was never ingested returns no hits."""
+        hits = self.index.search(
+            namespace="Paris", query={"inputs": {"text": "louvre"}, "top_k": 3}
+        )
+        self.assertEqual(hits, {"result": {"hits": []}})
+
+    def test_ivf_partitions_match_exact_search(self):
+        """Probing every partition returns the same hits as exact search."""
+        records = [
+            {"_id": f"doc-{i}", "text": f"district {i} has sight {i * 7 % 13}"}
+            for i in range(64)
+        ]
+        exact = LocalIndex(f"{self.tmp.name}/exact")
+        ivf = LocalIndex(f"{self.tmp.name}/ivf", nlist=4, nprobe=4)
+        exact.upsert_records("Tokyo", records)
+        ivf.upsert_records("Tokyo", records)
+
+        exact_hits = self._search(exact, "district 5 sight", top_k=5)
+        ivf_hits = self._search(ivf, "district 5 sight", top_k=5)
+
+        self.assertEqual(
+            [round(hit["_score"], 5) for hit in exact_hits],
+            [round(hit["_score"], 5) for hit in ivf_hits],
+        )
+
+    def test_filter_restricts_hits_to_section(self):
+        """A metadata filter only returns records whose fields match it."""
+        self.index.upsert_records(
+            "Tokyo",
+            [
+                {
+                    "_id": "eat",
+                    "text": "Ramen alleys near the station.",
+                    "section": "Eat",
+                },
+                {"_id": "see", "text": "Ramen museum exhibits.", "section": "See"},
+            ],
+        )
+
+        def search(filter):
+            return self.index.search(
+                namespace="Tokyo",
+                query={"inputs": {"text": "ramen"}, "top_k": 5, "filter": filter},
+            )["result"]["hits"]
+
+        self.assertEqual(
+            [h["_id"] for h in search({"section": {"$eq": "Eat"}})], ["eat"]
+        )
+        self.assertEqual([h["_id"] for h in search({"section": "See"})], ["see"])
+        self.assertEqual(len(search({"section": {"$in": ["Eat", "See"]}})), 2)
+        self.assertEqual(search({"section": "Sleep"}), [])
+
+    @patch("rag_ingest.scrape_city")
+    def test_embed_db_writes_to_local_index(self, mock_scrape_city):
+        """The ingestion pipeline can target the local index directly."""
+        mock_scrape_city.return_value = ["Kinkaku-ji is the golden pavilion."]
+
+        result = rag_ingest.embed_db("Kyoto", index=self.index)
+
+        self.assertEqual(result["status"], "success")
+        hits = self.index.search(
+            namespace="Kyoto", query={"inputs": {"text": "golden pavilion"}, "top_k": 1}
+        )["result"]["hits"]
+        self.assertEqual(hits[0]["_id"], "Kyoto-0")
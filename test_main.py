@@ -1,3 +1,4 @@
+import json
 import unittest
 from unittest.mock import patch
 from fastapi.testclient import TestClient
@@ -16,15 +17,241 @@ class TestAPI(unittest.TestCase):
 
     def setUp(self):
         """Set up test client."""
-        from main import app
+        from main import app, limiter
+        from response_cache import response_cache
 
+        limiter.reset()
+        response_cache.clear()
         self.client = TestClient(app)
 
-    @patch("main.run_travel_llm")
+    @patch("main.run_travel_llm_async")
     def test_ask_endpoint(self, mock_ask):
         """Test ask endpoint."""
         mock_ask.return_value = "LLM answer"
         resp = self.client.post("/ask", json={"prompt": "hi"})
         self.assertEqual(resp.status_code, 200)
         self.assertEqual(resp.text, "LLM answer")
-        mock_ask.assert_called_once_with("hi" + system_prompt + format)
+        mock_ask.assert_awaited_once_with(
+            "hi", steps=[], instructions=system_prompt + format
+        )
+
+    @patch("main.run_travel_llm_async")
+    def test_ask_endpoint_cache(self, mock_ask):
+        """Repeated prompts are served from the response cache."""
+        mock_ask.return_value = "LLM answer"
+        first = self.client.post("/ask", json={"prompt": "Plan a trip to Tokyo"})
+        second = self.client.post("/ask", json={"prompt": "plan a  trip to tokyo"})
+
+        self.assertEqual(first.headers["X-Cache"], "MISS")
+        self.assertEqual(second.headers["X-Cache"], "HIT")
+        self.assertEqual(second.text, "LLM answer")
+        mock_ask.assert_awaited_once()
+
+    @patch("main.run_travel_llm_async")
+    def test_degraded_answers_are_not_cached(self, mock_ask):
+        """Answers written around a failed tool call are served but not cached."""
+
+        async def answer(prompt, steps, instructions):
+            steps.append({"kind": "tools", "errors": 1})
+            return "I couldn't reach the city guide."
+
+        mock_ask.side_effect = answer
+        for _ in range(2):
+            resp = self.client.post("/ask", json={"prompt": "Plan a trip to Tokyo"})
+            self.assertEqual(resp.headers["X-Cache"], "MISS")
+        self.assertEqual(mock_ask.await_count, 2)
+
+    @patch("main.run_travel_llm_async")
+    def test_cache_ttl_follows_user_prompt(self, mock_ask):
+        """The TTL class ignores the appended instructions (which mention flights)."""
+        from response_cache import (
+            RESPONSE_CACHE_SHORT_TTL,
+            RESPONSE_CACHE_TTL,
+            response_cache,
+        )
+
+        mock_ask.return_value = "LLM answer"
+        with patch.object(response_cache, "set", wraps=response_cache.set) as store:
+            self.client.post("/ask", json={"prompt": "Top things to do in Kyoto?"})
+            self.client.post("/ask", json={"prompt": "Flights from KIX to HND"})
+            self.client.post("/ask/batch", json={"prompts": ["Ramen in Osaka?"]})
+
+        self.assertEqual(
+            [call.kwargs["ttl"] for call in store.call_args_list],
+            [RESPONSE_CACHE_TTL, RESPONSE_CACHE_SHORT_TTL, RESPONSE_CACHE_TTL],
+        )
+
+    @patch("main.run_travel_llm_async")
+    def test_ask_endpoint_session(self, mock_ask):
+        """The server mints session IDs; continuing one skips the cache."""
+        mock_ask.return_value = "LLM answer"
+        first = self.client.post("/ask", json={"prompt": "Plan Tokyo", "session": True})
+        session_id = first.headers["X-Session-Id"]
+        second = self.client.post(
+            "/ask", json={"prompt": "Plan Tokyo", "session_id": session_id}
+        )
+
+        for resp in (first, second):
+            self.assertEqual(resp.headers["X-Session-Id"], session_id)
+            self.assertNotIn("X-Cache", resp.headers)
+        self.assertEqual(len(session_id), 32)
+        self.assertEqual(mock_ask.await_count, 2)
+        session = mock_ask.await_args.kwargs["session"]
+        self.assertEqual(mock_ask.await_args.args, ("Plan Tokyo",))
+        self.assertEqual(session.session_id, session_id)
+        self.assertEqual(session.instructions, system_prompt + format)
+
+    @patch("main.run_travel_llm_async")
+    def test_unknown_session_id_is_rejected(self, mock_ask):
+        """A session ID the server did not mint never opens a session."""
+        for path in ("/ask", "/ask/stream"):
+            resp = self.client.post(
+                path, json={"prompt": "Plan Tokyo", "session_id": "my-trip"}
+            )
+            self.assertEqual(resp.status_code, 404)
+        mock_ask.assert_not_awaited()
+
+    @patch("main.run_travel_llm_async")
+    def test_ask_endpoint_rate_limit(self, mock_ask):
+        """The 21st request within 5 minutes is rejected with Retry-After."""
+        mock_ask.return_value = "LLM answer"
+        for i in range(20):
+            resp = self.client.post("/ask", json={"prompt": f"hi {i}"})
+            self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["RateLimit-Limit"], "20")
+        self.assertEqual(resp.headers["RateLimit-Remaining"], "0")
+
+        resp = self.client.post("/ask", json={"prompt": "one more"})
+
+        self.assertEqual(resp.status_code, 429)
+        self.assertIn("20 requests per 5 minutes", resp.json()["detail"])
+        self.assertGreater(int(resp.headers["Retry-After"]), 0)
+
+    @patch("main.run_travel_llm_async")
+    def test_metrics_and_traces(self, mock_ask):
+        """Requests are traced and their latency shows up in /metrics."""
+        mock_ask.return_value = "LLM answer"
+        self.client.post("/ask", json={"prompt": "Plan Tokyo"})
+
+        auth = {"Authorization": "Bearer ops-secret"}
+        with patch("main.OPS_TOKEN", "ops-secret"):
+            text = self.client.get("/metrics", headers=auth).text
+            stats = self.client.get(
+                "/metrics", params={"format": "json"}, headers=auth
+            ).json()
+            traces = self.client.get("/traces", params={"limit": 1}, headers=auth)
+            traces = traces.json()
+
+        self.assertIn('travel_stage_latency_ms_count{stage="ask"}', text)
+        self.assertGreaterEqual(stats["ask"]["count"], 1)
+        self.assertIn('travel_upstream_circuit_state{dependency="amadeus"} 0', text)
+        self.assertEqual(stats["upstreams"]["pinecone"]["state"], "closed")
+        self.assertEqual(traces[0]["name"], "ask")
+        self.assertEqual(traces[0]["spans"][-1]["attributes"]["response_cache"], "MISS")
+
+    def test_metrics_and_traces_require_ops_token(self):
+        """The operational endpoints are off without OPS_TOKEN and need it."""
+        for path in ("/metrics", "/traces"):
+            self.assertEqual(self.client.get(path).status_code, 404)
+            with patch("main.OPS_TOKEN", "ops-secret"):
+                self.assertEqual(self.client.get(path).status_code, 401)
+                wrong = {"Authorization": "Bearer guess"}
+                self.assertEqual(self.client.get(path, headers=wrong).status_code, 401)
+
+    @patch("main.run_travel_llm_async")
+    def test_ask_batch_endpoint(self, mock_ask):
+        """Batch items stream back as NDJSON, with errors per item."""
+
+        async def answer(prompt, steps, shared_tools, instructions):
+            if prompt.startswith("fail"):
+                raise RuntimeError("LLM down")
+            return f"answer to {prompt}"
+
+        mock_ask.side_effect = answer
+        resp = self.client.post(
+            "/ask/batch", json={"prompts": ["Tokyo", "fail", "Kyoto"], "concurrency": 2}
+        )
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["content-type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in resp.text.splitlines()]
+        items = sorted(lines[:-1], key=lambda item: item["index"])
+        self.assertEqual(items[0]["answer"], "answer to Tokyo")
+        self.assertEqual(items[1], {"index": 1, "error": "LLM down"})
+        self.assertEqual(items[2]["cache"], "MISS")
+        self.assertEqual(
+            lines[-1], {"done": True, "count": 3, "errors": 1, "tool_calls": 0}
+        )
+        shared = {id(call.kwargs["shared_tools"]) for call in mock_ask.await_args_list}
+        self.assertEqual(len(shared), 1)
+
+    @patch("main.run_travel_llm_async")
+    def test_ask_batch_charges_rate_limit_per_prompt(self, mock_ask):
+        """Each prompt of a batch counts against the rate limit."""
+        mock_ask.return_value = "LLM answer"
+
+        first = self.client.post("/ask/batch", json={"prompts": ["Tokyo"] * 15})
+        second = self.client.post("/ask/batch", json={"prompts": ["Kyoto"] * 6})
+        third = self.client.post("/ask/batch", json={"prompts": ["Kyoto"] * 5})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.headers["RateLimit-Remaining"], "5")
+        self.assertEqual(second.status_code, 429)
+        self.assertIn("Retry-After", second.headers)
+        self.assertEqual(third.status_code, 200)
+        self.assertEqual(mock_ask.await_count, 2)
+
+    def test_ask_batch_validation(self):
+        """Empty and oversized batches are rejected."""
+        from main import BATCH_MAX_PROMPTS
+
+        self.assertEqual(
+            self.client.post("/ask/batch", json={"prompts": []}).status_code, 422
+        )
+        too_many = {"prompts": ["Tokyo"] * (BATCH_MAX_PROMPTS + 1)}
+        self.assertEqual(self.client.post("/ask/batch", json=too_many).status_code, 422)
+
+
+class TestStreamingAPI(unittest.TestCase):
+    """Tests for the streaming /ask/stream endpoint."""
+
+    def setUp(self):
+        """Set up test client."""
+        from main import app, limiter
+
+        limiter.reset()
+        self.client = TestClient(app)
+
+    @staticmethod
+    async def _fake_stream(prompt, instructions=None):
+        yield {
+            "type": "tool_start",
+            "tool": "search_flights",
+            "message": "searching flights JFK→LHR…",
+        }
+        yield {"type": "tool_end", "tool": "search_flights", "message": "done"}
+        yield {"type": "token", "text": "LLM "}
+        yield {"type": "token", "text": "answer"}
+
+    @patch("main.stream_travel_llm")
+    def test_stream_endpoint_sse(self, mock_stream):
+        """The default response is an SSE stream of progress and token events."""
+        mock_stream.side_effect = self._fake_stream
+        resp = self.client.post("/ask/stream", json={"prompt": "hi"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/event-stream"))
+        self.assertIn("event: tool_start", resp.text)
+        self.assertIn("searching flights JFK", resp.text)
+        self.assertIn('"text": "answer"', resp.text)
+        self.assertTrue(resp.text.endswith("event: done\ndata: {}\n\n"))
+        mock_stream.assert_called_once_with("hi", instructions=system_prompt + format)
+
+    @patch("main.stream_travel_llm")
+    def test_stream_endpoint_plaintext(self, mock_stream):
+        """Clients accepting text/plain get chunked plaintext."""
+        mock_stream.side_effect = self._fake_stream
+        resp = self.client.post(
+            "/ask/stream", json={"prompt": "hi"}, headers={"Accept": "text/plain"}
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.text, "[searching flights JFK→LHR…]\n[done]\nLLM answer")
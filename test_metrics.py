@@ -0,0 +1,55 @@
+import unittest
+
+from metrics import LatencyHistogram, MetricsRegistry
+
+
+class TestLatencyHistogram(unittest.TestCase):
+    """Tests for the fixed-bucket latency histogram."""
+
+    def test_percentiles(self):
+        """Percentiles are estimated within the bucket they fall in."""
+        histogram = LatencyHistogram()
+        for value in range(1, 101):
+            histogram.record(value * 10)  # 10 ms .. 1000 ms
+
+        summary = histogram.summary()
+
+        self.assertEqual(summary["count"], 100)
+        self.assertEqual(summary["max_ms"], 1000)
+        self.assertAlmostEqual(summary["p50_ms"], 500, delta=50)
+        self.assertAlmostEqual(summary["p95_ms"], 950, delta=60)
+        self.assertLessEqual(summary["p99_ms"], 1000)
+
+    def test_empty(self):
+        """An empty histogram reports zeros."""
+        self.assertEqual(LatencyHistogram().percentile(99), 0.0)
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    """Tests for the per-stage registry."""
+
+    def test_prometheus_output(self):
+        """Buckets are cumulative and quantiles are exported per stage."""
+        registry = MetricsRegistry()
+        registry.observe("tool.search_flights", 120)
+        registry.observe("tool.search_flights", 800)
+
+        text = registry.prometheus()
+
+        self.assertIn(
+            'travel_stage_latency_ms_bucket{stage="tool.search_flights",le="200"} 1',
+            text,
+        )
+        self.assertIn(
+            'travel_stage_latency_ms_bucket{stage="tool.search_flights",le="+Inf"} 2',
+            text,
+        )
+        self.assertIn(
+            'travel_stage_latency_ms_count{stage="tool.search_flights"} 2', text
+        )
+        self.assertIn('quantile="0.99"', text)
+        self.assertEqual(registry.summary()["tool.search_flights"]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
+import tempfile
+import threading
 import unittest
 from unittest.mock import patch, MagicMock
 import rag_ingest
+from fetcher import Fetcher
 
 
 class TestRagIngest(unittest.TestCase):
@@ -15,14 +18,16 @@ class TestRagIngest(unittest.TestCase):
         self.assertGreater(len(chunks), 0)
         self.assertTrue(any("abc" in c for c in chunks))
 
-    @patch("rag_ingest.requests.get")
-    def test_scrape_city_returns_chunks(self, mock_get):
+    def test_scrape_city_returns_chunks(self):
         """scrape_city should return a list of text chunks from fake HTML."""
-        mock_get.return_value.text = (
-            "<html><body><p>Hello world!</p><p>Another para.</p></body></html>"
-        )
+        session = MagicMock()
+        session.get.return_value = _page(["Hello world!", "Another para."])
 
-        chunks = rag_ingest.scrape_city("Tokyo", size=20, overlap=5)
+        with tempfile.TemporaryDirectory() as tmp:
+            fetcher = Fetcher(tmp, session=session, host_delay=0)
+            chunks = rag_ingest.scrape_city(
+                "Tokyo", size=20, overlap=5, fetcher=fetcher
+            )
         self.assertIsInstance(chunks, list)
         self.assertGreater(len(chunks), 0)
         self.assertTrue(any("Hello" in c for c in chunks))
@@ -58,3 +63,222 @@ class TestRagIngest(unittest.TestCase):
 
         self.assertIsInstance(result, dict)
         self.assertIn("error", result)
+
+
+class NotFoundException(Exception):
+    """Stand-in for the Pinecone SDK's 404 error."""
+
+    status = 404
+
+
+class FakeIndex:
+    """Local stand-in for a Pinecone index that records upserts.
+
+    With ``missing_namespaces=True`` deleting from a namespace that holds no
+    records raises a 404, as Pinecone serverless does.
+    """
+
+    def __init__(self, failures=0, missing_namespaces=False):
+        self.failures = failures
+        self.missing_namespaces = missing_namespaces
+        self.records = {}
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def upsert_records(self, namespace, records):
+        with self.lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("Transient failure")
+            for record in records:
+                self.records.setdefault(namespace, {})[record["_id"]] = record
+
+    def delete(self, ids=None, namespace=None, delete_all=False):
+        with self.lock:
+            if self.missing_namespaces and namespace not in self.records:
+                raise NotFoundException(f"Namespace not found: {namespace}")
+            if delete_all:
+                self.records.pop(namespace, None)
+            for record_id in ids or []:
+                self.records.get(namespace, {}).pop(record_id, None)
+
+
+class TestBulkIngest(unittest.TestCase):
+    """Tests for batched, concurrent ingestion against a local fake index."""
+
+    @patch("rag_ingest.scrape_city")
+    def test_embed_db_batches_records(self, mock_scrape_city):
+        """200 chunks are sent in batches of at most UPSERT_BATCH_SIZE."""
+        mock_scrape_city.return_value = [f"chunk {i}" for i in range(200)]
+        index = FakeIndex()
+
+        result = rag_ingest.embed_db("Tokyo", index=index)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(result["chunks"], 200)
+        self.assertEqual(result["batches"], 3)
+        self.assertEqual(index.calls, 3)
+        self.assertEqual(len(index.records["Tokyo"]), 200)
+        self.assertIn("Tokyo-199", index.records["Tokyo"])
+
+    def test_city_aliases_share_wikivoyage_page_and_namespace(self):
+        """Any spelling of a known city fetches its page into one namespace."""
+        session = MagicMock()
+        session.get.return_value = _page(["Petronas Towers."])
+        index = FakeIndex()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            fetcher = Fetcher(tmp, session=session, host_delay=0)
+            result = rag_ingest.embed_db("kuala lumpur", index=index, fetcher=fetcher)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(
+            session.get.call_args.args[0],
+            "https://en.wikivoyage.org/wiki/Kuala_Lumpur",
+        )
+        self.assertEqual(list(index.records), ["Kuala_Lumpur"])
+
+    @patch("rag_ingest.UPSERT_BACKOFF", 0.001)
+    def test_upsert_batches_retries_transient_errors(self):
+        """Failed batches are retried with backoff until they succeed."""
+        index = FakeIndex(failures=2)
+        records = [{"_id": f"Tokyo-{i}", "text": "t"} for i in range(10)]
+
+        batches = rag_ingest.upsert_batches(index, "Tokyo", records, batch_size=5)
+
+        self.assertEqual(batches, 2)
+        self.assertEqual(index.calls, 4)
+        self.assertEqual(len(index.records["Tokyo"]), 10)
+
+    @patch("rag_ingest.UPSERT_BACKOFF", 0.001)
+    @patch("rag_ingest.UPSERT_RETRIES", 1)
+    @patch("rag_ingest.scrape_city", return_value=["chunk"])
+    def test_embed_db_gives_up_after_retries(self, mock_scrape_city):
+        """Persistent failures surface as an error dict."""
+        result = rag_ingest.embed_db("Tokyo", index=FakeIndex(failures=5))
+
+        self.assertIn("error", result)
+
+    @patch("rag_ingest.scrape_city")
+    def test_embed_cities_reports_per_city(self, mock_scrape_city):
+        """Each city is ingested and timed, with an overall throughput."""
+        mock_scrape_city.side_effect = lambda city, **kwargs: [
+            f"{city} {i}" for i in range(3)
+        ]
+        index = FakeIndex()
+
+        report = rag_ingest.embed_cities(["Tokyo", "Kyoto"], index=index)
+
+        self.assertEqual(set(report["cities"]), {"Tokyo", "Kyoto"})
+        self.assertEqual(report["chunks"], 6)
+        self.assertIn("seconds", report["cities"]["Kyoto"])
+        self.assertEqual(set(index.records), {"Tokyo", "Kyoto"})
+
+
+def _page(paragraphs, status_code=200, etag='"v1"'):
+    response = MagicMock()
+    response.status_code = status_code
+    response.encoding = "utf-8"
+    response.iter_content.return_value = [f"<p>{p}</p>".encode() for p in paragraphs]
+    response.headers = {"ETag": etag, "Last-Modified": "Mon, 01 Dec 2025 00:00:00 GMT"}
+    return response
+
+
+class TestIncrementalIngest(unittest.TestCase):
+    """Tests for incremental re-ingestion driven by a local manifest."""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.index = FakeIndex()
+        self.index.records["Tokyo"] = {"Tokyo-0": {}, "Tokyo-1": {}}
+        self.session = MagicMock()
+        self.fetcher = Fetcher(
+            f"{self.tmp.name}/http", session=self.session, host_delay=0
+        )
+
+    def _embed(self):
+        return rag_ingest.embed_db(
+            "Tokyo",
+            index=self.index,
+            incremental=True,
+            manifest_dir=self.tmp.name,
+            fetcher=self.fetcher,
+        )
+
+    def test_first_run_replaces_positional_ids(self):
+        """The first incremental run clears the namespace and writes every chunk."""
+        self.session.get.return_value = _page(["A" * 450, "B" * 450])
+
+        result = self._embed()
+
+        self.assertEqual(result["status"], "success")
+        self.assertNotIn("Tokyo-0", self.index.records["Tokyo"])
+        self.assertEqual(len(self.index.records["Tokyo"]), result["chunks"])
+        manifest = rag_ingest.load_manifest("Tokyo", self.tmp.name)
+        self.assertEqual(manifest["etag"], '"v1"')
+        self.assertEqual(set(manifest["chunks"]), set(self.index.records["Tokyo"]))
+
+    def test_first_run_of_a_new_city_ignores_missing_namespace(self):
+        """Clearing a namespace that Pinecone does not know yet is not an error."""
+        self.index = FakeIndex(missing_namespaces=True)
+        self.session.get.return_value = _page(["A" * 450])
+
+        result = self._embed()
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(len(self.index.records["Tokyo"]), result["chunks"])
+
+    def test_not_modified_page_is_skipped(self):
+        """A 304 response for the stored ETag skips the city."""
+        self.session.get.return_value = _page(["A" * 450])
+        self._embed()
+        calls = self.index.calls
+        self.session.get.return_value = _page([], status_code=304)
+
+        result = self._embed()
+
+        self.assertEqual(result["status"], "unchanged")
+        self.assertEqual(
+            self.session.get.call_args.kwargs["headers"]["If-None-Match"], '"v1"'
+        )
+        self.assertEqual(self.index.calls, calls)
+
+    def test_unchanged_content_is_skipped(self):
+        """A new ETag with identical content writes nothing."""
+        self.session.get.return_value = _page(["A" * 450])
+        self._embed()
+        calls = self.index.calls
+        self.session.get.return_value = _page(["A" * 450], etag='"v2"')
+
+        result = self._embed()
+
+        self.assertEqual(result["status"], "unchanged")
+        self.assertEqual(self.index.calls, calls)
+        self.assertEqual(
+            rag_ingest.load_manifest("Tokyo", self.tmp.name)["etag"], '"v2"'
+        )
+
+    def test_only_changed_chunks_are_written(self):
+        """Unchanged chunks are kept and chunks no longer on the page deleted."""
+        self.session.get.return_value = _page(["A" * 450, "B" * 450, "C" * 450])
+        self._embed()
+        before = set(self.index.records["Tokyo"])
+        self.session.get.return_value = _page(["A" * 450, "B" * 450], etag='"v2"')
+
+        with patch.object(
+            self.index, "upsert_records", wraps=self.index.upsert_records
+        ) as upsert:
+            result = self._embed()
+
+        written = {r["_id"] for call in upsert.call_args_list for r in call.args[1]}
+        after = set(self.index.records["Tokyo"])
+        self.assertEqual(result["status"], "success")
+        self.assertGreaterEqual(result["unchanged"], 1)
+        self.assertGreaterEqual(result["deleted"], 1)
+        self.assertFalse(written & before)
+        self.assertEqual(
+            after, set(rag_ingest.load_manifest("Tokyo", self.tmp.name)["chunks"])
+        )
+        self.assertEqual(len(before - after), result["deleted"])
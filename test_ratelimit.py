@@ -0,0 +1,201 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from ratelimit import (
+    MemoryBackend,
+    RateLimiter,
+    RedisBackend,
+    Rule,
+    SQLiteBackend,
+    parse_rules,
+)
+
+
+class FakeRedis:
+    """Local stand-in for the subset of the redis-py client used by RedisBackend."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def incr(self, key, amount=1):
+        with self.lock:
+            self.data[key] = self.data.get(key, 0) + amount
+            return self.data[key]
+
+    def decr(self, key, amount=1):
+        with self.lock:
+            self.data[key] = self.data.get(key, 0) - amount
+            return self.data[key]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+
+class BackendTests:
+    """Behaviour shared by every counter backend."""
+
+    def make_backend(self):
+        raise NotImplementedError
+
+    def test_limit_is_enforced_with_headers(self):
+        """Requests beyond the limit are denied with Retry-After."""
+        backend = self.make_backend()
+        rule = Rule(3, 60)
+        results = [backend.hit("ip", rule, now=1200 + i) for i in range(4)]
+
+        self.assertEqual([r.allowed for r in results], [True, True, True, False])
+        self.assertEqual([r.remaining for r in results[:3]], [2, 1, 0])
+        headers = results[3].headers()
+        self.assertEqual(headers["RateLimit-Limit"], "3")
+        self.assertEqual(headers["RateLimit-Reset"], "57")
+        self.assertGreater(int(headers["Retry-After"]), 0)
+
+    def test_window_slides(self):
+        """The previous window's count decays as the current window advances."""
+        backend = self.make_backend()
+        rule = Rule(4, 60)
+        for i in range(4):
+            backend.hit("ip", rule, now=1200 + i)
+
+        self.assertFalse(backend.hit("ip", rule, now=1250).allowed)
+        # 4 requests last window weighted by 30/60 leave room for two more.
+        self.assertTrue(backend.hit("ip", rule, now=1290).allowed)
+        self.assertTrue(backend.hit("ip", rule, now=1290).allowed)
+        self.assertFalse(backend.hit("ip", rule, now=1290).allowed)
+        self.assertTrue(backend.hit("ip", rule, now=1500).allowed)
+
+    def test_cost_counts_as_several_requests(self):
+        """A request with a cost uses that many slots, or none when it does not fit."""
+        backend = self.make_backend()
+        rule = Rule(10, 60)
+
+        self.assertEqual(backend.hit("ip", rule, now=1200, cost=7).remaining, 3)
+        denied = backend.hit("ip", rule, now=1201, cost=4)
+        self.assertFalse(denied.allowed)
+        self.assertGreater(denied.retry_after, 0)
+        self.assertTrue(backend.hit("ip", rule, now=1202, cost=3).allowed)
+        self.assertFalse(backend.hit("ip", rule, now=1203).allowed)
+        self.assertFalse(backend.hit("other", rule, now=1203, cost=11).allowed)
+
+    def test_keys_are_independent(self):
+        """One key's usage does not affect another's."""
+        backend = self.make_backend()
+        rule = Rule(1, 60)
+
+        self.assertTrue(backend.hit("a", rule, now=1200).allowed)
+        self.assertFalse(backend.hit("a", rule, now=1201).allowed)
+        self.assertTrue(backend.hit("b", rule, now=1201).allowed)
+
+
+class TestMemoryBackend(BackendTests, unittest.TestCase):
+    def make_backend(self):
+        return MemoryBackend()
+
+    def test_idle_keys_are_evicted(self):
+        """A sweep drops keys idle for more than two windows."""
+        backend = MemoryBackend(sweep_interval=10)
+        rule = Rule(5, 60)
+        for i in range(100):
+            backend.hit(f"ip-{i}", rule, now=1000)
+
+        backend.hit("fresh", rule, now=1200)
+
+        self.assertEqual(len(backend), 1)
+
+
+class TestSQLiteBackend(BackendTests, unittest.TestCase):
+    def make_backend(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        return SQLiteBackend(os.path.join(tmp.name, "ratelimit.db"))
+
+    def test_counts_are_shared_between_processes(self):
+        """Two backends on the same file share one count."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "ratelimit.db")
+        first, second = SQLiteBackend(path), SQLiteBackend(path)
+        rule = Rule(2, 60)
+
+        self.assertTrue(first.hit("ip", rule, now=1200).allowed)
+        self.assertTrue(second.hit("ip", rule, now=1201).allowed)
+        self.assertFalse(first.hit("ip", rule, now=1202).allowed)
+
+
+class TestRedisBackend(BackendTests, unittest.TestCase):
+    def make_backend(self):
+        return RedisBackend(FakeRedis())
+
+    def test_counters_expire_in_redis(self):
+        """Window counters are given a TTL of two windows."""
+        redis = FakeRedis()
+        RedisBackend(redis).hit("ip", Rule(5, 60), now=1200)
+
+        self.assertEqual(redis.ttls, {"ratelimit:ip:20": 120})
+
+    def test_concurrent_workers_share_the_limit(self):
+        """Workers whose reads interleave still let only ``limit`` requests in."""
+        barrier = threading.Barrier(10, timeout=5)
+
+        class InterleavedRedis(FakeRedis):
+            # Every worker reads before any of them moves on.
+            def get(self, key):
+                barrier.wait()
+                return super().get(key)
+
+        backend = RedisBackend(InterleavedRedis())
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            results = list(
+                pool.map(lambda _: backend.hit("ip", Rule(5, 60), now=1200), range(10))
+            )
+
+        self.assertEqual(sum(result.allowed for result in results), 5)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Tests for per-route and per-key rule selection."""
+
+    def test_route_and_key_rules(self):
+        """Key rules override route rules, which override the default."""
+        limiter = RateLimiter(
+            MemoryBackend(),
+            default=Rule(1, 60),
+            routes={"/ask/stream": Rule(2, 60)},
+            keys={"10.0.0.1": Rule(3, 60)},
+        )
+
+        self.assertEqual(limiter.rule_for("/ask", "1.1.1.1"), Rule(1, 60))
+        self.assertEqual(limiter.rule_for("/ask/stream", "1.1.1.1"), Rule(2, 60))
+        self.assertEqual(limiter.rule_for("/ask", "10.0.0.1"), Rule(3, 60))
+
+        self.assertTrue(limiter.check("/ask", "1.1.1.1", now=1200).allowed)
+        self.assertFalse(limiter.check("/ask", "1.1.1.1", now=1201).allowed)
+        self.assertTrue(limiter.check("/ask/stream", "1.1.1.1", now=1201).allowed)
+
+    def test_routes_without_rules_share_one_counter(self):
+        """The default limit counts a key's requests to all such routes together."""
+        limiter = RateLimiter(
+            MemoryBackend(), default=Rule(2, 60), routes={"/metrics": Rule(1, 60)}
+        )
+
+        self.assertTrue(limiter.check("/ask", "1.1.1.1", now=1200).allowed)
+        self.assertTrue(limiter.check("/ask/stream", "1.1.1.1", now=1200).allowed)
+        self.assertFalse(limiter.check("/ask/batch", "1.1.1.1", now=1200).allowed)
+        self.assertTrue(limiter.check("/metrics", "1.1.1.1", now=1200).allowed)
+        self.assertTrue(limiter.check("/ask", "2.2.2.2", now=1200).allowed)
+
+    def test_parse_rules(self):
+        """Rule lists parse into a mapping of Rules."""
+        self.assertEqual(
+            parse_rules("/ask=20/300, 10.0.0.1=100/60"),
+            {"/ask": Rule(20, 300), "10.0.0.1": Rule(100, 60)},
+        )
+        self.assertEqual(parse_rules(""), {})
@@ -0,0 +1,161 @@
+import asyncio
+import time
+import unittest
+
+from resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Dependency,
+    UpstreamTimeout,
+    is_transient,
+    request_budget,
+)
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    """Tests for the consecutive-failure circuit breaker."""
+
+    def test_opens_then_half_opens_after_reset_timeout(self):
+        """Failures open it; after the timeout one trial decides its state."""
+        breaker = CircuitBreaker(failures=2, reset_timeout=0.05)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one trial at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestDependency(unittest.IsolatedAsyncioTestCase):
+    """Tests for deadlines, retries, hedging and fail-fast upstream calls."""
+
+    def _dependency(self, **kwargs):
+        kwargs.setdefault("backoff", 0.001)
+        kwargs.setdefault("breaker", CircuitBreaker(failures=2, reset_timeout=60))
+        return Dependency("upstream", kwargs.pop("timeout", 1), **kwargs)
+
+    async def test_transient_errors_are_retried(self):
+        """A connection error is retried; other errors are raised at once."""
+        dep = self._dependency(retries=2)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("reset")
+            return "ok"
+
+        self.assertEqual(await dep.call(flaky), "ok")
+        self.assertEqual(dep.counts["retries"], 1)
+
+        async def broken():
+            calls.append(1)
+            raise ValueError("bad payload")
+
+        calls.clear()
+        with self.assertRaises(ValueError):
+            await dep.call(broken)
+        self.assertEqual(len(calls), 1)
+
+    async def test_client_errors_do_not_trip_the_breaker(self):
+        """4xx answers are not retried and count as a healthy upstream."""
+        dep = self._dependency(retries=2)
+
+        async def bad_request():
+            raise _StatusError(400)
+
+        for _ in range(3):
+            with self.assertRaises(_StatusError):
+                await dep.call(bad_request)
+        self.assertEqual(dep.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(is_transient(_StatusError(503)))
+        self.assertTrue(is_transient(_StatusError(429)))
+
+    async def test_open_circuit_fails_fast(self):
+        """After repeated failures calls are rejected without running."""
+        dep = self._dependency(retries=0)
+        calls = []
+
+        async def down():
+            calls.append(1)
+            raise ConnectionError("refused")
+
+        for _ in range(2):
+            with self.assertRaises(ConnectionError):
+                await dep.call(down)
+        with self.assertRaises(CircuitOpenError):
+            await dep.call(down)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(dep.summary()["state"], "open")
+        self.assertEqual(dep.summary()["rejected"], 1)
+
+    async def test_timeout_is_capped_by_the_request_budget(self):
+        """A slow call is cut off at the budget, before its own timeout."""
+        dep = self._dependency(timeout=5, retries=0)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        started = time.monotonic()
+        with request_budget(0.05), self.assertRaises(UpstreamTimeout):
+            await dep.call(slow)
+
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(dep.counts["timeouts"], 1)
+
+    async def test_slow_reads_are_hedged(self):
+        """Past the p95 latency a duplicate read is sent and can win."""
+        dep = self._dependency(retries=0)
+        for _ in range(20):
+            dep.latency.record(10)
+        calls = []
+
+        def read():
+            calls.append(1)
+            time.sleep(0.3 if len(calls) == 1 else 0)
+            return len(calls)
+
+        started = time.monotonic()
+        result = await dep.call(asyncio.to_thread, read, idempotent=True)
+
+        self.assertEqual(result, 2)
+        self.assertLess(time.monotonic() - started, 0.25)
+        self.assertEqual(dep.summary()["hedge_win_rate"], 1.0)
+
+    async def test_writes_and_cold_dependencies_are_not_hedged(self):
+        """Without idempotent=True, or enough samples, nothing is duplicated."""
+        dep = self._dependency(retries=0)
+        calls = []
+
+        async def read():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+
+        await dep.call(read, idempotent=True)
+        for _ in range(20):
+            dep.latency.record(10)
+        await dep.call(read)
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(dep.counts["hedges"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import asyncio
+import unittest
+
+import response_cache
+from response_cache import cache_key, get_or_compute, ttl_for
+
+
+class TestResponseCache(unittest.IsolatedAsyncioTestCase):
+    """Tests for the full-response cache in front of the /ask pipeline."""
+
+    def setUp(self):
+        response_cache.response_cache.clear()
+
+    def test_cache_key_normalizes_prompt(self):
+        """Whitespace and case differences map to the same key."""
+        self.assertEqual(cache_key("Plan  a trip\n"), cache_key("plan a trip"))
+        self.assertNotEqual(cache_key("Plan a trip"), cache_key("Plan a tour"))
+
+    def test_time_sensitive_prompts_get_short_ttl(self):
+        """Flight and date prompts use the short TTL class."""
+        self.assertEqual(
+            ttl_for("Flights from JFK to LHR"), response_cache.RESPONSE_CACHE_SHORT_TTL
+        )
+        self.assertEqual(
+            ttl_for("Trip on December 15, 2025"),
+            response_cache.RESPONSE_CACHE_SHORT_TTL,
+        )
+        self.assertEqual(
+            ttl_for("Plan 2 days in Tokyo"), response_cache.RESPONSE_CACHE_TTL
+        )
+
+    async def test_identical_in_flight_requests_coalesce(self):
+        """Concurrent identical prompts run the pipeline once."""
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        results = await asyncio.gather(
+            *(get_or_compute("Plan a trip", compute) for _ in range(5))
+        )
+
+        self.assertEqual(calls, [1])
+        self.assertEqual([answer for answer, _ in results], ["answer"] * 5)
+        self.assertEqual(
+            sorted(status for _, status in results), ["COALESCED"] * 4 + ["MISS"]
+        )
+        self.assertEqual(
+            await get_or_compute("Plan a trip", compute), ("answer", "HIT")
+        )
+
+    async def test_cancelled_leader_does_not_fail_followers(self):
+        """Cancelling the request that started a computation spares the others."""
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return "answer"
+
+        leader = asyncio.create_task(get_or_compute("Plan a trip", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(get_or_compute("Plan a trip", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        self.assertEqual(await follower, ("answer", "COALESCED"))
+        with self.assertRaises(asyncio.CancelledError):
+            await leader
+        self.assertEqual(
+            await get_or_compute("Plan a trip", compute), ("answer", "HIT")
+        )
+
+    async def test_degraded_answers_are_not_cached(self):
+        """An answer flagged as degraded is returned but computed again next time."""
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return "I couldn't reach the city guide."
+
+        for _ in range(2):
+            _, status = await get_or_compute(
+                "Plan a trip", compute, degraded=lambda: True
+            )
+            self.assertEqual(status, "MISS")
+        self.assertEqual(len(calls), 2)
+
+    async def test_errors_are_not_cached(self):
+        """A failing computation raises and is retried on the next request."""
+
+        async def fail():
+            raise RuntimeError("Groq down")
+
+        async def succeed():
+            return "answer"
+
+        with self.assertRaises(RuntimeError):
+            await get_or_compute("Plan a trip", fail)
+        self.assertEqual(
+            await get_or_compute("Plan a trip", succeed), ("answer", "MISS")
+        )
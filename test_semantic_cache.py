@@ -0,0 +1,50 @@
+import os
+import tempfile
+import time
+import unittest
+
+from semantic_cache import SemanticCache
+
+
+class TestSemanticCache(unittest.TestCase):
+    """Tests for the per-city semantic answer cache."""
+
+    def test_similar_question_hits(self):
+        """Rephrasings of a cached question return the stored answer."""
+        cache = SemanticCache()
+        cache.store("Tokyo", "top things to do in Tokyo", "Senso-ji")
+
+        self.assertEqual(cache.lookup("Tokyo", "what to see in Tokyo"), "Senso-ji")
+        self.assertIsNone(cache.lookup("Tokyo", "where to eat in Tokyo"))
+        self.assertIsNone(cache.lookup("Kyoto", "what to see in Tokyo"))
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 2, "size": 1})
+
+    def test_entries_expire(self):
+        """Expired answers are not returned."""
+        cache = SemanticCache(ttl=0.05)
+        cache.store("Tokyo", "what to see", "Senso-ji")
+        time.sleep(0.1)
+
+        self.assertIsNone(cache.lookup("Tokyo", "what to see"))
+
+    def test_capacity_evicts_least_recently_used(self):
+        """A full city replaces its least recently used entry."""
+        cache = SemanticCache(maxsize=2)
+        cache.store("Tokyo", "temples", "A")
+        cache.store("Tokyo", "museums", "B")
+        cache.lookup("Tokyo", "temples")
+        cache.store("Tokyo", "parks", "C")
+
+        self.assertEqual(cache.lookup("Tokyo", "temples"), "A")
+        self.assertIsNone(cache.lookup("Tokyo", "museums"))
+        self.assertEqual(cache.lookup("Tokyo", "parks"), "C")
+
+    def test_sqlite_backend_persists(self):
+        """Entries stored with a path are visible to a new cache instance."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            SemanticCache(path=path).store("Tokyo", "what to see", "Senso-ji")
+
+            self.assertEqual(
+                SemanticCache(path=path).lookup("tokyo", "things to see"), "Senso-ji"
+            )
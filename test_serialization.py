@@ -0,0 +1,134 @@
+import unittest
+
+from serialization import (
+    compact_text,
+    estimate_tokens,
+    format_flights,
+    format_passages,
+    parse_arguments,
+    serialize_tool_result,
+)
+
+
+def _segment(origin, destination, carrier, departure, arrival):
+    return {
+        "from": origin,
+        "to": destination,
+        "carrier": carrier,
+        "departure_time": departure,
+        "arrival_time": arrival,
+    }
+
+
+NONSTOP = {
+    "price": "99.00",
+    "itineraries": [
+        _segment("KIX", "HND", "JL", "2025-10-10T12:00:00", "2025-10-10T13:10:00")
+    ],
+}
+CONNECTION = {
+    "price": "120.50",
+    "itineraries": [
+        _segment("KIX", "HND", "NH", "2025-10-10T08:00:00", "2025-10-10T09:10:00"),
+        _segment("HND", "JFK", "NH", "2025-10-10T11:00:00", "2025-10-11T10:00:00"),
+    ],
+}
+
+
+class TestSerialization(unittest.TestCase):
+    """Tests for compact tool result serialization."""
+
+    def test_flights_render_as_table(self):
+        """Offers become one row per segment, with shortened timestamps."""
+        self.assertEqual(
+            format_flights([NONSTOP, CONNECTION]),
+            "offer|price|from|to|carrier|departure|arrival\n"
+            "1|99.00|KIX|HND|JL|2025-10-10T12:00|13:10\n"
+            "2|120.50|KIX|HND|NH|2025-10-10T08:00|09:10\n"
+            "2||HND|JFK|NH|2025-10-10T11:00|2025-10-11T10:00",
+        )
+        self.assertEqual(format_flights([]), "No flights found.")
+        self.assertEqual(
+            serialize_tool_result("search_flexible_flights", [NONSTOP]),
+            format_flights([NONSTOP]),
+        )
+
+    def test_flight_table_is_smaller_and_deduplicated(self):
+        """Repeated itineraries are dropped and the table beats the repr."""
+        results = [NONSTOP, CONNECTION, {**NONSTOP, "price": "140.00"}]
+
+        table = serialize_tool_result("search_flights", results)
+
+        self.assertNotIn("140.00", table)
+        self.assertLess(estimate_tokens(table), estimate_tokens(str(results)) / 2)
+
+    def test_flights_over_budget_drop_whole_offers(self):
+        """Offers that do not fit are summarized as a count."""
+        results = [
+            {**NONSTOP, "itineraries": [{**NONSTOP["itineraries"][0], "carrier": c}]}
+            for c in ("JL", "NH", "MM", "GK", "BC", "7G")
+        ]
+
+        table = format_flights(results, budget=40)
+
+        self.assertLessEqual(estimate_tokens(table), 40)
+        self.assertTrue(table.startswith("offer|"))
+        self.assertRegex(table.splitlines()[-1], r"^\(\+\d more\)$")
+
+    def test_prose_is_deduplicated_and_trimmed(self):
+        """Repeated sentences go and long answers stop at a sentence."""
+        self.assertEqual(
+            compact_text("Visit Senso-ji.  Visit Senso-ji.\n\n- Eat sushi.", 100),
+            "Visit Senso-ji.\n- Eat sushi.",
+        )
+        long_answer = " ".join(f"Temple {i} is lovely." for i in range(100))
+
+        trimmed = serialize_tool_result("query_city", long_answer, budget=20)
+
+        self.assertLessEqual(len(trimmed), 80)
+        self.assertTrue(trimmed.endswith("lovely. …[truncated]"))
+
+    def test_passages_render_ranked_within_budget(self):
+        """Passages are numbered with score and section; the tail is dropped."""
+        passages = [
+            {"text": "Dotonbori has ramen stalls.", "score": 0.82, "section": "Eat"},
+            {"text": "Osaka castle. " * 40, "score": 0.5},
+        ]
+
+        self.assertEqual(
+            format_passages(passages, budget=50),
+            "[1 0.82 Eat] Dotonbori has ramen stalls.",
+        )
+        cut = serialize_tool_result("query_city", passages[1:], budget=10)
+        self.assertLessEqual(len(cut), 40)
+        self.assertTrue(cut.startswith("[1 0.5] Osaka castle."))
+        self.assertTrue(cut.endswith("…[truncated]"))
+        self.assertEqual(format_passages([]), "No passages found.")
+
+    def test_errors_and_other_values(self):
+        """Errors are one line; other values are minified JSON."""
+        self.assertEqual(
+            serialize_tool_result("search_flights", {"error": "timed out"}),
+            "error: timed out",
+        )
+        self.assertEqual(
+            serialize_tool_result("other", {"a": [1, 2], "b": "é"}),
+            '{"a":[1,2],"b":"é"}',
+        )
+
+    def test_parse_arguments_never_evaluates_code(self):
+        """JSON and Python-style literals parse; expressions are rejected."""
+        self.assertEqual(parse_arguments('{"adults": 2}'), {"adults": 2})
+        self.assertEqual(
+            parse_arguments("{ 'origin': 'SFO', 'direct': True }"),
+            {"origin": "SFO", "direct": True},
+        )
+        for arguments in ("__import__('os').getcwd()", "{"):
+            with self.assertRaises(ValueError):
+                parse_arguments(arguments)
+        with self.assertRaises(TypeError):
+            parse_arguments("[1, 2]")
+
+
+if __name__ == "__main__":
+    unittest.main()
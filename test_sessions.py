@@ -0,0 +1,159 @@
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from sessions import Session, SessionStore
+
+
+class TestSession(unittest.TestCase):
+    """Tests for session history compaction."""
+
+    def test_context_keeps_recent_turns(self):
+        """Turns that fit the budget are sent as user/assistant messages."""
+        session = Session("s1", instructions="Be brief.")
+        session.add_turn("Plan Tokyo", "Day 1: Asakusa")
+        session.add_turn(
+            "Flights there?", "JL5 at 9am", [("search_flights", "{}", "[...]")]
+        )
+
+        messages = session.context(budget=1000)
+
+        self.assertEqual(messages[0], {"role": "system", "content": "Be brief."})
+        self.assertEqual(
+            [m["role"] for m in messages[1:]],
+            ["user", "assistant", "user", "system", "assistant"],
+        )
+        self.assertIn("search_flights({}) returned: [...]", messages[4]["content"])
+
+    def test_context_truncates_tool_outputs(self):
+        """Long tool outputs are cut before they are sent again."""
+        session = Session("s1")
+        session.add_turn(
+            "Flights?", "Cheapest is $99", [("search_flights", "{}", "x" * 5000)]
+        )
+
+        with patch("sessions.SESSION_TOOL_OUTPUT_CHARS", 100):
+            tool_message = session.context(budget=10000)[1]["content"]
+
+        self.assertLess(len(tool_message), 200)
+        self.assertIn("[truncated]", tool_message)
+
+    def test_context_summarizes_older_turns(self):
+        """Turns beyond the budget collapse into a summary of their questions."""
+        session = Session("s1")
+        for i in range(10):
+            session.add_turn(f"Question {i}", "A" * 400)
+
+        messages = session.context(budget=300)
+
+        self.assertEqual(messages[0]["role"], "system")
+        self.assertIn("Question 0", messages[0]["content"])
+        self.assertEqual(messages[-1]["content"], "A" * 400)
+        self.assertEqual(messages[-2]["content"], "Question 9")
+        self.assertLess(len(messages), 21)
+
+    def test_stored_turns_and_tool_results_are_bounded(self):
+        """Old turns fold into the summary and tool results are an LRU."""
+        with (
+            patch("sessions.SESSION_MAX_TURNS", 3),
+            patch("sessions.SESSION_TOOL_RESULTS", 2),
+        ):
+            session = Session("s1")
+            for i in range(10):
+                session.add_turn(f"Question {i}", "A" * 400)
+                session.tool_results.set(("query_city", i), f"result {i}")
+
+        messages = session.context(budget=1000)
+
+        self.assertEqual(next(iter(session.turns))["question"], "Question 7")
+        self.assertEqual(
+            list(session.earlier_questions), ["Question 4", "Question 5", "Question 6"]
+        )
+        self.assertIn("Question 6", messages[0]["content"])
+        self.assertNotIn("Question 3", messages[0]["content"])
+        self.assertEqual(len(session.tool_results), 2)
+        self.assertEqual(session.tool_results.get(("query_city", 9)), "result 9")
+
+
+class TestSessionStore(unittest.TestCase):
+    """Tests for the bounded session store."""
+
+    def test_get_returns_created_sessions_only(self):
+        """Created sessions get random IDs; unknown IDs return None."""
+        store = SessionStore()
+
+        first = store.create(instructions="Be brief.")
+        self.assertIs(store.get(first.session_id), first)
+        self.assertNotEqual(store.create().session_id, first.session_id)
+        self.assertIsNone(store.get("my-trip"))
+        self.assertEqual(len(store), 2)
+
+    def test_lru_and_ttl_eviction(self):
+        """The least recently used session is evicted, and idle ones expire."""
+        store = SessionStore(maxsize=2, ttl=0.1)
+        a = store.create()
+        b = store.create()
+        store.get(a.session_id)
+        store.create()
+
+        self.assertIs(store.get(a.session_id), a)
+        self.assertIsNone(store.get(b.session_id))
+        self.assertEqual(len(store), 2)
+        time.sleep(0.15)
+        self.assertIsNone(store.get(a.session_id))
+
+
+class TestSessionPipeline(unittest.IsolatedAsyncioTestCase):
+    """Tests for running the pipeline with a session."""
+
+    @patch("travel_llm.search_flights_async")
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_history_sent_and_tool_results_reused(
+        self, mock_getenv, mock_openai_class, mock_search
+    ):
+        """Follow-ups see earlier turns and repeated tool calls are not re-run."""
+        from travel_llm import run_travel_llm_async
+
+        mock_getenv.return_value = "test-groq-key"
+        tool_call = MagicMock()
+        tool_call.id = "tc_1"
+        tool_call.function.name = "search_flights"
+        tool_call.function.arguments = (
+            '{"origin": "JFK", "destination": "LHR", "date": "2025-10-10"}'
+        )
+
+        def response(content, tool_calls=None):
+            resp = MagicMock()
+            resp.choices = [MagicMock()]
+            resp.choices[0].message.content = content
+            resp.choices[0].message.tool_calls = tool_calls
+            return resp
+
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(
+            side_effect=[
+                response(None, [tool_call]),
+                response("JFK→LHR from $400"),
+                response(None, [tool_call]),
+                response("The cheapest is $400"),
+            ]
+        )
+        mock_openai_class.return_value = client
+        mock_search.return_value = [{"price": "400"}]
+        session = Session("s1", instructions="Travel only.")
+
+        await run_travel_llm_async("Flights JFK to LHR on Oct 10", session=session)
+        answer = await run_travel_llm_async("Which is cheapest?", session=session)
+
+        self.assertEqual(answer, "The cheapest is $400")
+        mock_search.assert_awaited_once()
+        sent = client.chat.completions.create.call_args_list[2].kwargs["messages"]
+        self.assertEqual(sent[0]["content"], "Travel only.")
+        self.assertEqual(sent[1]["content"], "Flights JFK to LHR on Oct 10")
+        self.assertEqual(sent[-1]["content"], "Which is cheapest?")
+        self.assertEqual(len(session.turns), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from startup_report import parse_importtime, summarize
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   pydantic.fields
+import time:       400 |        500 | pydantic
+import time:       200 |        200 |   fastapi.routing
+import time:       400 |        600 | fastapi
+import time:        50 |       1050 | main
+"""
+
+
+class TestStartupReport(unittest.TestCase):
+    """Tests for the import-time report."""
+
+    def test_parse_importtime(self):
+        """Each timing line becomes a dict with its nesting depth."""
+        timings = parse_importtime(SAMPLE)
+
+        self.assertEqual(len(timings), 5)
+        self.assertEqual(
+            timings[0],
+            {
+                "module": "pydantic.fields",
+                "self_us": 100,
+                "cumulative_us": 100,
+                "depth": 1,
+            },
+        )
+        self.assertEqual(timings[-1]["depth"], 0)
+
+    def test_summarize_aggregates_by_package(self):
+        """Self times are summed per top-level package; totals use top level."""
+        report = summarize(parse_importtime(SAMPLE), top=2)
+
+        self.assertEqual(report["total_ms"], 2.1)
+        self.assertEqual([m["module"] for m in report["modules"]], ["main", "fastapi"])
+        self.assertEqual(
+            report["packages"],
+            [
+                {"package": "fastapi", "self_ms": 0.6},
+                {"package": "pydantic", "self_ms": 0.5},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
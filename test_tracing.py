@@ -0,0 +1,80 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from metrics import metrics
+from tracing import (
+    _NOOP,
+    JsonlExporter,
+    RingBufferExporter,
+    Tracer,
+    annotate,
+)
+
+
+class TestTracer(unittest.IsolatedAsyncioTestCase):
+    """Tests for spans, nesting and exporters."""
+
+    def setUp(self):
+        metrics.clear()
+
+    async def test_nested_spans_across_tasks_and_threads(self):
+        """Children in tasks and worker threads join the root's trace."""
+        buffer = RingBufferExporter(size=5)
+        tracer = Tracer(exporters=[buffer])
+
+        def blocking():
+            with tracer.span("vector.search"):
+                annotate(hits=3)
+
+        async def tool():
+            with tracer.span("tool.query_city") as s:
+                s.set(semantic_cache_hit=False)
+                await asyncio.to_thread(blocking)
+
+        with tracer.span("ask") as root:
+            await asyncio.gather(asyncio.create_task(tool()))
+
+        (trace,) = buffer.traces
+        spans = {s["name"]: s for s in trace["spans"]}
+        self.assertEqual(trace["name"], "ask")
+        self.assertEqual(set(spans), {"ask", "tool.query_city", "vector.search"})
+        self.assertEqual(spans["vector.search"]["attributes"], {"hits": 3})
+        self.assertEqual(
+            spans["vector.search"]["parent_id"], spans["tool.query_city"]["span_id"]
+        )
+        self.assertEqual(spans["tool.query_city"]["parent_id"], root.span_id)
+        self.assertEqual(metrics.summary()["vector.search"]["count"], 1)
+
+    def test_errors_recorded_and_jsonl_export(self):
+        """Exceptions are recorded on the span and traces are written as JSON lines."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "traces.jsonl")
+            tracer = Tracer(exporters=[JsonlExporter(path)])
+
+            with self.assertRaises(RuntimeError), tracer.span("llm.completion"):
+                raise RuntimeError("Groq down")
+
+            with open(path) as f:
+                trace = json.loads(f.readline())
+        self.assertEqual(
+            trace["spans"][0]["attributes"]["error"], "RuntimeError: Groq down"
+        )
+
+    def test_disabled_tracer_is_noop(self):
+        """A disabled tracer returns the shared no-op span and records nothing."""
+        buffer = RingBufferExporter()
+        tracer = Tracer(enabled=False, exporters=[buffer])
+
+        with tracer.span("ask") as s:
+            s.set(prompt_tokens=1)
+
+        self.assertIs(s, _NOOP)
+        self.assertEqual(len(buffer.traces), 0)
+        self.assertEqual(metrics.summary(), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,13 +1,23 @@
+import asyncio
+import time
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import AsyncMock, patch, MagicMock
+
+# The instructions main.py sends along with every prompt.
+INSTRUCTIONS = """
+You are a travel planning assistant. 
+You ONLY answer questions related to flights, travel itineraries, or trip planning. 
+If the user asks something outside of this domain, politely respond with:
+"I'm only able to help with travel itineraries and flights."
+Always return the response in simple plaintext, no tables."""
 
 
 class TestRunTravelLLM(unittest.TestCase):
     """Tests for tool-enabled LLM flow orchestrated in travel_llm.run_travel_llm."""
 
-    @patch("travel_llm.search_flights")
-    @patch("travel_llm.query_city")
-    @patch("travel_llm.OpenAI")
+    @patch("travel_llm.search_flights_async")
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
     @patch("travel_llm.os.getenv")
     def test_run_travel_llm_with_tool_call(
         self, mock_getenv, mock_openai_class, mock_query_city, mock_search_flights
@@ -34,16 +44,19 @@ class TestRunTravelLLM(unittest.TestCase):
 
         follow_choice = MagicMock()
         follow_choice.message.content = "Here are the results."
+        follow_choice.message.tool_calls = None
         follow_resp = MagicMock()
         follow_resp.choices = [follow_choice]
 
-        mock_client.chat.completions.create.side_effect = [initial_resp, follow_resp]
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=[initial_resp, follow_resp]
+        )
         mock_search_flights.return_value = [{"price": "123.45"}]
 
         result = run_travel_llm("Find me a flight")
         self.assertIn("results", result.lower())
 
-    @patch("travel_llm.OpenAI")
+    @patch("travel_llm.AsyncOpenAI")
     @patch("travel_llm.os.getenv")
     def test_run_travel_llm_no_tool_calls(self, mock_getenv, mock_openai_class):
         """When no tool calls are present, return the model's first answer."""
@@ -61,7 +74,577 @@ class TestRunTravelLLM(unittest.TestCase):
         initial_choice.message.content = "Plain answer"
         initial_resp = MagicMock()
         initial_resp.choices = [initial_choice]
-        mock_client.chat.completions.create.return_value = initial_resp
+        mock_client.chat.completions.create = AsyncMock(return_value=initial_resp)
 
         result = run_travel_llm("Hello")
         self.assertEqual(result, "Plain answer")
+
+
+class TestRunTools(unittest.TestCase):
+    """Tests for concurrent execution of the tool calls from one model turn."""
+
+    @staticmethod
+    def _tool_call(city):
+        tool_call = MagicMock()
+        tool_call.function.name = "query_city"
+        tool_call.function.arguments = (
+            f'{{"city": "{city}", "question": "What to see?"}}'
+        )
+        return tool_call
+
+    @patch("travel_llm.query_city_async")
+    def test_run_tools_concurrent_and_ordered(self, mock_query_city):
+        """Tools run in parallel and results keep the original tool_call order."""
+        from travel_llm import run_tools
+
+        delays = {"Tokyo": 0.3, "Kyoto": 0.1, "Osaka": 0.2, "Seoul": 0.0, "Taipei": 0.1}
+
+        async def slow_query(city, question):
+            await asyncio.sleep(delays[city])
+            return f"{city} answer"
+
+        mock_query_city.side_effect = slow_query
+        tool_calls = [self._tool_call(city) for city in delays]
+
+        start = time.monotonic()
+        results = run_tools(tool_calls, max_workers=5)
+        elapsed = time.monotonic() - start
+
+        self.assertEqual(results, [f"{city} answer" for city in delays])
+        self.assertLess(elapsed, 0.6)
+
+    @patch("travel_llm.query_city_async")
+    def test_run_tools_timeout_and_error(self, mock_query_city):
+        """A slow tool times out and a failing tool returns an error dict."""
+        from travel_llm import run_tools
+
+        async def query(city, question):
+            if city == "Tokyo":
+                await asyncio.sleep(0.5)
+            if city == "Kyoto":
+                raise RuntimeError("Boom")
+            return f"{city} answer"
+
+        mock_query_city.side_effect = query
+        tool_calls = [self._tool_call(c) for c in ("Tokyo", "Kyoto", "Osaka")]
+
+        results = run_tools(tool_calls, timeout=0.1)
+
+        self.assertIn("timed out", results[0]["error"])
+        self.assertEqual(results[1], {"error": "Boom"})
+        self.assertEqual(results[2], "Osaka answer")
+
+    @patch("travel_llm.query_city_async")
+    def test_run_tools_shared_across_pipelines(self, mock_query_city):
+        """Identical calls from concurrent pipelines sharing a dict run once."""
+        from concurrency import run_sync
+        from travel_llm import run_tools_async
+
+        async def slow_query(city, question):
+            await asyncio.sleep(0.05)
+            return f"{city} answer"
+
+        mock_query_city.side_effect = slow_query
+        shared = {}
+
+        async def batch():
+            return await asyncio.gather(
+                run_tools_async([self._tool_call("Kyoto")], shared=shared),
+                run_tools_async(
+                    [self._tool_call("Kyoto"), self._tool_call("Osaka")], shared=shared
+                ),
+            )
+
+        first, second = run_sync(batch())
+
+        self.assertEqual(first, ["Kyoto answer"])
+        self.assertEqual(second, ["Kyoto answer", "Osaka answer"])
+        self.assertEqual(mock_query_city.await_count, 2)
+        self.assertEqual(len(shared), 2)
+
+    @patch("travel_llm.query_city_async")
+    def test_run_tools_does_not_keep_failures(self, mock_query_city):
+        """Failed calls are neither cached nor shared, so the next call retries."""
+        from cache import TTLCache
+        from concurrency import run_sync
+        from travel_llm import run_tools_async
+
+        mock_query_city.side_effect = [
+            {"error": "Error while querying Kyoto: circuit open"},
+            "Kyoto answer",
+            {"error": "Error while querying Osaka: timed out"},
+            "Osaka answer",
+        ]
+        cache = TTLCache(maxsize=8, ttl=60)
+        shared = {}
+
+        async def calls():
+            return [
+                await run_tools_async([self._tool_call("Kyoto")], cache=cache),
+                await run_tools_async([self._tool_call("Kyoto")], cache=cache),
+                await run_tools_async([self._tool_call("Osaka")], shared=shared),
+                await run_tools_async([self._tool_call("Osaka")], shared=shared),
+            ]
+
+        results = run_sync(calls())
+
+        self.assertIn("error", results[0][0])
+        self.assertEqual(results[1], ["Kyoto answer"])
+        self.assertIn("error", results[2][0])
+        self.assertEqual(results[3], ["Osaka answer"])
+        self.assertEqual(mock_query_city.await_count, 4)
+        self.assertEqual(len(cache), 1)
+
+    @patch("travel_llm.search_flight_options_async")
+    def test_run_tools_flexible_flight_search(self, mock_flexible):
+        """Flexible searches dispatch with their lists and get a route label."""
+        from travel_llm import describe_tool, run_tools
+
+        mock_flexible.return_value = [{"price": "99"}]
+        tool_call = MagicMock()
+        tool_call.function.name = "search_flexible_flights"
+        tool_call.function.arguments = (
+            '{"origins": ["KUL", "SIN"], "destinations": ["NRT"], '
+            '"date_from": "2025-10-10", "date_to": "2025-10-12"}'
+        )
+
+        self.assertEqual(run_tools([tool_call]), [[{"price": "99"}]])
+        mock_flexible.assert_awaited_once_with(
+            origins=["KUL", "SIN"],
+            destinations=["NRT"],
+            date_from="2025-10-10",
+            date_to="2025-10-12",
+        )
+        self.assertEqual(
+            describe_tool(tool_call),
+            "searching flights KUL/SIN→NRT 2025-10-10–2025-10-12…",
+        )
+
+
+class TestRunTravelLLMAsync(unittest.IsolatedAsyncioTestCase):
+    """Tests for the coroutine pipeline used by the async /ask endpoint."""
+
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_concurrent_requests_share_event_loop(
+        self, mock_getenv, mock_openai_class
+    ):
+        """Many in-flight requests overlap instead of queueing behind each other."""
+        from travel_llm import run_travel_llm_async
+
+        mock_getenv.return_value = "test-groq-key"
+
+        choice = MagicMock()
+        choice.message.tool_calls = None
+        choice.message.content = "Plain answer"
+        resp = MagicMock()
+        resp.choices = [choice]
+
+        async def slow_create(**kwargs):
+            await asyncio.sleep(0.2)
+            return resp
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(side_effect=slow_create)
+        mock_openai_class.return_value = mock_client
+
+        start = time.monotonic()
+        results = await asyncio.gather(
+            *(run_travel_llm_async(f"Prompt {i}") for i in range(200))
+        )
+
+        self.assertEqual(results, ["Plain answer"] * 200)
+        self.assertLess(time.monotonic() - start, 1.0)
+        mock_openai_class.assert_called_once()
+
+
+class TestStreamTravelLLM(unittest.IsolatedAsyncioTestCase):
+    """Tests for the event stream produced by stream_travel_llm."""
+
+    @staticmethod
+    def _chunk(content=None, tool_calls=None):
+        chunk = MagicMock()
+        chunk.choices[0].delta.content = content
+        chunk.choices[0].delta.tool_calls = tool_calls
+        return chunk
+
+    @staticmethod
+    def _tool_delta(index, id=None, name=None, arguments=None):
+        part = MagicMock()
+        part.index = index
+        part.id = id
+        part.function.name = name
+        part.function.arguments = arguments
+        return part
+
+    @staticmethod
+    async def _aiter(items):
+        for item in items:
+            yield item
+
+    @patch("travel_llm.search_flights_async")
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_stream_emits_progress_then_tokens(
+        self, mock_getenv, mock_openai_class, mock_search_flights
+    ):
+        """Tool progress events precede the streamed tokens of the final answer."""
+        from travel_llm import stream_travel_llm
+
+        mock_getenv.return_value = "test-groq-key"
+        mock_search_flights.return_value = [{"price": "123.45"}]
+
+        first = [
+            self._chunk(
+                tool_calls=[self._tool_delta(0, "tc_1", "search_flights", '{"origin"')]
+            ),
+            self._chunk(
+                tool_calls=[
+                    self._tool_delta(
+                        0,
+                        arguments=': "JFK", "destination": "LHR", "date": "2025-12-15"}',
+                    )
+                ]
+            ),
+        ]
+        second = [self._chunk("Cheapest "), self._chunk("is $123.45")]
+        streams = [self._aiter(first), self._aiter(second)]
+
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=lambda **kwargs: streams.pop(0)
+        )
+        mock_openai_class.return_value = mock_client
+
+        events = [event async for event in stream_travel_llm("Flights JFK to LHR")]
+
+        self.assertEqual(
+            [event["type"] for event in events],
+            ["tool_start", "tool_end", "token", "token"],
+        )
+        self.assertEqual(events[0]["message"], "searching flights JFK→LHR…")
+        self.assertEqual(events[1]["message"], "found 1 results")
+        self.assertEqual("".join(e["text"] for e in events[2:]), "Cheapest is $123.45")
+        mock_search_flights.assert_awaited_once_with(
+            origin="JFK", destination="LHR", date="2025-12-15"
+        )
+
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_stream_reports_errors(self, mock_getenv, mock_openai_class):
+        """A failing completion ends the stream with an error event."""
+        from travel_llm import stream_travel_llm
+
+        mock_getenv.return_value = "test-groq-key"
+        mock_client = MagicMock()
+        mock_client.chat.completions.create = AsyncMock(
+            side_effect=RuntimeError("Groq down")
+        )
+        mock_openai_class.return_value = mock_client
+
+        events = [event async for event in stream_travel_llm("Hello")]
+
+        self.assertEqual(events, [{"type": "error", "message": "Groq down"}])
+
+
+class TestAgentLoop(unittest.IsolatedAsyncioTestCase):
+    """Tests for the bounded multi-step agent loop."""
+
+    def setUp(self):
+        # The model picks every round's tools here; see TestRouter for routing.
+        patcher = patch("travel_llm.ROUTER_RULES", False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _tool_call(id, name, arguments):
+        tool_call = MagicMock()
+        tool_call.id = id
+        tool_call.function.name = name
+        tool_call.function.arguments = arguments
+        return tool_call
+
+    @staticmethod
+    def _response(content=None, tool_calls=None, prompt_tokens=10):
+        resp = MagicMock()
+        resp.choices = [MagicMock()]
+        resp.choices[0].message.content = content
+        resp.choices[0].message.tool_calls = tool_calls
+        resp.usage.prompt_tokens = prompt_tokens
+        resp.usage.completion_tokens = 5
+        return resp
+
+    def _client(self, mock_openai_class, responses):
+        client = MagicMock()
+        client.chat.completions.create = AsyncMock(side_effect=responses)
+        mock_openai_class.return_value = client
+        return client
+
+    @patch("travel_llm.search_flights_async")
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_chained_tools_with_prefetch(
+        self, mock_getenv, mock_openai_class, mock_query_city, mock_search
+    ):
+        """A second tool round runs, and a prefetched flight search is reused."""
+        from travel_llm import run_travel_llm_async
+
+        mock_getenv.return_value = "test-groq-key"
+        started = []
+
+        async def search(**kwargs):
+            # Completions finished when the search started.
+            started.append(
+                mock_openai_class.return_value.chat.completions.create.await_count
+            )
+            return [{"price": "99"}]
+
+        mock_search.side_effect = search
+        mock_query_city.return_value = "Kyoto answer"
+        city = self._tool_call(
+            "tc_1", "query_city", '{"city": "Kyoto", "question": "Top sights?"}'
+        )
+        flights = self._tool_call(
+            "tc_2",
+            "search_flights",
+            '{"origin": "KIX", "destination": "HND", "date": "2025-10-10"}',
+        )
+        client = self._client(
+            mock_openai_class,
+            [
+                self._response(tool_calls=[city]),
+                self._response(tool_calls=[flights], prompt_tokens=50),
+                self._response("Visit Kyoto, fly KIX→HND for $99", prompt_tokens=80),
+            ],
+        )
+        steps = []
+
+        answer = await run_travel_llm_async(
+            "Top sights in Kyoto, then find flights KIX to HND on 2025-10-10",
+            steps=steps,
+        )
+
+        self.assertEqual(answer, "Visit Kyoto, fly KIX→HND for $99")
+        mock_search.assert_awaited_once_with(
+            origin="KIX", destination="HND", date="2025-10-10", adults=1
+        )
+        self.assertEqual(started, [1])  # before the model asked for it
+        self.assertEqual(
+            [(s["kind"], s["step"]) for s in steps],
+            [
+                ("completion", 0),
+                ("tools", 0),
+                ("completion", 1),
+                ("tools", 1),
+                ("completion", 2),
+            ],
+        )
+        self.assertEqual(steps[3]["prefetched"], 1)
+        self.assertEqual(steps[4]["prompt_tokens"], 80)
+        last_messages = client.chat.completions.create.call_args.kwargs["messages"]
+        self.assertEqual(
+            [m["role"] for m in last_messages],
+            ["user", "assistant", "tool", "assistant", "tool"],
+        )
+        self.assertEqual(
+            last_messages[-1]["content"],
+            "offer|price|from|to|carrier|departure|arrival\n1|99|||||",
+        )
+        self.assertEqual(steps[1]["result_tokens"], steps[1]["result_tokens_raw"])
+
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_max_steps_forces_answer(
+        self, mock_getenv, mock_openai_class, mock_query_city
+    ):
+        """After the last allowed round the model is asked without tools."""
+        from travel_llm import _run_pipeline
+
+        mock_getenv.return_value = "test-groq-key"
+        mock_query_city.return_value = "answer"
+        call = self._tool_call(
+            "tc_1", "query_city", '{"city": "Tokyo", "question": "Food?"}'
+        )
+        client = self._client(
+            mock_openai_class,
+            [self._response(tool_calls=[call]), self._response("Final")],
+        )
+
+        answer = await _run_pipeline("Tokyo food", max_steps=1)
+
+        self.assertEqual(answer, "Final")
+        first, second = client.chat.completions.create.call_args_list
+        self.assertIn("tools", first.kwargs)
+        self.assertNotIn("tools", second.kwargs)
+
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
+    @patch("travel_llm.os.getenv")
+    async def test_deadline_stops_tool_rounds(
+        self, mock_getenv, mock_openai_class, mock_query_city
+    ):
+        """Slow tools are cut off at the deadline and the model answers."""
+        from travel_llm import _run_pipeline
+
+        mock_getenv.return_value = "test-groq-key"
+
+        async def slow(**kwargs):
+            await asyncio.sleep(1)
+
+        mock_query_city.side_effect = slow
+        call = self._tool_call(
+            "tc_1", "query_city", '{"city": "Tokyo", "question": "Food?"}'
+        )
+        client = self._client(
+            mock_openai_class,
+            [self._response(tool_calls=[call]), self._response("Partial answer")],
+        )
+
+        start = time.monotonic()
+        answer = await _run_pipeline("Tokyo food", deadline=0.1)
+
+        self.assertEqual(answer, "Partial answer")
+        self.assertLess(time.monotonic() - start, 0.5)
+        tool_message = client.chat.completions.create.call_args.kwargs["messages"][-1]
+        self.assertIn("timed out", tool_message["content"])
+        self.assertNotIn("tools", client.chat.completions.create.call_args.kwargs)
+
+
+@patch("travel_llm.os.getenv", return_value="test-groq-key")
+class TestRouter(unittest.IsolatedAsyncioTestCase):
+    """Tests for picking the first round of tools without the main model."""
+
+    def _client(self, mock_openai_class, responses):
+        return TestAgentLoop._client(self, mock_openai_class, responses)
+
+    @patch("travel_llm.search_flights_async")
+    @patch("travel_llm.AsyncOpenAI")
+    async def test_rules_call_tools_directly(self, mock_openai_class, mock_search, _):
+        """A spelled-out flight search runs before the only completion."""
+        from metrics import metrics
+        from travel_llm import _run_pipeline
+
+        metrics.clear()
+        mock_search.return_value = [{"price": "99"}]
+        client = self._client(
+            mock_openai_class, [TestAgentLoop._response("Fly BA for $99")]
+        )
+        steps = []
+
+        answer = await _run_pipeline(
+            "Flights from New York (JFK) to London (LHR) on December 15, 2025 "
+            "for 2 adults",
+            steps=steps,
+        )
+
+        self.assertEqual(answer, "Fly BA for $99")
+        mock_search.assert_awaited_once_with(
+            origin="JFK", destination="LHR", date="2025-12-15", adults=2
+        )
+        client.chat.completions.create.assert_awaited_once()
+        self.assertEqual(
+            [step["kind"] for step in steps], ["route", "tools", "completion"]
+        )
+        self.assertEqual(steps[0]["route"], "rules")
+        self.assertEqual(metrics.summary()["router.rules"]["count"], 1)
+
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
+    async def test_routed_questions_do_not_share_cached_answers(
+        self, mock_openai_class, mock_query_city, _
+    ):
+        """Routed questions are the user's own text, not the instructions."""
+        from semantic_cache import SemanticCache
+        from travel_llm import _run_pipeline
+
+        cache = SemanticCache()
+
+        async def query_city(city, question):
+            cached = cache.lookup(city, question)
+            if cached is None:
+                cached = f"answer to {question}"
+                cache.store(city, question, cached)
+            return cached
+
+        mock_query_city.side_effect = query_city
+        client = self._client(
+            mock_openai_class,
+            [TestAgentLoop._response("Ramen"), TestAgentLoop._response("Safe")],
+        )
+        prompts = [
+            "Best ramen restaurants in Tokyo?",
+            "Is Tokyo safe for solo travellers at night?",
+        ]
+
+        for prompt in prompts:
+            await _run_pipeline(prompt, instructions=INSTRUCTIONS)
+
+        self.assertEqual(
+            [call.kwargs["question"] for call in mock_query_city.await_args_list],
+            prompts,
+        )
+        results = [
+            message["content"]
+            for call in client.chat.completions.create.call_args_list
+            for message in call.kwargs["messages"]
+            if message["role"] == "tool"
+        ]
+        self.assertEqual(len(set(results)), 2)
+        first = client.chat.completions.create.call_args_list[0]
+        self.assertEqual(
+            first.kwargs["messages"][0],
+            {"role": "system", "content": INSTRUCTIONS},
+        )
+
+    @patch("travel_llm.ROUTER_MODEL", "small-model")
+    @patch("travel_llm.query_city_async")
+    @patch("travel_llm.AsyncOpenAI")
+    async def test_router_model_picks_tools(
+        self, mock_openai_class, mock_query_city, _
+    ):
+        """Unstructured prompts go to ROUTER_MODEL; MODEL writes the answer."""
+        from travel_llm import MODEL, _run_pipeline
+
+        mock_query_city.return_value = "Lisbon answer"
+        call = TestAgentLoop._tool_call(
+            "tc_1", "query_city", '{"city": "Lisbon", "question": "Food?"}'
+        )
+        client = self._client(
+            mock_openai_class,
+            [
+                TestAgentLoop._response(tool_calls=[call]),
+                TestAgentLoop._response("Eat pastel de nata"),
+            ],
+        )
+        steps = []
+
+        answer = await _run_pipeline("Where should I eat in Lisbon?", steps=steps)
+
+        self.assertEqual(answer, "Eat pastel de nata")
+        first, second = client.chat.completions.create.call_args_list
+        self.assertEqual(first.kwargs["model"], "small-model")
+        self.assertIn("tools", first.kwargs)
+        self.assertEqual(second.kwargs["model"], MODEL)
+        self.assertEqual(steps[0]["route"], "model")
+
+    @patch("travel_llm.ROUTER_MODEL", "small-model")
+    @patch("travel_llm.AsyncOpenAI")
+    async def test_unrouted_prompt_falls_back_to_model(self, mock_openai_class, _):
+        """When the router model picks no tools, MODEL is offered them."""
+        from travel_llm import MODEL, _run_pipeline
+
+        client = self._client(
+            mock_openai_class,
+            [TestAgentLoop._response("Hi"), TestAgentLoop._response("Hello!")],
+        )
+        steps = []
+
+        answer = await _run_pipeline("Hello there", steps=steps)
+
+        self.assertEqual(answer, "Hello!")
+        second = client.chat.completions.create.call_args_list[1]
+        self.assertEqual(second.kwargs["model"], MODEL)
+        self.assertIn("tools", second.kwargs)
+        self.assertEqual(steps[0]["route"], "none")
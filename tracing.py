@@ -0,0 +1,242 @@
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import deque
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tracing is on by default; with TRACING_ENABLED=false span() returns a shared
+# no-op object, so instrumented code pays one function call per span.
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "200"))
+TRACE_JSONL_PATH = os.getenv("TRACE_JSONL_PATH")
+# e.g. http://localhost:4318/v1/traces; requires opentelemetry-sdk and
+# opentelemetry-exporter-otlp-proto-http.
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT")
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed stage of a request, with attributes such as token counts.
+
+    Spans nest through a context variable, so children started in tasks or
+    ``asyncio.to_thread`` workers attach to the span that was current there.
+    Use ``span()`` rather than creating spans directly.
+    """
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.parent = _current.get()
+        self.trace_id = self.parent.trace_id if self.parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.children = [] if self.parent is None else self.parent.children
+        self.start = 0.0
+        self.duration_ms = 0.0
+        self._started = 0.0
+        self._token = None
+
+    def set(self, **attributes):
+        """Add or overwrite attributes of the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._started) * 1000
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            pass  # Exited from another context (e.g. a closed async generator).
+        if exc is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Stand-in returned by ``span()`` when tracing is disabled."""
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class RingBufferExporter:
+    """Keep the most recent traces in memory (served by GET /traces)."""
+
+    def __init__(self, size=TRACE_BUFFER_SIZE):
+        self.traces = deque(maxlen=size)
+
+    def export(self, trace):
+        self.traces.append(trace)
+
+
+class JsonlExporter:
+    """Append one JSON line per finished trace to a file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, trace):
+        line = json.dumps(trace, default=str) + "\n"
+        with self._lock, open(self.path, "a") as f:
+            f.write(line)
+
+
+class OTLPExporter:
+    """Forward finished traces to an OTLP/HTTP collector through OpenTelemetry.
+
+    Requires the opentelemetry-sdk and opentelemetry-exporter-otlp-proto-http
+    packages; spans are replayed with their original start and end times.
+    """
+
+    def __init__(self, endpoint):
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+        provider = TracerProvider(
+            resource=Resource.create({"service.name": "travel-assistant"})
+        )
+        provider.add_span_processor(
+            BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint))
+        )
+        self._tracer = provider.get_tracer("travel-assistant")
+
+    def export(self, trace):
+        from opentelemetry import trace as otel_trace
+
+        started = {}
+        for span in sorted(trace["spans"], key=lambda s: s["start"]):
+            parent = started.get(span["parent_id"])
+            context = otel_trace.set_span_in_context(parent) if parent else None
+            otel_span = self._tracer.start_span(
+                span["name"],
+                context=context,
+                start_time=int(span["start"] * 1e9),
+                attributes={
+                    k: v if isinstance(v, (bool, int, float, str)) else str(v)
+                    for k, v in span["attributes"].items()
+                },
+            )
+            started[span["span_id"]] = otel_span
+        for span in trace["spans"]:
+            end = span["start"] + span["duration_ms"] / 1000
+            started[span["span_id"]].end(end_time=int(end * 1e9))
+
+
+class Tracer:
+    """Creates spans, feeds their latencies to the metrics registry and exports
+    each finished trace (a root span with its descendants) to every exporter.
+
+    Args:
+        enabled: When False, ``span()`` returns a no-op span.
+        exporters: Objects with an ``export(trace_dict)`` method.
+    """
+
+    def __init__(self, enabled=True, exporters=()):
+        self.enabled = enabled
+        self.exporters = list(exporters)
+
+    def span(self, name, **attributes):
+        """Return a context manager timing the stage ``name``."""
+        if not self.enabled:
+            return _NOOP
+        return Span(self, name, attributes)
+
+    def _finish(self, span):
+        metrics.observe(span.name, span.duration_ms)
+        span.children.append(span)
+        if span.parent is not None:
+            return
+        trace = {
+            "trace_id": span.trace_id,
+            "name": span.name,
+            "duration_ms": round(span.duration_ms, 3),
+            "spans": [s.to_dict() for s in span.children],
+        }
+        for exporter in self.exporters:
+            try:
+                exporter.export(trace)
+            except Exception:
+                # Tracing must never break a request.
+                logger.exception("Trace exporter %s failed", type(exporter).__name__)
+
+
+def _tracer_from_env():
+    exporters = [RingBufferExporter(TRACE_BUFFER_SIZE)]
+    if TRACE_JSONL_PATH:
+        exporters.append(JsonlExporter(TRACE_JSONL_PATH))
+    if TRACE_OTLP_ENDPOINT:
+        exporters.append(OTLPExporter(TRACE_OTLP_ENDPOINT))
+    return Tracer(TRACING_ENABLED, exporters)
+
+
+tracer = _tracer_from_env()
+recent_traces = tracer.exporters[0]
+
+
+def span(name, **attributes):
+    """Time the stage ``name`` with the shared tracer.
+
+    Example:
+        with span("llm.completion", step=0) as s:
+            ...
+            s.set(prompt_tokens=120)
+    """
+    return tracer.span(name, **attributes)
+
+
+def token_counts(usage):
+    """Return the prompt/completion token counts of a completion's usage object.
+
+    Missing or non-integer counts (e.g. providers that omit usage) are 0.
+    """
+    counts = {}
+    for field in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, field, 0)
+        counts[field] = value if isinstance(value, int) else 0
+    return counts
+
+
+def annotate(**attributes):
+    """Set attributes on the current span, if tracing is active."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attributes)
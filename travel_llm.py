@@ -1,10 +1,51 @@
+import asyncio
+import hashlib
+import json
+import logging
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-from flight_agent import search_flights
-from itinerary_agent import query_city
 
-load_dotenv()
+from clients import get_async_client
+from concurrency import run_sync
+from extractors import CITY_SECTIONS, find_tool_calls
+from flight_agent import search_flight_options_async, search_flights_async
+from iata import canonical_city
+from itinerary_agent import query_city_async
+from lazy import lazy_import
+from metrics import metrics
+from resilience import GROQ_TIMEOUT, dependency, request_budget
+from serialization import estimate_tokens, parse_arguments, serialize_tool_result
+from settings import load_env
+from tracing import span, token_counts
+
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# The OpenAI SDK (used for Groq) is only imported when the first completion runs.
+AsyncOpenAI = lazy_import("openai", "AsyncOpenAI")
+_tool_call_types = "openai.types.chat.chat_completion_message_tool_call"
+ChatCompletionMessageToolCall = lazy_import(
+    _tool_call_types, "ChatCompletionMessageToolCall"
+)
+Function = lazy_import(_tool_call_types, "Function")
+
+# Tool calls from one model turn are independent, so they run concurrently, at most
+# MAX_TOOL_WORKERS at a time; each one gets TOOL_TIMEOUT seconds once started.
+MAX_TOOL_WORKERS = int(os.getenv("MAX_TOOL_WORKERS", "5"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "30"))
+# The model may chain up to MAX_AGENT_STEPS rounds of tool calls; after that, or
+# once AGENT_DEADLINE seconds have passed, it must answer with what it has.
+MAX_AGENT_STEPS = int(os.getenv("MAX_AGENT_STEPS", "3"))
+AGENT_DEADLINE = float(os.getenv("AGENT_DEADLINE", "60"))
+
+MODEL = "openai/gpt-oss-120b"
+
+# The first round of tools is picked without MODEL when possible: with
+# ROUTER_RULES the tools a prompt spells out (see ``find_tool_calls``) run
+# straight away, and otherwise ROUTER_MODEL, a smaller and faster model, picks
+# them if it is set (e.g. "llama-3.1-8b-instant"). MODEL then writes the answer.
+ROUTER_RULES = os.getenv("ROUTER_RULES", "true").lower() == "true"
+ROUTER_MODEL = os.getenv("ROUTER_MODEL", "")
 
 tools = [
     {
@@ -17,11 +58,11 @@ tools = [
                 "properties": {
                     "origin": {
                         "type": "string",
-                        "description": "Origin airport/city IATA code",
+                        "description": "Origin airport/city IATA code or city name",
                     },
                     "destination": {
                         "type": "string",
-                        "description": "Destination airport/city IATA code",
+                        "description": "Destination airport/city IATA code or city name",
                     },
                     "date": {
                         "type": "string",
@@ -36,6 +77,45 @@ tools = [
             },
         },
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "search_flexible_flights",
+            "description": (
+                "Search flights from several origins to several destinations over "
+                "a range of dates in one call, returning the cheapest offers first. "
+                "Use for flexible dates or alternative airports."
+            ),
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "origins": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Origin airport/city IATA codes or city names",
+                    },
+                    "destinations": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "Destination airport/city IATA codes or city names",
+                    },
+                    "date_from": {
+                        "type": "string",
+                        "description": "First departure date in YYYY-MM-DD",
+                    },
+                    "date_to": {
+                        "type": "string",
+                        "description": "Last departure date in YYYY-MM-DD (inclusive)",
+                    },
+                    "adults": {
+                        "type": "integer",
+                        "description": "Number of adult passengers",
+                    },
+                },
+                "required": ["origins", "destinations", "date_from"],
+            },
+        },
+    },
     {
         "type": "function",
         "function": {
@@ -52,6 +132,11 @@ tools = [
                         "type": "string",
                         "description": "The user's question about the city",
                     },
+                    "section": {
+                        "type": "string",
+                        "enum": list(CITY_SECTIONS),
+                        "description": "Optional guide section to search, e.g. Eat for restaurants",
+                    },
                 },
                 "required": ["city", "question"],
             },
@@ -59,59 +144,612 @@ tools = [
     },
 ]
 
+# Changes whenever the tool schema does, so cached answers produced with an older
+# set of tools are not reused.
+TOOL_SCHEMA_VERSION = hashlib.sha256(
+    json.dumps(tools, sort_keys=True).encode()
+).hexdigest()[:12]
+
+
+def _tool_key(tool_call):
+    """Return a cache key for a tool call that ignores argument formatting."""
+    try:
+        arguments = json.dumps(
+            parse_arguments(tool_call.function.arguments), sort_keys=True
+        )
+    except (TypeError, ValueError):
+        arguments = tool_call.function.arguments
+    return tool_call.function.name, arguments
 
-def run_travel_llm(user_prompt: str):
-    """Call the LLM with optional tool-calling for flights and city info.
 
-    The function sends the user's prompt to the model. If the model requests a
-    tool call, it executes the corresponding function, then performs a follow-up
-    call injecting tool results to produce the final answer.
+def _prefetch_key(name, args):
+    """Return the identity used to match a speculative call to a model call.
+
+    City lookups match on the city alone (by its Wikivoyage title, so "KL"
+    matches "Kuala Lumpur"), since the model words its question freely;
+    flight searches match on the normalized route, date and adults.
+    """
+    if name == "search_flights":
+        return (
+            name,
+            str(args.get("origin", "")).strip().upper(),
+            str(args.get("destination", "")).strip().upper(),
+            str(args.get("date", "")).strip(),
+            int(args.get("adults") or 1),
+        )
+    if name == "query_city":
+        return name, canonical_city(args.get("city", "")).casefold()
+    return None
+
+
+def _call_prefetch_key(tool_call):
+    try:
+        args = parse_arguments(tool_call.function.arguments)
+        return _prefetch_key(tool_call.function.name, args)
+    except (TypeError, ValueError):
+        return None
+
+
+def _speculative_calls(user_prompt, tool_calls):
+    """Return the tool calls worth starting before the model asks for them.
+
+    When the prompt names both a flight route (IATA codes and a date) and a
+    known city, both tools will most likely be needed, so any of them the
+    model's first turn did not request yet is started right away.
+
+    Returns:
+        A list of ``(name, args)`` tuples.
+    """
+    candidates = find_tool_calls(user_prompt)
+    if {name for name, _ in candidates} != {"search_flights", "query_city"}:
+        return []
+
+    requested = {_call_prefetch_key(tool_call) for tool_call in tool_calls}
+    return [
+        (name, args)
+        for name, args in candidates
+        if _prefetch_key(name, args) not in requested
+    ]
+
+
+async def _speculate(name, args):
+    with span(f"prefetch.{name}") as prefetch_span:
+        try:
+            if name == "search_flights":
+                return await search_flights_async(**args)
+            return await query_city_async(**args)
+        except Exception as error:
+            logger.exception("Prefetched %s failed", name)
+            prefetch_span.set(error=str(error))
+            return {"error": str(error)}
+
+
+async def execute_tool(tool_call):
+    """Execute a single tool call requested by the model.
 
     Args:
-        user_prompt: The user's input prompt for the travel assistant.
+        tool_call: A tool call object from the model response.
 
     Returns:
-        The assistant's textual response string.
+        The tool's result, or an error dict for unknown tools.
     """
+    fn_name = tool_call.function.name
+    fn_args = parse_arguments(tool_call.function.arguments)
 
-    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+    if fn_name == "search_flights":
+        return await search_flights_async(**fn_args)
+    elif fn_name == "search_flexible_flights":
+        return await search_flight_options_async(**fn_args)
+    elif fn_name == "query_city":
+        return await query_city_async(**fn_args)
+    else:
+        return {"error": f"Unknown tool {fn_name}"}
+
+
+def describe_tool(tool_call):
+    """Return a short human-readable progress label for a tool call.
+
+    Args:
+        tool_call: A tool call object from the model response.
+
+    Returns:
+        A label such as "searching flights JFK→LHR…".
+    """
+    fn_name = tool_call.function.name
+    try:
+        fn_args = parse_arguments(tool_call.function.arguments)
+    except (TypeError, ValueError):
+        fn_args = {}
+
+    if fn_name == "search_flights":
+        origin = fn_args.get("origin", "?")
+        destination = fn_args.get("destination", "?")
+        return f"searching flights {origin}→{destination}…"
+    elif fn_name == "search_flexible_flights":
+        origins = _joined_codes(fn_args.get("origins"))
+        destinations = _joined_codes(fn_args.get("destinations"))
+        dates = "–".join(
+            str(fn_args[key]) for key in ("date_from", "date_to") if fn_args.get(key)
+        )
+        return f"searching flights {origins}→{destinations} {dates}…"
+    elif fn_name == "query_city":
+        return f"looking up {fn_args.get('city', 'city')} travel info…"
+    else:
+        return f"running {fn_name}…"
+
+
+def _joined_codes(codes):
+    if isinstance(codes, (list, tuple)):
+        return "/".join(str(code) for code in codes) or "?"
+    return str(codes or "?")
+
+
+def _summarize_result(result):
+    """Return a short progress label for a finished tool result."""
+    if isinstance(result, dict) and "error" in result:
+        return f"failed: {result['error']}"
+    if isinstance(result, list):
+        return f"found {len(result)} results"
+    return "done"
+
+
+async def run_tools_async(
+    tool_calls,
+    max_workers=None,
+    timeout=None,
+    emit=None,
+    cache=None,
+    prefetched=None,
+    shared=None,
+):
+    """Execute the tool calls of one model turn concurrently.
 
-    client = OpenAI(base_url="https://api.groq.com/openai/v1", api_key=GROQ_API_KEY)
+    Args:
+        tool_calls: Tool call objects from the model response.
+        max_workers: Maximum number of tools running at once (default: MAX_TOOL_WORKERS).
+        timeout: Seconds each tool may run once started (default: TOOL_TIMEOUT).
+        emit: Optional callback receiving "tool_start" and "tool_end" progress
+            events as each tool starts and finishes.
+        cache: Optional ``TTLCache`` of earlier results keyed by tool name and
+            arguments. Cached calls are not executed again, and successful new
+            results are added to it.
+        prefetched: Optional dict of speculative tasks keyed by
+            ``_prefetch_key``. A call matching one awaits that task instead of
+            starting the tool again, and the task is removed from the dict.
+        shared: Optional dict of result futures keyed by tool name and
+            arguments, shared by pipelines running side by side (e.g. the
+            prompts of a batch). A call already in it awaits that result
+            instead of running the tool again; other calls add theirs, and
+            failed ones are removed again so that later calls retry.
+
+    Returns:
+        A list of results in the same order as ``tool_calls``. A tool that raises
+        or does not finish in time yields an error dict instead of a result.
+    """
+    semaphore = asyncio.Semaphore(max_workers or MAX_TOOL_WORKERS)
+    timeout = timeout or TOOL_TIMEOUT
+
+    def timed_out(tool_call):
+        return {"error": f"Tool {tool_call.function.name} timed out after {timeout}s"}
+
+    async def run_one(tool_call):
+        with span(f"tool.{tool_call.function.name}") as tool_span:
+            key = _tool_key(tool_call)
+            cached = cache.get(key) if cache is not None else None
+            if cached is not None:
+                tool_span.set(session_cache_hit=True)
+                return cached
+            if shared is not None and key in shared:
+                tool_span.set(shared=True)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(shared[key]), timeout)
+                except TimeoutError:
+                    return timed_out(tool_call)
+            future = None
+            if shared is not None:
+                future = shared[key] = asyncio.get_running_loop().create_future()
+            result = {"error": "Tool call was cancelled"}
+            try:
+                async with semaphore:
+                    if emit:
+                        emit(
+                            {
+                                "type": "tool_start",
+                                "tool": tool_call.function.name,
+                                "message": describe_tool(tool_call),
+                            }
+                        )
+                    try:
+                        task = None
+                        if prefetched:
+                            task = prefetched.pop(_call_prefetch_key(tool_call), None)
+                        tool_span.set(prefetched=task is not None)
+                        result = await asyncio.wait_for(
+                            task or execute_tool(tool_call), timeout
+                        )
+                    except TimeoutError:
+                        result = timed_out(tool_call)
+                    except Exception as error:
+                        logger.exception("Tool %s failed", tool_call.function.name)
+                        result = {"error": str(error)}
+                    failed = isinstance(result, dict) and "error" in result
+                    if failed:
+                        tool_span.set(error=str(result["error"]))
+                    elif cache is not None:
+                        cache.set(key, result)
+                    if emit:
+                        emit(
+                            {
+                                "type": "tool_end",
+                                "tool": tool_call.function.name,
+                                "message": _summarize_result(result),
+                            }
+                        )
+                    return result
+            finally:
+                # Waiters in other pipelines get this call's result (or error).
+                if future is not None:
+                    future.set_result(result)
+                    if isinstance(result, dict) and "error" in result:
+                        del shared[key]
+
+    return await asyncio.gather(*(run_one(tool_call) for tool_call in tool_calls))
+
+
+def run_tools(tool_calls, max_workers=None, timeout=None):
+    """Synchronous wrapper around ``run_tools_async``."""
+    return run_sync(run_tools_async(tool_calls, max_workers, timeout))
 
-    response = client.chat.completions.create(
-        model="openai/gpt-oss-120b",
-        messages=[{"role": "user", "content": user_prompt}],
-        tools=tools,
+
+async def _complete(client, messages, emit=None, model=MODEL, **kwargs):
+    """Run one chat completion, streaming tokens to ``emit`` when given.
+
+    Args:
+        client: The async Groq client.
+        messages: Chat messages for the completion.
+        emit: Optional callback receiving a "token" event per content delta. When
+            set, the completion is streamed and tool call deltas are reassembled.
+        model: The model to complete with (default: MODEL).
+        **kwargs: Extra arguments for ``chat.completions.create`` (e.g. tools).
+
+    Returns:
+        A ``(content, tool_calls, usage)`` tuple for the assistant message, where
+        usage holds the "prompt_tokens" and "completion_tokens" counts.
+    """
+    if emit is None:
+        response = await dependency("groq").call(
+            client.chat.completions.create, model=model, messages=messages, **kwargs
+        )
+        message = response.choices[0].message
+        return message.content, message.tool_calls, token_counts(response.usage)
+
+    stream = await dependency("groq").call(
+        client.chat.completions.create,
+        model=model,
+        messages=messages,
+        stream=True,
+        stream_options={"include_usage": True},
+        **kwargs,
     )
+    content = []
+    calls = {}
+    usage = token_counts(None)
+    async for chunk in stream:
+        if getattr(chunk, "usage", None) is not None:
+            usage = token_counts(chunk.usage)
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            emit({"type": "token", "text": delta.content})
+        for part in delta.tool_calls or []:
+            call = calls.setdefault(part.index, {"id": "", "name": "", "arguments": ""})
+            call["id"] = part.id or call["id"]
+            if part.function:
+                call["name"] += part.function.name or ""
+                call["arguments"] += part.function.arguments or ""
 
-    tool_calls = response.choices[0].message.tool_calls
-    if tool_calls:
-        tool_results = []
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=call["id"],
+            type="function",
+            function=Function(name=call["name"], arguments=call["arguments"]),
+        )
+        for _, call in sorted(calls.items())
+    ]
+    return "".join(content), tool_calls or None, usage
 
-        for tool_call in tool_calls:
-            fn_name = tool_call.function.name
-            fn_args = eval(tool_call.function.arguments)
 
-            if fn_name == "search_flights":
-                result = search_flights(**fn_args)
-            elif fn_name == "query_city":
-                result = query_city(**fn_args)
+def _routed_call(index, name, args):
+    return ChatCompletionMessageToolCall(
+        id=f"route_{index}",
+        type="function",
+        function=Function(name=name, arguments=json.dumps(args)),
+    )
+
+
+async def _route(client, messages, user_prompt):
+    """Pick the first round of tool calls without asking MODEL.
+
+    Tools the prompt spells out are called directly (with ROUTER_RULES);
+    otherwise ROUTER_MODEL, when set, chooses them from ``messages``.
+
+    Returns:
+        A ``(route, tool_calls, usage)`` tuple. ``route`` is "rules", "model"
+        or "none"; with "none" ``tool_calls`` is None and MODEL picks the tools.
+    """
+    if ROUTER_RULES:
+        calls = find_tool_calls(user_prompt)
+        if calls:
+            tool_calls = [
+                _routed_call(i, name, args) for i, (name, args) in enumerate(calls)
+            ]
+            return "rules", tool_calls, token_counts(None)
+    if ROUTER_MODEL:
+        with span("llm.router", model=ROUTER_MODEL):
+            _, tool_calls, usage = await _complete(
+                client, messages, model=ROUTER_MODEL, tools=tools
+            )
+        return ("model" if tool_calls else "none"), tool_calls or None, usage
+    return "none", None, token_counts(None)
+
+
+async def _run_pipeline(
+    user_prompt,
+    emit=None,
+    session=None,
+    steps=None,
+    max_steps=None,
+    deadline=None,
+    shared_tools=None,
+    instructions=None,
+):
+    """Run the agent loop, reporting progress to ``emit`` if given.
+
+    The model is offered the tools for up to ``max_steps`` rounds, so it can
+    chain calls (look up a city, then search flights from its airport). After
+    the last round, or once ``deadline`` seconds have passed, it is asked to
+    answer without tools. The first round's tools are chosen by ``_route``
+    when it can, which saves MODEL's tool-selection completion; tools the
+    prompt clearly needs are otherwise prefetched alongside the first round
+    (see ``_speculative_calls``).
+
+    With a ``session``, its compacted history is sent before the prompt, its
+    cached tool results are reused, and the finished turn is recorded in it.
+    Without one, ``instructions`` are sent as the system message, so that
+    routing only sees the user's own text.
+    ``shared_tools`` is passed to ``run_tools_async`` as ``shared``, so
+    pipelines running together can share identical tool calls.
+    Each completion and tool round is appended to ``steps`` with its latency
+    and, for completions, token usage (for tool rounds, the number of
+    ``errors``).
+    """
+    GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+
+    # Retries are left to the "groq" dependency (see resilience.py); the HTTP
+    # timeout ends requests it has given up on.
+    client = get_async_client(
+        AsyncOpenAI,
+        base_url="https://api.groq.com/openai/v1",
+        api_key=GROQ_API_KEY,
+        max_retries=0,
+        timeout=GROQ_TIMEOUT,
+    )
+    loop = asyncio.get_running_loop()
+    max_steps = MAX_AGENT_STEPS if max_steps is None else max_steps
+    deadline = loop.time() + (AGENT_DEADLINE if deadline is None else deadline)
+    steps = [] if steps is None else steps
+
+    if session:
+        history = session.context()
+    elif instructions:
+        history = [{"role": "system", "content": instructions}]
+    else:
+        history = []
+    messages = [*history, {"role": "user", "content": user_prompt}]
+    tool_log = []
+    prefetched = {}
+    routed = None
+    if max_steps > 0 and (ROUTER_RULES or ROUTER_MODEL):
+        started = loop.time()
+        with span("router") as router_span:
+            route, routed, usage = await _route(client, messages, user_prompt)
+            router_span.set(route=route, tool_calls=len(routed or ()), **usage)
+        latency_ms = round((loop.time() - started) * 1000, 1)
+        # Per-route counts and latencies, e.g. "router.rules" in /metrics.
+        metrics.observe(f"router.{route}", latency_ms)
+        steps.append(
+            {
+                "step": 0,
+                "kind": "route",
+                "route": route,
+                "latency_ms": latency_ms,
+                **usage,
+            }
+        )
+    try:
+        for step in range(max_steps + 1):
+            offer_tools = step < max_steps and loop.time() < deadline
+            if step == 0 and routed:
+                tool_calls = routed
             else:
-                result = {"error": f"Unknown tool {fn_name}"}
+                started = loop.time()
+                with span("llm.completion", step=step, model=MODEL) as llm_span:
+                    content, tool_calls, usage = await _complete(
+                        client,
+                        messages,
+                        emit,
+                        **({"tools": tools} if offer_tools else {}),
+                    )
+                    llm_span.set(tool_calls=len(tool_calls or ()), **usage)
+                steps.append(
+                    {
+                        "step": step,
+                        "kind": "completion",
+                        "latency_ms": round((loop.time() - started) * 1000, 1),
+                        **usage,
+                    }
+                )
+                if not tool_calls or not offer_tools:
+                    break
 
-            tool_results.append(
-                {"role": "tool", "tool_call_id": tool_call.id, "content": str(result)}
+            # Speculation is skipped for shared (batch) runs, where each
+            # pipeline's own prefetches would bypass the cross-prompt dedupe.
+            if step == 0 and shared_tools is None:
+                prefetched = {
+                    _prefetch_key(name, args): asyncio.create_task(
+                        _speculate(name, args)
+                    )
+                    for name, args in _speculative_calls(user_prompt, tool_calls)
+                }
+            hits = sum(_call_prefetch_key(call) in prefetched for call in tool_calls)
+            started = loop.time()
+            with span(
+                "tools", step=step, count=len(tool_calls), prefetched=hits
+            ) as tools_span:
+                results = await run_tools_async(
+                    tool_calls,
+                    timeout=min(TOOL_TIMEOUT, max(deadline - started, 0.001)),
+                    emit=emit,
+                    cache=session.tool_results if session else None,
+                    prefetched=prefetched,
+                    shared=shared_tools,
+                )
+                # Tool results go back to the model as compact text, not reprs.
+                outputs = [
+                    serialize_tool_result(call.function.name, result)
+                    for call, result in zip(tool_calls, results)
+                ]
+                raw_tokens = sum(estimate_tokens(str(result)) for result in results)
+                result_tokens = sum(estimate_tokens(output) for output in outputs)
+                tools_span.set(
+                    result_tokens_raw=raw_tokens, result_tokens=result_tokens
+                )
+            steps.append(
+                {
+                    "step": step,
+                    "kind": "tools",
+                    "latency_ms": round((loop.time() - started) * 1000, 1),
+                    "tools": [call.function.name for call in tool_calls],
+                    "prefetched": hits,
+                    "errors": sum(
+                        isinstance(result, dict) and "error" in result
+                        for result in results
+                    ),
+                    "result_tokens_raw": raw_tokens,
+                    "result_tokens": result_tokens,
+                }
             )
 
-        followup = client.chat.completions.create(
-            model="openai/gpt-oss-120b",
-            messages=[
-                {"role": "user", "content": user_prompt},
+            messages = [
+                *messages,
                 {"role": "assistant", "tool_calls": tool_calls},
-                *tool_results,
-            ],
+                *(
+                    {"role": "tool", "tool_call_id": call.id, "content": output}
+                    for call, output in zip(tool_calls, outputs)
+                ),
+            ]
+            tool_log += [
+                (call.function.name, call.function.arguments, output)
+                for call, output in zip(tool_calls, outputs)
+            ]
+    finally:
+        for task in prefetched.values():
+            task.cancel()
+
+    if session:
+        session.add_turn(user_prompt, content, tool_log)
+    return content
+
+
+async def run_travel_llm_async(
+    user_prompt: str, session=None, steps=None, shared_tools=None, instructions=None
+):
+    """Call the LLM with optional tool-calling for flights and city info.
+
+    The function sends the user's prompt to the model. While the model requests
+    tool calls (up to MAX_AGENT_STEPS rounds within AGENT_DEADLINE seconds),
+    it executes them concurrently and sends the results back (in the original
+    order), until the model produces the final answer.
+
+    Args:
+        user_prompt: The user's input prompt for the travel assistant.
+        session: Optional ``sessions.Session`` whose history is sent along and
+            which the turn is recorded in.
+        steps: Optional list receiving a latency/token usage record per
+            completion and tool round.
+        shared_tools: Optional dict shared with other concurrent calls (e.g. a
+            batch) so that identical tool calls run only once.
+        instructions: Optional system prompt, used when there is no session
+            (a session carries its own).
+
+    Returns:
+        The assistant's textual response string.
+    """
+    with span("pipeline", session=session is not None), request_budget():
+        return await _run_pipeline(
+            user_prompt,
+            session=session,
+            steps=steps,
+            shared_tools=shared_tools,
+            instructions=instructions,
         )
-        return followup.choices[0].message.content
 
-    else:
-        return response.choices[0].message.content
+
+async def stream_travel_llm(user_prompt: str, session=None, instructions=None):
+    """Run the travel assistant, yielding events as they happen.
+
+    Tool progress is reported while tools run and the model's answer is
+    streamed token by token, so callers can show output long before the full
+    pipeline has finished.
+
+    Args:
+        user_prompt: The user's input prompt for the travel assistant.
+        session: Optional ``sessions.Session``, as for ``run_travel_llm_async``.
+        instructions: Optional system prompt, as for ``run_travel_llm_async``.
+
+    Yields:
+        Event dicts with a "type" of "tool_start" or "tool_end" (with "tool" and
+        "message" keys), "token" (with a "text" key) or, if the pipeline fails,
+        "error" (with a "message" key).
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            with (
+                span("pipeline", session=session is not None, streamed=True),
+                request_budget(),
+            ):
+                await _run_pipeline(
+                    user_prompt,
+                    emit=queue.put_nowait,
+                    session=session,
+                    instructions=instructions,
+                )
+        except Exception as error:
+            logger.exception("Streamed answer failed")
+            queue.put_nowait({"type": "error", "message": str(error)})
+        finally:
+            queue.put_nowait(done)
+
+    task = asyncio.create_task(produce())
+    try:
+        while (event := await queue.get()) is not done:
+            yield event
+    finally:
+        task.cancel()
+
+
+def run_travel_llm(user_prompt: str):
+    """Synchronous wrapper around ``run_travel_llm_async``.
+
+    Args:
+        user_prompt: The user's input prompt for the travel assistant.
+
+    Returns:
+        The assistant's textual response string.
+    """
+    return run_sync(run_travel_llm_async(user_prompt))